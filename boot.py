@@ -1,4 +1,3 @@
-import os
 import sublime
 import sublime_plugin
 import weakref
@@ -16,7 +15,7 @@ from .plugin.core.collections import DottedDict
 from .plugin.core.css import load as load_css
 from .plugin.core.handlers import LanguageHandler
 from .plugin.core.logging import exception_log
-from .plugin.core.open import opening_files
+from .plugin.core.open import pop_opening_file
 from .plugin.core.panels import destroy_output_panels
 from .plugin.core.panels import LspClearPanelCommand
 from .plugin.core.panels import LspUpdatePanelCommand
@@ -33,15 +32,18 @@ from .plugin.core.sessions import method2attr
 from .plugin.core.sessions import register_plugin
 from .plugin.core.sessions import Session
 from .plugin.core.settings import client_configs
+from .plugin.core.settings import globalprefs
 from .plugin.core.settings import load_settings
 from .plugin.core.settings import unload_settings
 from .plugin.core.signature_help import LspSignatureHelpNavigateCommand
 from .plugin.core.signature_help import LspSignatureHelpShowCommand
 from .plugin.core.transports import kill_all_subprocesses
 from .plugin.core.types import ClientConfig
+from .plugin.core.types import SettingsRegistration
 from .plugin.core.typing import Any, Optional, List, Type, Callable, Dict, Tuple
 from .plugin.core.views import get_uri_and_position_from_location
 from .plugin.core.views import LspRunTextCommandHelperCommand
+from .plugin.core.views import minihtml_cache
 from .plugin.documents import DocumentSyncListener
 from .plugin.documents import TextChangeListener
 from .plugin.edit import LspApplyDocumentEditCommand
@@ -54,6 +56,7 @@ from .plugin.goto import LspSymbolImplementationCommand
 from .plugin.goto import LspSymbolTypeDefinitionCommand
 from .plugin.goto_diagnostic import LspGotoDiagnosticCommand
 from .plugin.hover import LspHoverCommand
+from .plugin.inlay_hint import LspInlayHintClickCommand
 from .plugin.panels import LspShowDiagnosticsPanelCommand
 from .plugin.panels import LspToggleServerPanelCommand
 from .plugin.references import LspSymbolReferencesCommand
@@ -160,9 +163,22 @@ def _unregister_all_plugins() -> None:
     client_configs.all.clear()
 
 
+_preferences_registration = None  # type: Optional[SettingsRegistration]
+
+
+def _on_preferences_changed() -> None:
+    # Rendered markdown is colored by the color scheme.
+    prefs = globalprefs()
+    minihtml_cache.on_color_scheme_changed(
+        tuple(prefs.get(key) for key in ("color_scheme", "light_color_scheme", "dark_color_scheme", "theme")))
+
+
 def plugin_loaded() -> None:
+    global _preferences_registration
     load_settings()
     load_css()
+    _on_preferences_changed()
+    _preferences_registration = SettingsRegistration(globalprefs(), _on_preferences_changed)
     _register_all_plugins()
     client_configs.update_configs()
     for window in sublime.windows():
@@ -170,6 +186,9 @@ def plugin_loaded() -> None:
 
 
 def plugin_unloaded() -> None:
+    global _preferences_registration
+    _preferences_registration = None
+    minihtml_cache.clear()
     _unregister_all_plugins()
     for window in sublime.windows():
         destroy_output_panels(window)  # references and diagnostics panels
@@ -210,23 +229,19 @@ class Listener(sublime_plugin.EventListener):
         file_name = view.file_name()
         if not file_name:
             return
-        for fn in opening_files.keys():
-            if fn == file_name or os.path.samefile(fn, file_name):
-                # Remove it from the pending opening files, and resolve the promise.
-                opening_files.pop(fn)[1](view)
-                break
+        # Remove it from the pending opening files, and resolve the promise.
+        resolve = pop_opening_file(file_name)
+        if resolve:
+            resolve(view)
 
     def on_pre_close(self, view: sublime.View) -> None:
         file_name = view.file_name()
         if not file_name:
             return
-        for fn in opening_files.keys():
-            if fn == file_name or os.path.samefile(fn, file_name):
-                tup = opening_files.pop(fn, None)
-                if tup:
-                    # The view got closed before it finished loading. This can happen.
-                    tup[1](None)
-                    break
+        resolve = pop_opening_file(file_name)
+        if resolve:
+            # The view got closed before it finished loading. This can happen.
+            resolve(None)
 
     def on_post_window_command(self, window: sublime.Window, command_name: str, args: Optional[Dict[str, Any]]) -> None:
         if command_name in ("next_result", "prev_result"):
@@ -140,14 +140,16 @@ class CodeActionsManager:
                         supported_kinds = session.get_capability('codeActionProvider.codeActionKinds')
                         matching_kinds = get_matching_kinds(on_save_actions, supported_kinds or [])
                         if matching_kinds:
-                            params = text_document_code_action_params(view, region, diagnostics, matching_kinds)
+                            params = text_document_code_action_params(
+                                view, region, diagnostics, matching_kinds, session.position_encoding)
                             request = Request.codeAction(params, view)
                             session.send_request_async(
                                 request, *filtering_collector(session.config.name, matching_kinds, collector))
                     else:
                         if only_with_diagnostics and not diagnostics:
                             continue
-                        params = text_document_code_action_params(view, region, diagnostics)
+                        params = text_document_code_action_params(
+                            view, region, diagnostics, None, session.position_encoding)
                         request = Request.codeAction(params, view)
                         session.send_request_async(request, collector.create_collector(session.config.name))
         if location_cache_key:
@@ -1,9 +1,9 @@
-from .core.protocol import CodeLens, Error, Range
+from .core.protocol import CodeLens, Error
 from .core.typing import List, Tuple, Dict, Iterable, Generator, Union
 from .core.registry import LspTextCommand
 from .core.registry import windows
 from .core.views import make_command_link
-from .core.views import range_to_region
+from .core.views import ranges_to_regions
 from html import escape as html_escape
 import itertools
 import sublime
@@ -18,9 +18,9 @@ class CodeLensData:
         'is_resolve_error',
     )
 
-    def __init__(self, data: CodeLens, view: sublime.View, session_name: str) -> None:
+    def __init__(self, data: CodeLens, region: sublime.Region, session_name: str) -> None:
         self.data = data
-        self.region = range_to_region(Range.from_lsp(data['range']), view)
+        self.region = region
         self.session_name = session_name
         self.annotation = '...'
         self.resolve_annotation()
@@ -57,13 +57,13 @@ class CodeLensData:
         else:
             self.annotation = '...'
 
-    def resolve(self, view: sublime.View, code_lens_or_error: Union[CodeLens, Error]) -> None:
+    def resolve(self, view: sublime.View, encoding: str, code_lens_or_error: Union[CodeLens, Error]) -> None:
         if isinstance(code_lens_or_error, Error):
             self.is_resolve_error = True
             self.annotation = html_escape(str(code_lens_or_error))
             return
         self.data = code_lens_or_error
-        self.region = range_to_region(Range.from_lsp(code_lens_or_error['range']), view)
+        self.region = ranges_to_regions(view, [code_lens_or_error['range']], encoding)[0]
         self.resolve_annotation()
 
 
@@ -96,9 +96,10 @@ class CodeLensView:
         self._phantom.update([])
         self._clear_annotations()
 
-    def handle_response(self, session_name: str, response: List[CodeLens]) -> None:
+    def handle_response(self, session_name: str, response: List[CodeLens], encoding: str) -> None:
         self._init = True
-        responses = [CodeLensData(data, self.view, session_name) for data in response]
+        regions = ranges_to_regions(self.view, [data['range'] for data in response], encoding)
+        responses = [CodeLensData(data, region, session_name) for data, region in zip(response, regions)]
         responses.sort(key=lambda c: c.region)
         result = {
             region.to_tuple(): list(groups)
@@ -1,33 +1,280 @@
 from .core.edit import parse_text_edit
 from .core.logging import debug
-from .core.protocol import Request, InsertTextFormat, Range, CompletionItem
+from .core.protocol import Request, InsertTextFormat, Position, PositionEncodingKind, Range, CompletionItem, TextEdit
 from .core.registry import LspTextCommand
-from .core.typing import List, Dict, Optional, Generator, Union
+from .core.sessions import Session
+from .core.typing import Any, Deque, List, Dict, Iterable, Optional, Generator, Set, Tuple, Union, cast
 from .core.views import FORMAT_STRING, FORMAT_MARKUP_CONTENT
 from .core.views import MarkdownLangMap
 from .core.views import minihtml
 from .core.views import range_to_region
 from .core.views import show_lsp_popup
 from .core.views import update_lsp_popup
+from collections import deque
+from collections import OrderedDict
 import functools
 import sublime
-import webbrowser
 
 SessionName = str
 
 
-class LspResolveDocsCommand(LspTextCommand):
+class StoredCompletions:
+
+    __slots__ = ("items", "session_names", "resolved")
+
+    def __init__(self) -> None:
+        self.items = []  # type: List[CompletionItem]
+        # The session of each item. These are all references to a handful of strings, so they cost a pointer per item.
+        self.session_names = []  # type: List[SessionName]
+        # The indexes of the items that have been replaced by their completionItem/resolve response.
+        self.resolved = set()  # type: Set[int]
+
+
+class CompletionStore:
+    """
+    Holds on to the LSP completion items of the latest completion lists, so that the args of each
+    sublime.CompletionItem only have to refer to their item by a (store_id, index) pair. Sublime Text would otherwise
+    serialize every LSP item into the command args of the list that is shown.
+
+    Starting a new completion list evicts all but the most recent lists. The previous list is kept, because its
+    popup may still be visible while the new list is being computed.
+    """
+
+    MAX_LISTS = 2
+
+    def __init__(self) -> None:
+        self._lists = OrderedDict()  # type: Dict[int, StoredCompletions]
+        self._next_id = 0
+
+    def begin(self) -> int:
+        """Start a new completion list, evicting the old ones. Returns the store id of the new list."""
+        while len(self._lists) >= self.MAX_LISTS:
+            self._lists.popitem(last=False)  # type: ignore
+        store_id = self._next_id
+        self._next_id += 1
+        self._lists[store_id] = StoredCompletions()
+        return store_id
+
+    def extend(self, store_id: int, session_name: SessionName, items: List[CompletionItem]) -> int:
+        """Add the items of a session to a completion list. Returns the index of the first added item."""
+        stored = self._lists[store_id]
+        offset = len(stored.items)
+        stored.items.extend(items)
+        stored.session_names.extend([session_name] * len(items))
+        return offset
+
+    def __contains__(self, store_id: int) -> bool:
+        return store_id in self._lists
+
+    def replace_text_edit(self, store_id: int, index: int, text_edit: TextEdit) -> None:
+        """Replace the textEdit of an item, if its list has not been evicted."""
+        stored = self._lists.get(store_id)
+        if stored is not None and 0 <= index < len(stored.items):
+            item = stored.items[index].copy()
+            item["textEdit"] = text_edit
+            stored.items[index] = item
+
+    def resolve(self, store_id: int, index: int, item: CompletionItem) -> None:
+        """
+        Replace an item by its completionItem/resolve response, if its list has not been evicted. The textEdit of the
+        stored item is kept, as it may have been extended over text that was typed since the list was requested.
+        """
+        stored = self._lists.get(store_id)
+        if stored is None or not 0 <= index < len(stored.items):
+            return
+        text_edit = stored.items[index].get("textEdit")
+        if text_edit:
+            item["textEdit"] = text_edit
+        stored.items[index] = item
+        stored.resolved.add(index)
+
+    def is_resolved(self, store_id: int, index: int) -> bool:
+        stored = self._lists.get(store_id)
+        return stored is not None and index in stored.resolved
+
+    def get(self, store_id: int, index: int) -> Optional[Tuple[SessionName, CompletionItem]]:
+        """Look up an item and its session, or None if its list has been evicted."""
+        stored = self._lists.get(store_id)
+        if stored is None or not 0 <= index < len(stored.items):
+            return None
+        return stored.session_names[index], stored.items[index]
+
+    def clear(self) -> None:
+        self._lists.clear()
+
+
+completion_store = CompletionStore()
+
+
+class ResolvePrefetcher:
+    """
+    Sends completionItem/resolve requests for the first items of the visible completion list in the background, so
+    that their documentation and additionalTextEdits (e.g. auto-imports) are available without a round trip once the
+    user needs them. At most MAX_CONCURRENT requests are in flight. Showing another list, or filtering the same list
+    again, replaces the items that were not requested yet.
+    """
+
+    MAX_CONCURRENT = 4
+
+    def __init__(self) -> None:
+        self._queue = deque()  # type: Deque[Tuple[int, int]]
+        self._sessions = {}  # type: Dict[SessionName, Session]
+        self._view = None  # type: Optional[sublime.View]
+        # The store ids and indexes of the items whose requests are in flight.
+        self._in_flight = set()  # type: Set[Tuple[int, int]]
 
-    completions = {}  # type: Dict[SessionName, List[CompletionItem]]
+    def start_async(
+        self, view: sublime.View, sessions: Dict[SessionName, Session], store_id: int, indexes: Iterable[int]
+    ) -> None:
+        """Prefetch the given items of a list, instead of the items that were not requested yet."""
+        self._view = view
+        self._sessions = sessions
+        self._queue = deque((store_id, index) for index in indexes)
+        self._pump_async()
 
-    def run(self, edit: sublime.Edit, index: int, session_name: str, event: Optional[dict] = None) -> None:
+    def cancel_async(self) -> None:
+        self._queue.clear()
+        self._sessions = {}
+        self._view = None
+
+    def _pump_async(self) -> None:
+        while len(self._in_flight) < self.MAX_CONCURRENT and self._queue and self._view:
+            key = self._queue.popleft()
+            store_id, index = key
+            # Filtering the same list again queues the items that are requested already.
+            if key in self._in_flight or completion_store.is_resolved(store_id, index):
+                continue
+            stored = completion_store.get(store_id, index)
+            if not stored:
+                continue
+            session_name, item = stored
+            session = self._sessions.get(session_name)
+            if not session:
+                continue
+            self._in_flight.add(key)
+            done = functools.partial(self._on_response_async, store_id, index)
+            session.send_request_async(Request.resolveCompletionItem(item, self._view), done, done)
+
+    def _on_response_async(self, store_id: int, index: int, response: Any) -> None:
+        self._in_flight.discard((store_id, index))
+        # An error response has no label. The store drops the items of lists that were evicted in the meantime.
+        if isinstance(response, dict) and "label" in response:
+            completion_store.resolve(store_id, index, cast(CompletionItem, response))
+        self._pump_async()
+
+
+resolve_prefetcher = ResolvePrefetcher()
+
+
+class CachedCompletions:
+    """
+    A complete (i.e. not isIncomplete) completion list, which can be filtered locally as long as the user keeps typing
+    the word that it was requested for.
+    """
+
+    __slots__ = ("word_start", "positions", "prefix", "change_count", "store_id", "items", "completions", "flags")
+
+    def __init__(self, word_start: int, positions: Dict[SessionName, Position], prefix: str, change_count: int) -> None:
+        # The state of the view when the list was requested. Every session counts the columns of the requested
+        # position in its own encoding.
+        self.word_start = word_start
+        self.positions = positions
+        self.prefix = prefix
+        self.change_count = change_count
+        # The LSP items and their formatted counterparts, in the order of the completion store.
+        self.store_id = -1
+        self.items = []  # type: List[CompletionItem]
+        self.completions = []  # type: List[sublime.CompletionItem]
+        self.flags = 0
+
+    def typed_since(self, view: sublime.View, word_start: int, prefix: str) -> Optional[str]:
+        """
+        Return the text that has been typed after the location of this list, or None if this list cannot be reused
+        for the given word.
+        """
+        if word_start != self.word_start or self.store_id not in completion_store:
+            return None
+        if not prefix.startswith(self.prefix):
+            return None
+        typed = prefix[len(self.prefix):]
+        # Anything but typing more of the word, e.g. an edit elsewhere in the view, invalidates the list.
+        if view.change_count() - self.change_count != len(typed):
+            return None
+        return typed
+
+
+def rank_completion_items(items: List[CompletionItem], prefix: str) -> List[int]:
+    """
+    Filter completion items on the given prefix, and return the indexes of the matching items, best match first.
+
+    Items whose filterText starts with the prefix come first, then those that do so case-insensitively, and then the
+    fuzzy matches. Within each of these groups the items keep their order, which is the order of their sortText.
+    """
+    if not prefix:
+        return list(range(len(items)))
+    folded = prefix.lower()
+    ranked = ([], [], [])  # type: Tuple[List[int], List[int], List[int]]
+    for index, item in enumerate(items):
+        filter_text = item.get("filterText") or item["label"]
+        if filter_text.startswith(prefix):
+            ranked[0].append(index)
+            continue
+        filter_text = filter_text.lower()
+        if filter_text.startswith(folded):
+            ranked[1].append(index)
+        elif _is_subsequence(folded, filter_text):
+            ranked[2].append(index)
+    return ranked[0] + ranked[1] + ranked[2]
+
+
+def _is_subsequence(needle: str, haystack: str) -> bool:
+    start = 0
+    for char in needle:
+        start = haystack.find(char, start) + 1
+        if not start:
+            return False
+    return True
+
+
+def extend_text_edit(
+    item: CompletionItem, position: Position, typed: str, encoding: str = PositionEncodingKind.UTF16
+) -> CompletionItem:
+    """
+    Return the item with its textEdit extended over the typed text, if the edit ended at the position where the
+    completion list was requested.
+    """
+    text_edit = item.get("textEdit")
+    if not text_edit or "range" not in text_edit or text_edit["range"]["end"] != position:
+        return item
+    if encoding == PositionEncodingKind.UTF16:
+        length = len(typed.encode("utf-16-le")) // 2
+    elif encoding == PositionEncodingKind.UTF8:
+        length = len(typed.encode("utf-8"))
+    else:
+        length = len(typed)
+    character = position["character"] + length
+    end = {"line": position["line"], "character": character}  # type: Position
+    item = item.copy()
+    item["textEdit"] = {"newText": text_edit["newText"], "range": {"start": text_edit["range"]["start"], "end": end}}
+    return item
+
+
+class LspResolveDocsCommand(LspTextCommand):
+
+    def run(self, edit: sublime.Edit, store_id: int, index: int, event: Optional[dict] = None) -> None:
 
         def run_async() -> None:
-            item = self.completions[session_name][index]
+            stored = completion_store.get(store_id, index)
+            if not stored:
+                return
+            session_name, item = stored
             session = self.session_by_name(session_name, 'completionProvider.resolveProvider')
             if session:
-                request = Request.resolveCompletionItem(item, self.view)
                 language_map = session.markdown_language_id_to_st_syntax_map()
+                if completion_store.is_resolved(store_id, index):
+                    self._handle_resolve_response_async(language_map, item)
+                    return
+                request = Request.resolveCompletionItem(item, self.view)
                 handler = functools.partial(self._handle_resolve_response_async, language_map)
                 session.send_request_async(request, handler)
             else:
@@ -74,15 +321,23 @@ class LspResolveDocsCommand(LspTextCommand):
         sublime.set_timeout(run_main)
 
     def _on_navigate(self, url: str) -> None:
+        import webbrowser
         webbrowser.open(url)
 
 
 class LspSelectCompletionItemCommand(LspTextCommand):
-    def run(self, edit: sublime.Edit, item: CompletionItem, session_name: str) -> None:
+    def run(self, edit: sublime.Edit, store_id: int, index: int) -> None:
+        stored = completion_store.get(store_id, index)
+        if not stored:
+            debug("completion list {} has been evicted".format(store_id))
+            return
+        session_name, item = stored
         text_edit = item.get("textEdit")
         if text_edit:
             new_text = text_edit["newText"].replace("\r", "")
-            edit_region = range_to_region(Range.from_lsp(text_edit['range']), self.view)
+            session = self.session_by_name(session_name)
+            encoding = session.position_encoding if session else PositionEncodingKind.UTF16
+            edit_region = range_to_region(Range.from_lsp(text_edit['range']), self.view, encoding)
             for region in self._translated_regions(edit_region):
                 self.view.erase(edit, region)
         else:
@@ -95,7 +350,7 @@ class LspSelectCompletionItemCommand(LspTextCommand):
         # todo: this should all run from the worker thread
         session = self.session_by_name(session_name, 'completionProvider.resolveProvider')
         additional_text_edits = item.get('additionalTextEdits')
-        if session and not additional_text_edits:
+        if session and not additional_text_edits and not completion_store.is_resolved(store_id, index):
             session.send_request_async(
                 Request.resolveCompletionItem(item, self.view),
                 functools.partial(self._on_resolved_async, session_name))
@@ -109,7 +364,9 @@ class LspSelectCompletionItemCommand(LspTextCommand):
         additional_edits = item.get('additionalTextEdits')
         if additional_edits:
             edits = [parse_text_edit(additional_edit) for additional_edit in additional_edits]
-            self.view.run_command("lsp_apply_document_edit", {'changes': edits})
+            session = self.session_by_name(session_name)
+            encoding = session.position_encoding if session else PositionEncodingKind.UTF16
+            self.view.run_command("lsp_apply_document_edit", {'changes': edits, 'encoding': encoding})
         command = item.get("command")
         if command:
             debug('Running server command "{}" for view {}'.format(command, self.view.id()))
@@ -1,6 +1,6 @@
 from .logging import debug
 from .types import ClientConfig
-from .typing import Generator, List, Optional, Set, Dict
+from .typing import Any, Generator, List, Optional, Set, Dict, Tuple
 from .workspace import enable_in_project, disable_in_project
 import sublime
 import urllib.parse
@@ -29,6 +29,9 @@ class WindowConfigManager(object):
         self._window = window
         self._global_configs = global_configs
         self._disabled_for_session = set()  # type: Set[str]
+        # For every config in self.all: the global config (None for project-only configs) and the overrides it was
+        # built from. This allows us to only rebuild the configs whose sources changed.
+        self._sources = {}  # type: Dict[str, Tuple[Optional[ClientConfig], Dict[str, Any]]]
         self.all = {}  # type: Dict[str, ClientConfig]
         self.update()
 
@@ -54,26 +57,42 @@ class WindowConfigManager(object):
             pass
 
     def update(self, updated_config_name: Optional[str] = None) -> None:
+        """
+        Rebuild the configs of this window, and re-check the sessions of the configs that changed. When a config name
+        is given, the sessions of that config are re-checked regardless.
+        """
         project_settings = (self._window.project_data() or {}).get("settings", {}).get("LSP", {})
-        if updated_config_name is None:
-            self.all.clear()
+        sources = {}  # type: Dict[str, Tuple[Optional[ClientConfig], Dict[str, Any]]]
         for name, config in self._global_configs.items():
-            if updated_config_name and updated_config_name != name:
-                continue
             overrides = project_settings.pop(name, None)
-            if isinstance(overrides, dict):
-                debug("applying .sublime-project override for", name)
-            else:
+            if not isinstance(overrides, dict):
                 overrides = {}
             if name in self._disabled_for_session:
                 overrides["enabled"] = False
-            self.all[name] = ClientConfig.from_config(config, overrides)
+            sources[name] = (config, overrides)
         for name, c in project_settings.items():
-            if updated_config_name and updated_config_name != name:
-                continue
-            debug("loading project-only configuration", name)
-            self.all[name] = ClientConfig.from_dict(name, c)
-        self._window.run_command("lsp_recheck_sessions", {'config_name': updated_config_name})
+            sources[name] = (None, c)
+        configs = {}  # type: Dict[str, ClientConfig]
+        for name, (global_config, overrides) in sources.items():
+            previous = self._sources.get(name)
+            if name in self.all and previous and previous[0] is global_config and previous[1] == overrides:
+                configs[name] = self.all[name]
+            elif global_config:
+                if overrides:
+                    debug("applying .sublime-project override for", name)
+                configs[name] = ClientConfig.from_config(global_config, overrides)
+            else:
+                debug("loading project-only configuration", name)
+                configs[name] = ClientConfig.from_dict(name, overrides)
+        changed = set(name for name in configs if self.all.get(name) != configs[name])
+        changed.update(name for name in self.all if name not in configs)
+        if updated_config_name:
+            changed.add(updated_config_name)
+        self._sources = sources
+        self.all.clear()
+        self.all.update(configs)
+        if changed:
+            self._window.run_command("lsp_recheck_sessions", {'config_names': sorted(changed)})
 
     def enable_config(self, config_name: str) -> None:
         if not self._reenable_disabled_for_session(config_name):
@@ -1,5 +1,5 @@
 from .protocol import Diagnostic, DiagnosticSeverity, DocumentUri
-from .typing import Callable, Iterator, List, Tuple, TypeVar
+from .typing import Callable, Iterator, List, Optional, Set, Tuple, TypeVar
 from .url import parse_uri
 from .views import diagnostic_severity
 from collections import OrderedDict
@@ -20,6 +20,11 @@ class DiagnosticsManager(OrderedDict):
     #
     # https://microsoft.github.io/language-server-protocol/specification#textDocument_publishDiagnostics
 
+    def __init__(self) -> None:
+        super().__init__()
+        # The uris whose diagnostics come from the snapshot of a previous session, not from the server.
+        self.stale = set()  # type: Set[ParsedUri]
+
     def add_diagnostics_async(self, document_uri: DocumentUri, diagnostics: List[Diagnostic]) -> None:
         """
         Add `diagnostics` for `document_uri` to the store, replacing previously received `diagnoscis`
@@ -27,6 +32,7 @@ class DiagnosticsManager(OrderedDict):
         the store. The item received is moved to the end of the store.
         """
         uri = parse_uri(document_uri)
+        self.stale.discard(uri)
         if not diagnostics:
             # received "clear diagnostics" message for this uri
             self.pop(uri, None)
@@ -34,6 +40,33 @@ class DiagnosticsManager(OrderedDict):
         self[uri] = diagnostics
         self.move_to_end(uri)  # maintain incoming order
 
+    def add_stale_diagnostics_async(self, document_uri: DocumentUri, diagnostics: List[Diagnostic]) -> None:
+        """
+        Add `diagnostics` for `document_uri` from the snapshot of a previous session, unless the server reported
+        diagnostics for it already. They stay until the server reports diagnostics for `document_uri`.
+        """
+        uri = parse_uri(document_uri)
+        if diagnostics and uri not in self:
+            self[uri] = diagnostics
+            self.stale.add(uri)
+
+    def stale_diagnostics_by_document_uri(self, document_uri: DocumentUri) -> List[Diagnostic]:
+        """
+        Returns possibly empty list of diagnostics for `document_uri` that come from the snapshot of a previous session.
+        """
+        uri = parse_uri(document_uri)
+        if uri not in self.stale:
+            return []
+        return self.get(uri, [])
+
+    def clear_stale_async(self) -> None:
+        """
+        Remove the diagnostics that come from the snapshot of a previous session.
+        """
+        for uri in self.stale:
+            self.pop(uri, None)
+        self.stale.clear()
+
     def filter_map_diagnostics_async(self, pred: Callable[[Diagnostic], bool],
                                      f: Callable[[ParsedUri, Diagnostic], T]) -> Iterator[Tuple[ParsedUri, List[T]]]:
         """
@@ -59,13 +92,20 @@ class DiagnosticsManager(OrderedDict):
             for result in results:
                 yield uri, result
 
-    def sum_total_errors_and_warnings_async(self) -> Tuple[int, int]:
+    def sum_total_errors_and_warnings_async(
+        self, path_pred: Optional[Callable[[str], bool]] = None
+    ) -> Tuple[int, int]:
         """
-        Returns `(total_errors, total_warnings)` count of all diagnostics currently in store.
+        Returns `(total_errors, total_warnings)` count of all diagnostics currently in store, or only of the documents
+        whose path satisfies `path_pred`.
         """
+        if path_pred is None:
+            values = list(self.values())
+        else:
+            values = [diagnostics for (_, path), diagnostics in self.items() if path_pred(path)]
         return (
-            sum(map(severity_count(DiagnosticSeverity.Error), self.values())),
-            sum(map(severity_count(DiagnosticSeverity.Warning), self.values())),
+            sum(map(severity_count(DiagnosticSeverity.Error), values)),
+            sum(map(severity_count(DiagnosticSeverity.Warning), values)),
         )
 
     def diagnostics_by_document_uri(self, document_uri: DocumentUri) -> List[Diagnostic]:
@@ -1,17 +1,33 @@
 from .logging import debug
+from .logging import exception_log
 from .open import open_file
+from .progress import WindowProgressReporter
+from .promise import PackagedTask
 from .promise import Promise
+from .protocol import PositionEncodingKind
 from .protocol import TextEdit as LspTextEdit, Position
 from .typing import List, Dict, Any, Iterable, Optional, Tuple
 from .url import uri_to_filename
+from .views import column_to_index
 from functools import partial
+import codecs
 import operator
+import os
+import re
 import sublime
+import tempfile
+import threading
+import time
 
 
 # tuple of start, end, newText, version
 TextEditTuple = Tuple[Tuple[int, int], Tuple[int, int], str, Optional[int]]
 
+# The amount of time we allow ourselves to block the UI thread per slice when applying edits to open views.
+VIEW_EDIT_TIME_SLICE_MS = 8
+
+_LINE_BREAK = re.compile(r'\r\n|\r|\n')
+
 
 def parse_workspace_edit(workspace_edit: Dict[str, Any]) -> Dict[str, List[TextEditTuple]]:
     changes = {}  # type: Dict[str, List[TextEditTuple]]
@@ -59,12 +75,205 @@ def sort_by_application_order(changes: Iterable[TextEditTuple]) -> List[TextEdit
     return list(sorted(changes, key=operator.itemgetter(0)))
 
 
-def apply_workspace_edit(window: sublime.Window, changes: Dict[str, List[TextEditTuple]]) -> Promise:
-    """Apply workspace edits. This function must be called from the main thread!"""
-    return Promise.all([open_file(window, fn).then(partial(_apply_edits, edits)) for fn, edits in changes.items()])
+def apply_workspace_edit(
+    window: sublime.Window,
+    changes: Dict[str, List[TextEditTuple]],
+    encoding: str = PositionEncodingKind.UTF16
+) -> Promise:
+    """
+    Apply workspace edits. This function must be called from the main thread!
+
+    Edits to files that are open in a view are applied to that view, one text command (and thus one undo group) per
+    view, spread out over multiple time slices so that the UI stays responsive. Edits to files that are not open are
+    applied directly on disk in a background thread, without opening a tab for them.
+    """
+    if not changes:
+        return Promise.resolve(None)
+    return _WorkspaceEditApplier(window, changes, encoding).promise
+
+
+def apply_text_edits(text: str, edits: Iterable[TextEditTuple], encoding: str = PositionEncodingKind.UTF16) -> str:
+    """
+    Apply text edits to the given text and return the new text.
+
+    Columns are counted in the given position encoding, like the language server sends them. Columns beyond the end of
+    a line are clamped to the end of that line. Inserted line breaks follow the line ending style of the text.
+    """
+    line_starts = [0]
+    line_ends = []  # type: List[int]
+    newline = None  # type: Optional[str]
+    for match in _LINE_BREAK.finditer(text):
+        if newline is None:
+            newline = match.group(0)
+        line_ends.append(match.start())
+        line_starts.append(match.end())
+    line_ends.append(len(text))
+    chunks = []  # type: List[str]
+    cursor = 0
+    for start, end, replacement, _ in sort_by_application_order(edits):
+        if start[0] >= len(line_starts) and not replacement.startswith("\n"):
+            # Same workaround as in the lsp_apply_document_edit command: some language servers insert at a row
+            # beyond the end of the document.
+            replacement = "\n" + replacement
+        if newline and newline != "\n":
+            replacement = replacement.replace("\n", newline)
+        a = max(_text_point(text, line_starts, line_ends, start, encoding), cursor)
+        b = max(_text_point(text, line_starts, line_ends, end, encoding), a)
+        chunks.append(text[cursor:a])
+        chunks.append(replacement)
+        cursor = b
+    chunks.append(text[cursor:])
+    return "".join(chunks)
+
+
+def apply_text_edits_to_file(
+    file_path: str, edits: List[TextEditTuple], encoding: str = PositionEncodingKind.UTF16
+) -> None:
+    """
+    Apply text edits to a file on disk. The file is replaced atomically by writing to a temporary file in the same
+    directory first. This is a blocking function; don't call it from the UI thread.
+    """
+    with open(file_path, "rb") as fp:
+        raw = fp.read()
+    bom = codecs.BOM_UTF8 if raw.startswith(codecs.BOM_UTF8) else b""
+    text = raw[len(bom):].decode("utf-8")
+    new_text = apply_text_edits(text, edits, encoding)
+    if new_text == text:
+        return
+    directory, basename = os.path.split(file_path)
+    fd, temp_path = tempfile.mkstemp(prefix=".{}.".format(basename), suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(bom + new_text.encode("utf-8"))
+        os.chmod(temp_path, os.stat(file_path).st_mode & 0o7777)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _text_point(
+    text: str, line_starts: List[int], line_ends: List[int], position: Tuple[int, int], encoding: str
+) -> int:
+    row, col = position
+    if row >= len(line_starts):
+        return len(text)
+    line_start = line_starts[row]
+    return line_start + column_to_index(text[line_start:line_ends[row]], col, encoding)
+
+
+def _find_open_view(window: sublime.Window, file_path: str) -> Optional[sublime.View]:
+    view = window.find_open_file(file_path)
+    if view:
+        return view
+    for w in sublime.windows():
+        if w.id() != window.id():
+            view = w.find_open_file(file_path)
+            if view:
+                return view
+    return None
+
+
+class _WorkspaceEditApplier:
+    """
+    Applies the changes of a workspace edit. Open views are edited on the UI thread in time slices, while files that
+    are not open are edited on disk in a background thread. Files that can't be edited on disk (for instance because
+    they don't exist yet, or aren't UTF-8) are opened in the window and edited like any other view.
+    """
+
+    def __init__(self, window: sublime.Window, changes: Dict[str, List[TextEditTuple]], encoding: str) -> None:
+        self._window = window
+        self._encoding = encoding
+        self._views = []  # type: List[Tuple[str, List[TextEditTuple]]]
+        self._files = []  # type: List[Tuple[str, List[TextEditTuple]]]
+        self._fallbacks = []  # type: List[Tuple[str, List[TextEditTuple]]]
+        for file_path, edits in changes.items():
+            view = _find_open_view(window, file_path)
+            if view and not view.is_loading():
+                self._views.append((file_path, edits))
+            elif view:
+                self._fallbacks.append((file_path, edits))
+            else:
+                self._files.append((file_path, edits))
+        self._total = len(changes)
+        self._views_applied = 0
+        self._files_applied = 0
+        self._pending = 2  # The view slices and the background thread.
+        self._progress = None  # type: Optional[WindowProgressReporter]
+        if self._total > 1:
+            self._progress = WindowProgressReporter(window, "lsp_workspace_edit", "Applying edits", None, 0)
+        self.promise, self._resolve = Promise.packaged_task()  # type: PackagedTask[None]
+        if self._files:
+            threading.Thread(target=self._apply_files_in_background, name="lsp-workspace-edit").start()
+        else:
+            self._pending -= 1
+        self._apply_views_slice()
+
+    def _report_progress(self) -> None:
+        if self._progress:
+            done = self._views_applied + self._files_applied
+            self._progress("{}/{} files".format(done, self._total), 100.0 * done / self._total)
+
+    def _apply_views_slice(self) -> None:
+        deadline = time.time() + VIEW_EDIT_TIME_SLICE_MS / 1000.0
+        while self._views:
+            file_path, edits = self._views.pop()
+            view = _find_open_view(self._window, file_path)
+            if view and not view.is_loading():
+                # One text command per view, so that the user can undo the whole edit in one step.
+                _apply_edits(edits, self._encoding, view)
+                self._views_applied += 1
+            else:
+                # The view was closed in the meantime.
+                self._fallbacks.append((file_path, edits))
+            if time.time() >= deadline:
+                break
+        self._report_progress()
+        if self._views:
+            sublime.set_timeout(self._apply_views_slice)
+        else:
+            self._on_part_done()
+
+    def _apply_files_in_background(self) -> None:
+        failed = []  # type: List[Tuple[str, List[TextEditTuple]]]
+        last_report = time.time()
+        for file_path, edits in self._files:
+            try:
+                apply_text_edits_to_file(file_path, edits, self._encoding)
+                self._files_applied += 1
+            except Exception as ex:
+                exception_log("Failed to apply edits to {} on disk".format(file_path), ex)
+                failed.append((file_path, edits))
+            if time.time() - last_report > 0.1:
+                last_report = time.time()
+                sublime.set_timeout(self._report_progress)
+
+        def on_main_thread() -> None:
+            self._fallbacks.extend(failed)
+            self._report_progress()
+            self._on_part_done()
+
+        sublime.set_timeout(on_main_thread)
+
+    def _on_part_done(self) -> None:
+        self._pending -= 1
+        if self._pending > 0:
+            return
+        fallbacks, self._fallbacks = self._fallbacks, []
+        promises = [
+            open_file(self._window, fn).then(partial(_apply_edits, edits, self._encoding)) for fn, edits in fallbacks
+        ]
+        Promise.all(promises).then(self._on_done)
+
+    def _on_done(self, _: Any) -> None:
+        self._progress = None
+        self._resolve(None)
 
 
-def _apply_edits(edits: List[TextEditTuple], view: Optional[sublime.View]) -> None:
+def _apply_edits(edits: List[TextEditTuple], encoding: str, view: Optional[sublime.View]) -> None:
     if view and view.is_valid():
         # Text commands run blocking. After this call has returned the changes are applied.
-        view.run_command("lsp_apply_document_edit", {"changes": edits})
+        view.run_command("lsp_apply_document_edit", {"changes": edits, "encoding": encoding})
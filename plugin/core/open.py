@@ -2,17 +2,49 @@ from .logging import exception_log
 from .promise import PackagedTask
 from .promise import Promise
 from .promise import ResolveFunc
+from .protocol import PositionEncodingKind
 from .protocol import Range, RangeLsp
-from .typing import Dict, Tuple, Optional
+from .typing import Dict, Tuple, Optional, Union
 from .url import uri_to_filename
 from .views import range_to_region
 import os
 import sublime
 import subprocess
-import webbrowser
 
 
-opening_files = {}  # type: Dict[str, Tuple[Promise[Optional[sublime.View]], ResolveFunc[Optional[sublime.View]]]]
+# Either the (st_dev, st_ino) pair of an existing file, or the normalized path when that is not available.
+FileKey = Union[Tuple[int, int], str]
+
+opening_files = {}  # type: Dict[FileKey, Tuple[Promise[Optional[sublime.View]], ResolveFunc[Optional[sublime.View]]]]
+
+
+class _PendingOpen:
+
+    __slots__ = ("promise", "resolve", "range", "encoding")
+
+    def __init__(self, r: Optional[RangeLsp], encoding: str) -> None:
+        self.promise, self.resolve = Promise.packaged_task()  # type: PackagedTask[Optional[sublime.View]]
+        self.range = r
+        self.encoding = encoding
+
+
+# Opens requested from the worker thread that haven't finished yet
+_pending_opens_async = {}  # type: Dict[Tuple[int, FileKey, int, int], _PendingOpen]
+
+
+def file_key(file_path: str) -> FileKey:
+    """
+    Compute a key that is the same for all paths pointing to the same file, so that files can be looked up in a dict
+    instead of comparing paths with os.path.samefile.
+    """
+    try:
+        st = os.stat(file_path)
+        # Older versions of Python on Windows always report an inode number of zero.
+        if st.st_ino:
+            return (st.st_dev, st.st_ino)
+    except OSError:
+        pass
+    return os.path.normcase(os.path.abspath(file_path))
 
 
 def open_file(
@@ -32,26 +64,28 @@ def open_file(
         return Promise.resolve(view)
 
     # Is the view opening right now? Then return the associated unresolved promise
-    for fn, value in opening_files.items():
-        if fn == file_path or os.path.samefile(fn, file_path):
-            # Return the unresolved promise. A future on_load event will resolve the promise.
-            return value[0]
-
-    # Prepare a new promise to be resolved by a future on_load event (see the event listener in main.py)
-    def fullfill(resolve: ResolveFunc[Optional[sublime.View]]) -> None:
-        global opening_files
-        # Save the promise in the first element of the tuple -- except we cannot yet do that here
-        opening_files[file_path] = (None, resolve)  # type: ignore
-
-    promise = Promise(fullfill)
-    tup = opening_files[file_path]
-    # Save the promise in the first element of the tuple so that the for-loop above can return it
-    opening_files[file_path] = (promise, tup[1])
-    return promise
-
-
-def center_selection(v: sublime.View, r: RangeLsp) -> sublime.View:
-    selection = range_to_region(Range.from_lsp(r), v)
+    key = file_key(file_path)
+    value = opening_files.get(key)
+    if value:
+        # Return the unresolved promise. A future on_load event will resolve the promise.
+        return value[0]
+
+    # Prepare a new promise to be resolved by a future on_load event (see the event listener in boot.py)
+    pair = Promise.packaged_task()  # type: PackagedTask[Optional[sublime.View]]
+    opening_files[key] = pair
+    return pair[0]
+
+
+def pop_opening_file(file_name: str) -> Optional[ResolveFunc[Optional[sublime.View]]]:
+    """Stop tracking a pending open of the given file, and return the function that resolves its promise."""
+    if not opening_files:
+        return None
+    value = opening_files.pop(file_key(file_name), None)
+    return value[1] if value else None
+
+
+def center_selection(v: sublime.View, r: RangeLsp, encoding: str = PositionEncodingKind.UTF16) -> sublime.View:
+    selection = range_to_region(Range.from_lsp(r), v, encoding)
     v.run_command("lsp_selection_set", {"regions": [(selection.a, selection.a)]})
     window = v.window()
     if window:
@@ -60,31 +94,59 @@ def center_selection(v: sublime.View, r: RangeLsp) -> sublime.View:
     return v
 
 
-def open_file_and_center(window: sublime.Window, file_path: str, r: Optional[RangeLsp], flags: int = 0,
-                         group: int = -1) -> Promise[Optional[sublime.View]]:
+def open_file_and_center(
+    window: sublime.Window,
+    file_path: str,
+    r: Optional[RangeLsp],
+    flags: int = 0,
+    group: int = -1,
+    encoding: str = PositionEncodingKind.UTF16
+) -> Promise[Optional[sublime.View]]:
     """Open a file asynchronously and center the range. It is only safe to call this function from the UI thread."""
 
-    def center(v: Optional[sublime.View]) -> Optional[sublime.View]:
-        if v and v.is_valid():
-            return center_selection(v, r) if r else v
-        return None
-
     # TODO: ST API does not allow us to say "do not focus this new view"
-    return open_file(window, file_path, flags, group).then(center)
+    return open_file(window, file_path, flags, group).then(lambda v: _center(v, r, encoding))
 
 
-def open_file_and_center_async(window: sublime.Window, file_path: str, r: Optional[RangeLsp], flags: int = 0,
-                               group: int = -1) -> Promise[Optional[sublime.View]]:
-    """Open a file asynchronously and center the range, worker thread version."""
-    pair = Promise.packaged_task()  # type: PackagedTask[Optional[sublime.View]]
-    sublime.set_timeout(
-        lambda: open_file_and_center(window, file_path, r, flags, group).then(
-            lambda view: sublime.set_timeout_async(
-                lambda: pair[1](view)
-            )
-        )
-    )
-    return pair[0]
+def open_file_and_center_async(
+    window: sublime.Window,
+    file_path: str,
+    r: Optional[RangeLsp],
+    flags: int = 0,
+    group: int = -1,
+    encoding: str = PositionEncodingKind.UTF16
+) -> Promise[Optional[sublime.View]]:
+    """
+    Open a file asynchronously and center the range, worker thread version.
+
+    Concurrent calls for the same file share one promise. The range of the most recent call is the one that is
+    centered.
+    """
+    key = (window.id(), file_key(file_path), flags, group)
+    existing = _pending_opens_async.get(key)
+    if existing:
+        existing.range = r
+        existing.encoding = encoding
+        return existing.promise
+    pending = _PendingOpen(r, encoding)
+    _pending_opens_async[key] = pending
+
+    def resolve_async(view: Optional[sublime.View]) -> None:
+        _pending_opens_async.pop(key, None)
+        pending.resolve(view)
+
+    def center(view: Optional[sublime.View]) -> None:
+        view = _center(view, pending.range, pending.encoding)
+        sublime.set_timeout_async(lambda: resolve_async(view))
+
+    sublime.set_timeout(lambda: open_file(window, file_path, flags, group).then(center))
+    return pending.promise
+
+
+def _center(v: Optional[sublime.View], r: Optional[RangeLsp], encoding: str) -> Optional[sublime.View]:
+    if v and v.is_valid():
+        return center_selection(v, r, encoding) if r else v
+    return None
 
 
 def open_externally(uri: str, take_focus: bool) -> bool:
@@ -92,6 +154,7 @@ def open_externally(uri: str, take_focus: bool) -> bool:
     A blocking function that invokes the OS's "open with default extension"
     """
     if uri.startswith("http:") or uri.startswith("https:"):
+        import webbrowser
         return webbrowser.open(uri, autoraise=take_focus)
     file = uri_to_filename(uri)
     try:
@@ -1,12 +1,20 @@
-from .typing import Dict, Optional, List, Generator, Tuple
+from .typing import Deque, Dict, Optional, List, Generator
+from collections import deque
 from contextlib import contextmanager
 import sublime
 import sublime_plugin
+import threading
 
 
 # about 80 chars per line implies maintaining a buffer of about 40kb per window
 SERVER_PANEL_MAX_LINES = 500
 
+# The maximum amount of characters of pending server panel messages kept per window
+SERVER_PANEL_MAX_CHARACTERS = 1024 * 1024
+
+# Pending messages are written to an open server panel at most once per this many milliseconds
+SERVER_PANEL_UPDATE_INTERVAL_MS = 16
+
 OUTPUT_PANEL_SETTINGS = {
     "auto_indent": False,
     "draw_indent_guides": False,
@@ -50,16 +58,51 @@ def clear_undo_stack(view: sublime.View) -> None:
     sublime.set_timeout(clear_undo_stack)
 
 
+class ServerLogBuffer:
+    """
+    A ring buffer of messages for the server panel of a window that are not in the panel yet. It is bounded both in the
+    number of messages and in the number of characters; the oldest messages are dropped first. Messages may be added
+    from any thread.
+    """
+
+    __slots__ = ("_messages", "_size", "_lock", "update_scheduled")
+
+    def __init__(self) -> None:
+        self._messages = deque()  # type: Deque[str]
+        self._size = 0
+        self._lock = threading.Lock()
+        self.update_scheduled = False
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def append(self, message: str) -> None:
+        with self._lock:
+            self._messages.append(message)
+            self._size += len(message)
+            while len(self._messages) > SERVER_PANEL_MAX_LINES or \
+                    (self._size > SERVER_PANEL_MAX_CHARACTERS and len(self._messages) > 1):
+                self._size -= len(self._messages.popleft())
+
+    def drain(self) -> List[str]:
+        with self._lock:
+            messages = list(self._messages)
+            self._messages.clear()
+            self._size = 0
+            self.update_scheduled = False
+            return messages
+
+
 class WindowPanelListener(sublime_plugin.EventListener):
 
-    server_log_map = {}  # type: Dict[int, List[Tuple[str, str]]]
+    server_log_map = {}  # type: Dict[int, ServerLogBuffer]
 
     def on_init(self, views: List[sublime.View]) -> None:
         for window in sublime.windows():
-            self.server_log_map[window.id()] = []
+            self.server_log_map[window.id()] = ServerLogBuffer()
 
     def on_new_window(self, window: sublime.Window) -> None:
-        self.server_log_map[window.id()] = []
+        self.server_log_map[window.id()] = ServerLogBuffer()
 
     def on_pre_close_window(self, window: sublime.Window) -> None:
         self.server_log_map.pop(window.id())
@@ -152,17 +195,24 @@ def is_server_panel_open(window: sublime.Window) -> bool:
 
 
 def log_server_message(window: sublime.Window, prefix: str, message: str) -> None:
-    window_id = window.id()
-    if not window.is_valid() or window_id not in WindowPanelListener.server_log_map:
+    """
+    Queue a message for the server panel. This function may be called from any thread. When the panel is open, it is
+    updated at most once per frame with all messages queued in the meantime. When it is closed, the messages wait in
+    a bounded buffer until the panel is shown.
+    """
+    buffer = WindowPanelListener.server_log_map.get(window.id())
+    if buffer is None or not window.is_valid():
         return
-    WindowPanelListener.server_log_map[window_id].append((prefix, message))
-    list_len = len(WindowPanelListener.server_log_map[window_id])
-    if list_len >= SERVER_PANEL_MAX_LINES:
-        # Trim leading items in the list, leaving only the max allowed count.
-        del WindowPanelListener.server_log_map[window_id][:list_len - SERVER_PANEL_MAX_LINES]
-    panel = ensure_server_panel(window)
-    if is_server_panel_open(window) and panel:
-        update_server_panel(panel, window_id)
+    buffer.append("{}: {}\n".format(prefix, message.replace("\r\n", "\n")))  # normalize Windows eol
+    if not buffer.update_scheduled and is_server_panel_open(window):
+        buffer.update_scheduled = True
+        sublime.set_timeout(lambda: _flush_server_panel(window), SERVER_PANEL_UPDATE_INTERVAL_MS)
+
+
+def _flush_server_panel(window: sublime.Window) -> None:
+    panel = ensure_server_panel(window) if window.is_valid() else None
+    if panel:
+        update_server_panel(panel, window.id())
 
 
 def update_server_panel(panel: sublime.View, window_id: int) -> None:
@@ -172,22 +222,14 @@ def update_server_panel(panel: sublime.View, window_id: int) -> None:
 class LspUpdateServerPanelCommand(sublime_plugin.TextCommand):
 
     def run(self, edit: sublime.Edit, window_id: int) -> None:
-        to_process = WindowPanelListener.server_log_map.get(window_id) or []
-        WindowPanelListener.server_log_map[window_id] = []
-        with mutable(self.view):
-            new_lines = []
-            for prefix, message in to_process:
-                message = message.replace("\r\n", "\n")  # normalize Windows eol
-                new_lines.append("{}: {}\n".format(prefix, message))
-            if new_lines:
+        buffer = WindowPanelListener.server_log_map.get(window_id)
+        new_lines = buffer.drain() if buffer else []
+        if new_lines:
+            with mutable(self.view):
                 self.view.insert(edit, self.view.size(), ''.join(new_lines))
-                last_region_end = 0  # Starting from point 0 in the panel ...
                 total_lines, _ = self.view.rowcol(self.view.size())
-                for _ in range(0, max(0, total_lines - SERVER_PANEL_MAX_LINES)):
-                    # ... collect all regions that span an entire line ...
-                    region = self.view.full_line(last_region_end)
-                    last_region_end = region.b
-                erase_region = sublime.Region(0, last_region_end)
-                if not erase_region.empty():
+                if total_lines > SERVER_PANEL_MAX_LINES:
+                    # Erase all leading lines that exceed the maximum, in one go.
+                    erase_region = sublime.Region(0, self.view.text_point(total_lines - SERVER_PANEL_MAX_LINES, 0))
                     self.view.erase(edit, erase_region)
         clear_undo_stack(self.view)
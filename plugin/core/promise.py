@@ -1,10 +1,9 @@
-from .typing import Callable, Generic, List, Optional, Protocol, Tuple, TypeVar, Union
+from .typing import Any, Callable, cast, Generic, List, Optional, Protocol, Tuple, TypeVar, Union
 import functools
 import sublime
 import threading
 
 T = TypeVar('T')
-TExecutor = TypeVar('TExecutor')
 T_contra = TypeVar('T_contra', contravariant=True)
 TResult = TypeVar('TResult')
 
@@ -18,6 +17,10 @@ FullfillFunc = Callable[[T], Union[TResult, 'Promise[TResult]']]
 ExecutorFunc = Callable[[ResolveFunc[T]], None]
 PackagedTask = Tuple['Promise[T]', ResolveFunc[T]]
 
+# A pending continuation: the callback to run with the resolved value, and the promise to resolve with its result.
+# Without a promise, the callback is just called. Without a callback, the value is passed on to the promise as-is.
+_Continuation = Tuple[Optional[Callable[[Any], Any]], Optional['Promise']]
+
 
 class Promise(Generic[T]):
     """A simple implementation of the Promise specification.
@@ -62,8 +65,14 @@ class Promise(Generic[T]):
             assert value === 222
 
         Promise(do_work_async_1).then(do_more_work_async).then(process_value)
+
+    A Promise does not do any locking, so it must be resolved and chained on
+    the same thread, which is normally Sublime's worker thread. When that is
+    not the case, use a ThreadSafePromise instead.
     """
 
+    __slots__ = ("resolved", "value", "_continuations")
+
     @classmethod
     def resolve(cls, resolve_value: T) -> 'Promise[T]':
         """Immediately resolves a Promise.
@@ -74,38 +83,24 @@ class Promise(Generic[T]):
         Arguments:
             resolve_value: The value to resolve the promise with.
         """
-        def executor_func(resolve_fn: ResolveFunc[T]) -> None:
-            resolve_fn(resolve_value)
-
-        return cls(executor_func)
+        promise = cls(None)  # type: Promise[T]
+        promise._do_resolve(resolve_value)
+        return promise
 
     @classmethod
     def on_main_thread(cls, value: T) -> 'Promise[T]':
         """Return a promise that resolves on the main thread."""
-        return Promise(lambda resolve: sublime.set_timeout(lambda: resolve(value)))
+        return ThreadSafePromise(lambda resolve: sublime.set_timeout(lambda: resolve(value)))
 
     @classmethod
     def on_async_thread(cls, value: T) -> 'Promise[T]':
         """Return a promise that resolves on the worker thread."""
-        return Promise(lambda resolve: sublime.set_timeout_async(lambda: resolve(value)))
+        return ThreadSafePromise(lambda resolve: sublime.set_timeout_async(lambda: resolve(value)))
 
     @classmethod
     def packaged_task(cls) -> PackagedTask[T]:
-
-        class Executor(Generic[TExecutor]):
-
-            __slots__ = ("resolver",)
-
-            def __init__(self) -> None:
-                self.resolver = None  # type: Optional[ResolveFunc[TExecutor]]
-
-            def __call__(self, resolver: ResolveFunc[TExecutor]) -> None:
-                self.resolver = resolver
-
-        executor = Executor()  # type: Executor[T]
-        promise = cls(executor)
-        assert callable(executor.resolver)
-        return promise, executor.resolver
+        promise = cls(None)  # type: Promise[T]
+        return promise, cast('ResolveFunc[T]', promise._do_resolve)
 
     # Could also support passing plain T.
     @classmethod
@@ -119,38 +114,37 @@ class Promise(Generic[T]):
         :returns:   A promise that gets resolved when all passed promises gets resolved.
                     Gets passed a list with all resolved values.
         """
-        def executor(resolve: ResolveFunc[List[T]]) -> None:
-            was_resolved = False
-
-            def recheck_resolve_status(_: T) -> None:
-                nonlocal was_resolved
-                # We're being called from a Promise that is holding a lock so don't try to use
-                # any methods that would try to acquire it.
-                if not was_resolved and all(p.resolved for p in promises):
-                    was_resolved = True
-                    values = [p.value for p in promises]
-                    resolve(values)
-
-            for p in promises:
-                assert isinstance(p, Promise)
-                p.then(recheck_resolve_status)
-
-        if promises:
-            return Promise(executor)
-        return Promise.resolve([])
-
-    def __init__(self, executor_func: ExecutorFunc[T]) -> None:
+        if not promises:
+            return Promise.resolve([])
+        result = cast('Promise[List[T]]', cls(None))
+        values = [None] * len(promises)  # type: List[Any]
+        countdown = _Countdown(len(promises), cls.is_thread_safe)
+
+        def on_resolved(index: int, value: T) -> None:
+            values[index] = value
+            if countdown.decrement():
+                result._do_resolve(values)
+
+        for index, p in enumerate(promises):
+            assert isinstance(p, Promise)
+            p._add_continuation(functools.partial(on_resolved, index), None)
+        return result
+
+    is_thread_safe = False
+
+    def __init__(self, executor_func: Optional[ExecutorFunc[T]]) -> None:
         """Initialize Promise object.
 
         Arguments:
             executor_func: A function that is executed immediately by this Promise.
             It gets passed a "resolve" function. The "resolve" function, when
-            called, resolves the Promise with the value passed to it.
+            called, resolves the Promise with the value passed to it. When None,
+            the promise stays pending until it is resolved via packaged_task.
         """
         self.resolved = False
-        self.mutex = threading.Lock()
-        self.callbacks = []  # type: List[ResolveFunc[T]]
-        executor_func(lambda value=None: self._do_resolve(value))
+        self._continuations = None  # type: Optional[List[_Continuation]]
+        if executor_func is not None:
+            executor_func(cast('ResolveFunc[T]', self._do_resolve))
 
     def __repr__(self) -> str:
         if self.resolved:
@@ -168,59 +162,97 @@ class Promise(Generic[T]):
         Arguments:
             onfullfilled: The callback to call when this promise gets resolved.
         """
-        def callback_wrapper(resolve_fn: ResolveFunc[TResult], resolve_value: T) -> None:
-            """A wrapper called when this promise resolves.
-
-            Arguments:
-                resolve_fn: A resolve function of newly created promise.
-                resolve_value: The value with which this promise resolved.
-            """
-            result = onfullfilled(resolve_value)
-            # If returned value is a promise then this promise needs to be
-            # resolved with the value of returned promise.
-            if isinstance(result, Promise):
-                result.then(lambda value: resolve_fn(value))
-            else:
-                resolve_fn(result)
-
-        def sync_wrapper(resolve_fn: ResolveFunc[TResult]) -> None:
-            """Call resolve_fn immediately with the resolved value.
-
-            A wrapper function that will immediately resolve resolve_fn with the
-            resolved value of this promise.
-            """
-            callback_wrapper(resolve_fn, self._get_value())
-
-        def async_wrapper(resolve_fn: ResolveFunc[TResult]) -> None:
-            """Queue resolve_fn to be called after this promise resolves later.
-
-            A wrapper function that will resolve received resolve_fn when this promise
-            resolves later.
-            """
-            self._add_callback(functools.partial(callback_wrapper, resolve_fn))
-
-        if self._is_resolved():
-            return Promise(sync_wrapper)
-        return Promise(async_wrapper)
-
-    def _do_resolve(self, new_value: T) -> None:
-        # No need to block as we can't change from resolved to unresolved.
+        promise = cast('Promise[TResult]', self.__class__(None))
+        self._add_continuation(onfullfilled, promise)
+        return promise
+
+    def _do_resolve(self, new_value: Any = None) -> None:
         if self.resolved:
             raise RuntimeError("cannot set the value of an already resolved promise")
-        with self.mutex:
-            self.resolved = True
-            self.value = new_value
-            for callback in self.callbacks:
-                callback(new_value)
+        self.value = new_value
+        self.resolved = True
+        continuations = self._continuations
+        self._continuations = None
+        if continuations:
+            for callback, promise in continuations:
+                _run_continuation(callback, promise, new_value)
+
+    def _add_continuation(self, callback: Optional[Callable[[Any], Any]], promise: Optional['Promise']) -> None:
+        if self.resolved:
+            _run_continuation(callback, promise, self.value)
+        elif self._continuations is None:
+            self._continuations = [(callback, promise)]
+        else:
+            self._continuations.append((callback, promise))
+
 
-    def _add_callback(self, callback: ResolveFunc[T]) -> None:
-        with self.mutex:
-            self.callbacks.append(callback)
+class ThreadSafePromise(Promise[T]):
+    """
+    A Promise that may be resolved on one thread while it is being chained on another, at the cost of a lock per
+    instance. Promises created by then() are thread-safe as well.
+    """
+
+    __slots__ = ("_lock",)
 
-    def _is_resolved(self) -> bool:
-        with self.mutex:
-            return self.resolved
+    is_thread_safe = True
 
-    def _get_value(self) -> T:
-        with self.mutex:
-            return self.value
+    def __init__(self, executor_func: Optional[ExecutorFunc[T]]) -> None:
+        self._lock = threading.Lock()
+        super().__init__(executor_func)
+
+    def _do_resolve(self, new_value: Any = None) -> None:
+        with self._lock:
+            if self.resolved:
+                raise RuntimeError("cannot set the value of an already resolved promise")
+            self.value = new_value
+            self.resolved = True
+            continuations = self._continuations
+            self._continuations = None
+        # Run the continuations outside of the lock, so that they may chain on this promise again.
+        if continuations:
+            for callback, promise in continuations:
+                _run_continuation(callback, promise, new_value)
+
+    def _add_continuation(self, callback: Optional[Callable[[Any], Any]], promise: Optional[Promise]) -> None:
+        with self._lock:
+            if not self.resolved:
+                if self._continuations is None:
+                    self._continuations = [(callback, promise)]
+                else:
+                    self._continuations.append((callback, promise))
+                return
+        _run_continuation(callback, promise, self.value)
+
+
+def _run_continuation(callback: Optional[Callable[[Any], Any]], promise: Optional[Promise], value: Any) -> None:
+    if promise is None:
+        assert callback is not None
+        callback(value)
+    elif callback is None:
+        promise._do_resolve(value)
+    else:
+        result = callback(value)
+        # If returned value is a promise then the chained promise needs to be
+        # resolved with the value of returned promise.
+        if isinstance(result, Promise):
+            result._add_continuation(None, promise)
+        else:
+            promise._do_resolve(result)
+
+
+class _Countdown:
+
+    __slots__ = ("_remaining", "_lock")
+
+    def __init__(self, count: int, thread_safe: bool) -> None:
+        self._remaining = count
+        self._lock = threading.Lock() if thread_safe else None
+
+    def decrement(self) -> bool:
+        """Count down by one, and return whether the count reached zero."""
+        if self._lock is None:
+            self._remaining -= 1
+            return self._remaining == 0
+        with self._lock:
+            self._remaining -= 1
+            return self._remaining == 0
@@ -51,6 +51,17 @@ class InsertTextMode:
     AdjustIndentation = 2
 
 
+class PositionEncodingKind:
+    UTF8 = 'utf-8'
+    UTF16 = 'utf-16'
+    UTF32 = 'utf-32'
+
+
+class DocumentDiagnosticReportKind:
+    Full = 'full'
+    Unchanged = 'unchanged'
+
+
 DocumentUri = str
 
 Position = TypedDict('Position', {
@@ -236,6 +247,24 @@ Hover = TypedDict('Hover', {
     'range': RangeLsp,
 }, total=False)
 
+InlayHintLabelPart = TypedDict('InlayHintLabelPart', {
+    'value': str,
+    'tooltip': Union[str, MarkupContent],
+    'location': Location,
+    'command': Command
+}, total=False)
+
+InlayHint = TypedDict('InlayHint', {
+    'position': Position,
+    'label': Union[str, List[InlayHintLabelPart]],
+    'kind': int,
+    'textEdits': List[TextEdit],
+    'tooltip': Union[str, MarkupContent],
+    'paddingLeft': bool,
+    'paddingRight': bool,
+    'data': Any
+}, total=False)
+
 PublishDiagnosticsParams = TypedDict('PublishDiagnosticsParams', {
     'uri': DocumentUri,
     'version': Optional[int],
@@ -270,19 +299,22 @@ FileEvent = TypedDict("FileEvent", {
 
 class Request:
 
-    __slots__ = ('method', 'params', 'view', 'progress')
+    __slots__ = ('method', 'params', 'view', 'progress', 'priority')
 
     def __init__(
         self,
         method: str,
         params: Optional[Mapping[str, Any]] = None,
         view: Optional[sublime.View] = None,
-        progress: bool = False
+        progress: bool = False,
+        priority: Optional[int] = None
     ) -> None:
         self.method = method
         self.params = params
         self.view = view
         self.progress = progress  # type: Union[bool, str]
+        # One of the RequestPriority values, or None for the default priority of the method.
+        self.priority = priority
 
     @classmethod
     def initialize(cls, params: Mapping[str, Any]) -> 'Request':
@@ -335,6 +367,14 @@ class Request:
             "params": self.params
         }
 
+    @classmethod
+    def inlayHint(cls, params: Mapping[str, Any], view: sublime.View) -> 'Request':
+        return Request('textDocument/inlayHint', params, view)
+
+    @classmethod
+    def resolveInlayHint(cls, params: InlayHint, view: sublime.View) -> 'Request':
+        return Request('inlayHint/resolve', params, view)
+
     @classmethod
     def semanticTokens(cls, params: Mapping[str, Any], view: sublime.View) -> 'Request':
         return Request("textDocument/semanticTokens/full", params, view)
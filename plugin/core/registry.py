@@ -2,7 +2,7 @@ from .configurations import ConfigManager
 from .sessions import AbstractViewListener
 from .sessions import Session
 from .settings import client_configs
-from .typing import Optional, Any, Generator, Iterable
+from .typing import Optional, Any, Generator, Iterable, List
 from .windows import WindowRegistry
 import sublime
 import sublime_plugin
@@ -122,7 +122,7 @@ class LspRestartServerCommand(LspTextCommand):
             config_name = self._config_names[index]
             if not config_name:
                 return
-            self._wm._end_sessions_async(config_name)
+            self._wm._end_sessions_async(config_name, everywhere=True)
             listener = windows.listener_for_view(self.view)
             if listener:
                 self._wm.register_listener_async(listener)
@@ -131,5 +131,6 @@ class LspRestartServerCommand(LspTextCommand):
 
 
 class LspRecheckSessionsCommand(sublime_plugin.WindowCommand):
-    def run(self, config_name: Optional[str] = None) -> None:
-        sublime.set_timeout_async(lambda: windows.lookup(self.window).restart_sessions_async(config_name))
+    def run(self, config_name: Optional[str] = None, config_names: Optional[List[str]] = None) -> None:
+        sublime.set_timeout_async(
+            lambda: windows.lookup(self.window).restart_sessions_async(config_name, config_names))
@@ -0,0 +1,188 @@
+from .protocol import DocumentUri
+from .protocol import Request
+from .settings import userprefs
+from .typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from collections import deque
+import sublime
+import time
+
+
+class RequestPriority:
+    # Requests that the user waits for, like completions and hover.
+    INTERACTIVE = 0
+    # Requests for what is on the screen, like highlights and inlay hints.
+    VISIBLE = 1
+    # Requests whose results can wait, like semantic tokens and the diagnostics of the workspace.
+    BACKGROUND = 2
+
+
+PRIORITY_NAMES = ("interactive", "visible", "background")
+
+# How long an interactive request in flight holds back background requests. A server that takes long to answer, or
+# never answers, would otherwise stop the background work of the session.
+INTERACTIVE_BLOCKING_MS = 2000
+
+# Requests of methods that aren't listed here are interactive.
+_DEFAULT_PRIORITIES = {
+    "codeLens/resolve": RequestPriority.BACKGROUND,
+    "textDocument/codeAction": RequestPriority.VISIBLE,
+    "textDocument/codeLens": RequestPriority.VISIBLE,
+    "textDocument/diagnostic": RequestPriority.VISIBLE,
+    "textDocument/documentColor": RequestPriority.BACKGROUND,
+    "textDocument/documentHighlight": RequestPriority.VISIBLE,
+    "textDocument/documentLink": RequestPriority.BACKGROUND,
+    "textDocument/foldingRange": RequestPriority.BACKGROUND,
+    "textDocument/inlayHint": RequestPriority.VISIBLE,
+    "textDocument/semanticTokens/full": RequestPriority.BACKGROUND,
+    "textDocument/semanticTokens/full/delta": RequestPriority.BACKGROUND,
+    "textDocument/semanticTokens/range": RequestPriority.VISIBLE,
+    "workspace/diagnostic": RequestPriority.BACKGROUND,
+}  # type: Dict[str, int]
+
+
+def request_priority(request: Request) -> int:
+    if request.priority is not None:
+        return request.priority
+    return _DEFAULT_PRIORITIES.get(request.method, RequestPriority.INTERACTIVE)
+
+
+def request_document_uri(request: Request) -> Optional[DocumentUri]:
+    params = request.params
+    if isinstance(params, dict):
+        text_document = params.get("textDocument")
+        if isinstance(text_document, dict):
+            return text_document.get("uri")
+    return None
+
+
+class RequestScheduler:
+    """
+    Decides when the requests of a session are written to the transport. Every priority has its own queue and limit
+    of requests in flight, so that background work doesn't compete with what the user waits for. A request waits
+    while its priority has reached its limit, or while a more urgent request waits. Background requests also wait
+    while an interactive request is in flight, for at most INTERACTIVE_BLOCKING_MS.
+    """
+
+    __slots__ = ("_send", "_limits", "_queues", "_in_flight", "_sent", "_held", "_dropped", "_max_wait",
+                 "_dispatch_scheduled")
+
+    def __init__(self, send: Callable[[int, Request], None], limits: Optional[Dict[str, int]] = None) -> None:
+        self._send = send
+        # The in-flight limits by priority name, or None to use the "request_in_flight_limits" setting.
+        self._limits = limits
+        # The waiting requests of every priority, with the time they were scheduled.
+        self._queues = tuple(deque() for _ in PRIORITY_NAMES)  # type: Tuple[Deque[Tuple[int, Request, float]], ...]
+        # The requests in flight of every priority, with the time they were sent.
+        self._in_flight = tuple({} for _ in PRIORITY_NAMES)  # type: Tuple[Dict[int, float], ...]
+        self._sent = [0] * len(PRIORITY_NAMES)
+        self._held = [0] * len(PRIORITY_NAMES)
+        self._dropped = [0] * len(PRIORITY_NAMES)
+        self._max_wait = [0.0] * len(PRIORITY_NAMES)
+        self._dispatch_scheduled = False
+
+    def schedule_async(self, request_id: int, request: Request) -> None:
+        priority = request_priority(request)
+        if not self._queues[priority] and self._can_send(priority):
+            self._send_async(priority, request_id, request, time.time())
+        else:
+            self._held[priority] += 1
+            self._queues[priority].append((request_id, request, time.time()))
+            self._schedule_dispatch_async()
+
+    def on_response_async(self, request_id: int) -> None:
+        for in_flight in self._in_flight:
+            if request_id in in_flight:
+                del in_flight[request_id]
+                self._dispatch_async()
+                return
+
+    def take_waiting_async(self, pred: Callable[[int, Request], bool]) -> List[Tuple[int, Request]]:
+        """
+        Removes the waiting requests that satisfy `pred` from their queues, and returns them. Either send them with
+        `send_now_async`, or count them as dropped with `on_dropped`.
+        """
+        result = []  # type: List[Tuple[int, Request]]
+        for queue in self._queues:
+            for entry in list(queue):
+                if pred(entry[0], entry[1]):
+                    queue.remove(entry)
+                    result.append((entry[0], entry[1]))
+        return result
+
+    def send_now_async(self, request_id: int, request: Request) -> None:
+        """Sends a request that was taken out of its queue, regardless of the limits."""
+        self._send_async(request_priority(request), request_id, request, time.time())
+
+    def on_dropped(self, request: Request) -> None:
+        self._dropped[request_priority(request)] += 1
+
+    def clear(self) -> None:
+        for queue, in_flight in zip(self._queues, self._in_flight):
+            queue.clear()
+            in_flight.clear()
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        The number of requests that wait and are in flight, how many were sent, had to wait or were dropped, and the
+        longest wait in milliseconds, by priority.
+        """
+        return {
+            name: {
+                "waiting": len(self._queues[priority]),
+                "in_flight": len(self._in_flight[priority]),
+                "limit": self._limit(priority),
+                "sent": self._sent[priority],
+                "held": self._held[priority],
+                "dropped": self._dropped[priority],
+                "max_wait_ms": int(self._max_wait[priority] * 1000)
+            } for priority, name in enumerate(PRIORITY_NAMES)
+        }
+
+    def _limit(self, priority: int) -> int:
+        limits = self._limits if self._limits is not None else userprefs().request_in_flight_limits
+        limit = limits.get(PRIORITY_NAMES[priority], 0)
+        return limit if isinstance(limit, int) and limit > 0 else 0
+
+    def _can_send(self, priority: int) -> bool:
+        limit = self._limit(priority)
+        if limit and len(self._in_flight[priority]) >= limit:
+            return False
+        if any(self._queues[more_urgent] for more_urgent in range(priority)):
+            return False
+        if priority == RequestPriority.BACKGROUND and self._interactive_blocking_ms() > 0:
+            return False
+        return True
+
+    def _interactive_blocking_ms(self) -> int:
+        """How much longer the interactive requests in flight hold back background requests."""
+        in_flight = self._in_flight[RequestPriority.INTERACTIVE]
+        if not in_flight:
+            return 0
+        elapsed = time.time() - max(in_flight.values())
+        return max(0, INTERACTIVE_BLOCKING_MS - int(elapsed * 1000))
+
+    def _schedule_dispatch_async(self) -> None:
+        # Nothing else happens when the interactive requests in flight stop holding back background requests.
+        if self._dispatch_scheduled or not self._queues[RequestPriority.BACKGROUND]:
+            return
+        delay = self._interactive_blocking_ms()
+        if delay > 0:
+            self._dispatch_scheduled = True
+            sublime.set_timeout_async(self._on_dispatch_timeout_async, delay)
+
+    def _on_dispatch_timeout_async(self) -> None:
+        self._dispatch_scheduled = False
+        self._dispatch_async()
+
+    def _dispatch_async(self) -> None:
+        for priority, queue in enumerate(self._queues):
+            while queue and self._can_send(priority):
+                request_id, request, scheduled = queue.popleft()
+                self._send_async(priority, request_id, request, scheduled)
+        self._schedule_dispatch_async()
+
+    def _send_async(self, priority: int, request_id: int, request: Request, scheduled: float) -> None:
+        self._max_wait[priority] = max(self._max_wait[priority], time.time() - scheduled)
+        self._sent[priority] += 1
+        self._in_flight[priority][request_id] = time.time()
+        self._send(request_id, request)
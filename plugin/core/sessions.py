@@ -15,25 +15,34 @@ from .open import open_externally
 from .progress import WindowProgressReporter
 from .promise import PackagedTask
 from .promise import Promise
+from .promise import ThreadSafePromise
 from .protocol import CodeAction, CodeLens, InsertTextMode, Location, LocationLink, Position
 from .protocol import Command
 from .protocol import CompletionItemTag
 from .protocol import Diagnostic
 from .protocol import DiagnosticSeverity
 from .protocol import DiagnosticTag
+from .protocol import DocumentDiagnosticReportKind
 from .protocol import DidChangeWatchedFilesRegistrationOptions
 from .protocol import DocumentUri
 from .protocol import Error
 from .protocol import ErrorCode
 from .protocol import ExecuteCommandParams
 from .protocol import FileEvent
+from .protocol import Hover
 from .protocol import Notification
+from .protocol import PositionEncodingKind
 from .protocol import RangeLsp
 from .protocol import Request
 from .protocol import Response
 from .protocol import SymbolTag
 from .protocol import WorkspaceFolder
+from .scheduler import request_document_uri
+from .scheduler import RequestScheduler
 from .settings import client_configs
+from .snapshot import DIAGNOSTICS
+from .snapshot import Snapshot
+from .snapshot import snapshot_path
 from .settings import globalprefs
 from .transports import Transport
 from .transports import TransportCallbacks
@@ -54,15 +63,16 @@ from .views import COMPLETION_KINDS
 from .views import extract_variables
 from .views import get_storage_path
 from .views import get_uri_and_range_from_location
+from .views import is_visible
 from .views import MarkdownLangMap
 from .views import SYMBOL_KINDS
 from .views import to_encoded_filename
 from .workspace import is_subpath_of
 from abc import ABCMeta
 from abc import abstractmethod
+from collections import OrderedDict
 from weakref import WeakSet
 import functools
-import mdpopups
 import os
 import sublime
 import weakref
@@ -143,6 +153,7 @@ def get_initialize_params(variables: Dict[str, str], workspace_folders: List[Wor
     diagnostic_tag_value_set = [v for k, v in DiagnosticTag.__dict__.items() if not k.startswith('_')]
     completion_tag_value_set = [v for k, v in CompletionItemTag.__dict__.items() if not k.startswith('_')]
     symbol_tag_value_set = [v for k, v in SymbolTag.__dict__.items() if not k.startswith('_')]
+    import mdpopups
     first_folder = workspace_folders[0] if workspace_folders else None
     general_capabilities = {
         # https://microsoft.github.io/language-server-protocol/specification#regExp
@@ -157,7 +168,11 @@ def get_initialize_params(variables: Dict[str, str], workspace_folders: List[Wor
             # https://python-markdown.github.io
             "parser": "Python-Markdown",
             "version": mdpopups.markdown.__version__  # type: ignore
-        }
+        },
+        # https://microsoft.github.io/language-server-protocol/specifications/lsp/3.17/specification/#positionEncodingKind
+        # UTF-32 columns are the code point offsets that Sublime Text uses itself, and UTF-8 columns are tracked by
+        # Sublime Text for text changes. UTF-16 must always be supported.
+        "positionEncodings": [PositionEncodingKind.UTF32, PositionEncodingKind.UTF8, PositionEncodingKind.UTF16]
     }
     text_document_capabilities = {
         "synchronization": {
@@ -282,6 +297,16 @@ def get_initialize_params(variables: Dict[str, str], workspace_folders: List[Wor
         "codeLens": {
             "dynamicRegistration": True
         },
+        "diagnostic": {
+            "dynamicRegistration": True,
+            "relatedDocumentSupport": False
+        },
+        "inlayHint": {
+            "dynamicRegistration": True,
+            "resolveSupport": {
+                "properties": ["textEdits"]
+            }
+        },
         "semanticTokens": {
             "dynamicRegistration": True,
             "tokenTypes": [
@@ -356,6 +381,12 @@ def get_initialize_params(variables: Dict[str, str], workspace_folders: List[Wor
         "configuration": True,
         "codeLens": {
             "refreshSupport": True
+        },
+        "diagnostics": {
+            "refreshSupport": True
+        },
+        "inlayHint": {
+            "refreshSupport": True
         }
     }
     window_capabilities = {
@@ -435,6 +466,9 @@ class SessionViewProtocol(Protocol):
     def present_diagnostics_async(self) -> None:
         ...
 
+    def present_inlay_hints_async(self) -> None:
+        ...
+
     def on_request_started_async(self, request_id: int, request: Request) -> None:
         ...
 
@@ -487,9 +521,25 @@ class SessionBufferProtocol(Protocol):
     ) -> None:
         ...
 
+    @property
+    def evicted(self) -> bool:
+        ...
+
     def on_diagnostics_async(self, raw_diagnostics: List[Diagnostic], version: Optional[int]) -> None:
         ...
 
+    def do_document_diagnostic_async(self, view: sublime.View, version: Optional[int] = None) -> None:
+        ...
+
+    def refresh_document_diagnostic_async(self) -> None:
+        ...
+
+    def refresh_inlay_hints_async(self) -> None:
+        ...
+
+    def get_hover_async(self, view: sublime.View, point: int) -> 'Promise[Union[Hover, Error, None]]':
+        ...
+
 
 class AbstractViewListener(metaclass=ABCMeta):
 
@@ -658,6 +708,9 @@ class AbstractPlugin(metaclass=ABCMeta):
     def additional_variables(cls) -> Optional[Dict[str, str]]:
         """
         In addition to the above variables, add more variables here to be expanded.
+
+        The answers to workspace/configuration requests are cached. When these variables change while the server
+        runs, call `Session.invalidate_configuration_cache` or send a workspace/didChangeConfiguration notification.
         """
         return None
 
@@ -1018,6 +1071,12 @@ class _RegistrationData:
 
 _WORK_DONE_PROGRESS_PREFIX = "wd"
 
+# How long the workspace/diagnostic request waits behind the textDocument/diagnostic requests of visible documents.
+_WORKSPACE_DIAGNOSTIC_DELAY_MS = 1000
+
+# The number of answered workspace/configuration items that are kept.
+_CONFIGURATION_CACHE_SIZE = 1000
+
 
 class Session(TransportCallbacks):
 
@@ -1028,9 +1087,12 @@ class Session(TransportCallbacks):
         self.request_id = 0  # Our request IDs are always integers.
         self._logger = logger
         self._response_handlers = {}  # type: Dict[int, Tuple[Request, Callable, Optional[Callable[[Any], None]]]]
+        self.request_scheduler = RequestScheduler(self._write_request_async)
         self.config = config
-        self.manager = weakref.ref(manager)
-        self.window = manager.window()
+        # The managers of the windows that use this session. Servers that support workspace folders can serve more
+        # than one window, see `attach_manager_async`.
+        self._managers = [weakref.ref(manager)]  # type: List[weakref.ref]
+        self._window = manager.window()
         self.state = ClientStates.STARTING
         self.capabilities = Capabilities()
         self.exiting = False
@@ -1039,9 +1101,11 @@ class Session(TransportCallbacks):
         self._initialize_error = None  # type: Optional[Tuple[int, Optional[Exception]]]
         self._views_opened = 0
         self._workspace_folders = workspace_folders
+        # The workspace folders of each window that uses this session, by window id.
+        self._window_folders = {self._window.id(): workspace_folders}  # type: Dict[int, List[WorkspaceFolder]]
         self._session_views = WeakSet()  # type: WeakSet[SessionViewProtocol]
         self._session_buffers = WeakSet()  # type: WeakSet[SessionBufferProtocol]
-        self._progress = {}  # type: Dict[str, Optional[WindowProgressReporter]]
+        self._progress = {}  # type: Dict[str, Optional[List[WindowProgressReporter]]]
         self._watcher_impl = get_file_watcher_implementation()
         self._static_file_watchers = []  # type: List[FileWatcher]
         self._dynamic_file_watchers = {}  # type: Dict[str, List[FileWatcher]]
@@ -1049,6 +1113,20 @@ class Session(TransportCallbacks):
         self._plugin = None  # type: Optional[AbstractPlugin]
         self._status_messages = {}  # type: Dict[str, str]
         self.diagnostics_manager = DiagnosticsManager()
+        # The last known diagnostics and document symbols, kept on disk for the next session of this project.
+        self.snapshot = None  # type: Optional[Snapshot]
+        if config.snapshot:
+            self.snapshot = Snapshot(snapshot_path(config.name, workspace_folders))
+            self.snapshot.load()
+            for uri, diagnostics in self.snapshot.items(DIAGNOSTICS):
+                self.diagnostics_manager.add_stale_diagnostics_async(uri, diagnostics)
+        # The resultIds of the last workspace/diagnostic reports, sent back so that the server can skip unchanged ones.
+        self._workspace_diagnostic_result_ids = {}  # type: Dict[DocumentUri, str]
+        self._workspace_diagnostic_pending = False
+        self._workspace_diagnostic_scheduled = False
+        self._workspace_diagnostic_outdated = False
+        # The answered workspace/configuration items by window, section and scope, see `m_workspace_configuration`.
+        self._configuration_cache = OrderedDict()  # type: OrderedDict[Tuple[int, Optional[str], Optional[str]], Any]
 
     def __getattr__(self, name: str) -> Any:
         """
@@ -1067,6 +1145,70 @@ class Session(TransportCallbacks):
     def uses_plugin(self) -> bool:
         return self._plugin is not None
 
+    # --- window management --------------------------------------------------------------------------------------------
+
+    def manager(self) -> Optional[Manager]:
+        """
+        The manager of the active window if it uses this session, or else the manager of the window that started it.
+        """
+        managers = self.managers()
+        if len(managers) > 1:
+            active_window = sublime.active_window()
+            for manager in managers:
+                if manager.window() == active_window:
+                    return manager
+        return managers[0] if managers else None
+
+    def managers(self) -> List[Manager]:
+        return [manager for manager in (ref() for ref in self._managers) if manager is not None]
+
+    @property
+    def window(self) -> sublime.Window:
+        manager = self.manager()
+        return manager.window() if manager else self._window
+
+    def windows(self) -> List[sublime.Window]:
+        return [manager.window() for manager in self.managers()]
+
+    def is_shared(self) -> bool:
+        return len(self.managers()) > 1
+
+    def can_attach(self, workspace_folders: List[WorkspaceFolder]) -> bool:
+        """
+        Whether a window with the given workspace folders can use this session instead of starting a server of its own.
+        That is the case for running servers that are told about workspace folder changes, when a folder of the window
+        overlaps with one of the folders of the session.
+        """
+        if self.exiting or self.state != ClientStates.READY or not self.should_notify_did_change_workspace_folders():
+            return False
+        for folder in workspace_folders:
+            for own_folder in self._workspace_folders:
+                if is_subpath_of(folder.path, own_folder.path) or is_subpath_of(own_folder.path, folder.path):
+                    return True
+        return False
+
+    def attach_manager_async(self, manager: Manager, workspace_folders: List[WorkspaceFolder]) -> None:
+        """Let another window use this session. Its workspace folders are added to the ones of the server."""
+        if manager not in self.managers():
+            self._managers.append(weakref.ref(manager))
+        self.update_folders(workspace_folders, manager)
+
+    def detach_manager_async(self, manager: Manager) -> bool:
+        """
+        Stop using this session in the window of the given manager, and remove the workspace folders that only that
+        window has from the server. Returns False when no other window uses this session, so that it should end.
+        """
+        others = [m for m in self.managers() if m is not manager]
+        if self.exiting or not others:
+            return False
+        self._managers = [weakref.ref(m) for m in others]
+        # A standby session is handed over to another manager of the same window, which keeps the folders.
+        window_id = manager.window().id()
+        if all(m.window().id() != window_id for m in others):
+            self._window_folders.pop(window_id, None)
+        self._update_workspace_folders_async()
+        return True
+
     # --- session view management --------------------------------------------------------------------------------------
 
     def register_session_view_async(self, sv: SessionViewProtocol) -> None:
@@ -1180,6 +1322,11 @@ class Session(TransportCallbacks):
             return None
         return self.capabilities.get(capability)
 
+    @property
+    def position_encoding(self) -> str:
+        """The encoding in which the columns of positions are counted, as chosen by the server during initialization."""
+        return self.capabilities.get("positionEncoding") or PositionEncodingKind.UTF16
+
     def should_notify_did_open(self) -> bool:
         return self.capabilities.should_notify_did_open()
 
@@ -1231,7 +1378,20 @@ class Session(TransportCallbacks):
                 return True
         return False
 
-    def update_folders(self, folders: List[WorkspaceFolder]) -> None:
+    def update_folders(self, folders: List[WorkspaceFolder], manager: Optional[Manager] = None) -> None:
+        """Set the workspace folders of the window of the given manager, or of the window that started the session."""
+        window = manager.window() if manager else self._window
+        self._window_folders[window.id()] = folders
+        self._update_workspace_folders_async()
+
+    def _update_workspace_folders_async(self) -> None:
+        self.invalidate_configuration_cache()
+        # Combine the folders of all windows that use this session, in the order in which the windows attached.
+        folders = []  # type: List[WorkspaceFolder]
+        for window in self.windows():
+            for folder in self._window_folders.get(window.id(), []):
+                if folder not in folders:
+                    folders.append(folder)
         if self.should_notify_did_change_workspace_folders():
             added, removed = diff(self._workspace_folders, folders)
             if added or removed:
@@ -1288,6 +1448,7 @@ class Session(TransportCallbacks):
         if self._init_callback:
             self._init_callback(self, False)
             self._init_callback = None
+        self.schedule_workspace_diagnostic_async()
 
     def _handle_initialize_error(self, result: Any) -> None:
         self._initialize_error = (result.get('code', -1), Exception(result.get('message', 'Error initializing server')))
@@ -1338,12 +1499,12 @@ class Session(TransportCallbacks):
     def execute_command(self, command: ExecuteCommandParams, progress: bool) -> Promise:
         """Run a command from any thread. Your .then() continuations will run in Sublime's worker thread."""
         if self._plugin:
-            task = Promise.packaged_task()  # type: PackagedTask[None]
+            task = ThreadSafePromise.packaged_task()  # type: PackagedTask[None]
             promise, resolve = task
             if self._plugin.on_pre_server_command(command, lambda: resolve(None)):
                 return promise
         # TODO: Our Promise class should be able to handle errors/exceptions
-        return Promise(
+        return ThreadSafePromise(
             lambda resolve: self.send_request(
                 Request("workspace/executeCommand", command, None, progress),
                 resolve,
@@ -1378,7 +1539,8 @@ class Session(TransportCallbacks):
             # TODO: open_file_and_center_async seems broken for views that have *just* been opened via on_load
             path = self.config.map_server_uri_to_client_path(uri)
             pos = r["start"] if r else {"line": 0, "character": 0}  # type: Position
-            self.window.open_file(to_encoded_filename(path, pos), flags | sublime.ENCODED_POSITION, group)
+            file_name = to_encoded_filename(path, pos, self.position_encoding, self.window)
+            self.window.open_file(file_name, flags | sublime.ENCODED_POSITION, group)
             return Promise.resolve(True)
         # Try to find a pre-existing session-buffer
         sb = self.get_session_buffer_for_uri_async(uri)
@@ -1386,16 +1548,16 @@ class Session(TransportCallbacks):
             view = sb.get_view_in_group(group)
             self.window.focus_view(view)
             if r:
-                center_selection(view, r)
+                center_selection(view, r, self.position_encoding)
             return Promise.resolve(True)
         # There is no pre-existing session-buffer, so we have to go through AbstractPlugin.on_open_uri_async.
         if self._plugin:
             # I cannot type-hint an unpacked tuple
-            pair = Promise.packaged_task()  # type: PackagedTask[Tuple[str, str, str]]
+            pair = ThreadSafePromise.packaged_task()  # type: PackagedTask[Tuple[str, str, str]]
             # It'd be nice to have automatic tuple unpacking continuations
             callback = lambda a, b, c: pair[1]((a, b, c))  # noqa: E731
             if self._plugin.on_open_uri_async(uri, callback):
-                result = Promise.packaged_task()  # type: PackagedTask[bool]
+                result = ThreadSafePromise.packaged_task()  # type: PackagedTask[bool]
 
                 def open_scratch_buffer(title: str, content: str, syntax: str) -> None:
                     v = self.window.new_file(syntax=syntax, flags=flags)
@@ -1407,7 +1569,7 @@ class Session(TransportCallbacks):
                     v.run_command("append", {"characters": content})
                     v.set_read_only(True)
                     if r:
-                        center_selection(v, r)
+                        center_selection(v, r, self.position_encoding)
                     sublime.set_timeout_async(lambda: result[1](True))
 
                 pair[0].then(lambda tup: sublime.set_timeout(lambda: open_scratch_buffer(*tup)))
@@ -1456,7 +1618,7 @@ class Session(TransportCallbacks):
         """
         changes = parse_workspace_edit(edit)
         return Promise.on_main_thread(None) \
-            .then(lambda _: apply_workspace_edit(self.window, changes)) \
+            .then(lambda _: apply_workspace_edit(self.window, changes, self.position_encoding)) \
             .then(lambda _: Promise.on_async_thread(None))
 
     # --- server request handlers --------------------------------------------------------------------------------------
@@ -1481,12 +1643,34 @@ class Session(TransportCallbacks):
         """handles the workspace/configuration request"""
         items = []  # type: List[Any]
         requested_items = params.get("items") or []
+        variables = None  # type: Optional[Dict[str, str]]
+        # The settings of a section are the same for every scope, unless the plugin changes them per scope.
+        per_scope = self._plugin is not None and \
+            type(self._plugin).on_workspace_configuration is not AbstractPlugin.on_workspace_configuration
         for requested_item in requested_items:
-            configuration = self.config.settings.copy(requested_item.get('section') or None)
-            if self._plugin:
-                self._plugin.on_workspace_configuration(requested_item, configuration)
-            items.append(configuration)
-        self.send_response(Response(request_id, sublime.expand_variables(items, self._template_variables())))
+            section = requested_item.get('section') or None
+            key = (self.window.id(), section, requested_item.get('scopeUri') if per_scope else None)
+            if key in self._configuration_cache:
+                self._configuration_cache.move_to_end(key)
+            else:
+                configuration = self.config.settings.copy(section)
+                if self._plugin:
+                    self._plugin.on_workspace_configuration(requested_item, configuration)
+                if variables is None:
+                    variables = self._template_variables()
+                self._configuration_cache[key] = sublime.expand_variables(configuration, variables)
+                if len(self._configuration_cache) > _CONFIGURATION_CACHE_SIZE:
+                    self._configuration_cache.popitem(last=False)
+            items.append(self._configuration_cache[key])
+        self.send_response(Response(request_id, items))
+
+    def invalidate_configuration_cache(self) -> None:
+        """
+        Forget the answers to workspace/configuration requests, so that the next requests are answered from the
+        current settings and variables. This happens by itself when a workspace/didChangeConfiguration notification
+        is sent, and when the project or the workspace folders change.
+        """
+        self._configuration_cache.clear()
 
     def m_workspace_applyEdit(self, params: Any, request_id: Any) -> None:
         """handles the workspace/applyEdit request"""
@@ -1500,20 +1684,144 @@ class Session(TransportCallbacks):
                 sv.start_code_lenses_async()
         self.send_response(Response(request_id, None))
 
+    def m_workspace_diagnostic_refresh(self, _: Any, request_id: Any) -> None:
+        """handles the workspace/diagnostic/refresh request"""
+        self.send_response(Response(request_id, None))
+        self._workspace_diagnostic_result_ids.clear()
+        for sb in self.session_buffers_async():
+            sb.refresh_document_diagnostic_async()
+        self.schedule_workspace_diagnostic_async()
+
+    def m_workspace_inlayHint_refresh(self, _: Any, request_id: Any) -> None:
+        """handles the workspace/inlayHint/refresh request"""
+        self.send_response(Response(request_id, None))
+        for sb in self.session_buffers_async():
+            sb.refresh_inlay_hints_async()
+
     def m_textDocument_publishDiagnostics(self, params: Any) -> None:
         """handles the textDocument/publishDiagnostics notification"""
-        uri = params["uri"]
-        mgr = self.manager()
-        if not mgr:
+        self.handle_diagnostics_async(params["uri"], params["diagnostics"], params.get("version"))
+
+    def handle_diagnostics_async(
+        self, uri: DocumentUri, diagnostics: List[Diagnostic], version: Optional[int], update_panel: bool = True
+    ) -> None:
+        """
+        Stores the diagnostics of a document, whether they were pushed by the server or pulled by us, and forwards them
+        to the session buffer of the document, if any.
+        """
+        managers = self.managers()
+        if not managers:
             return
-        reason = mgr.should_present_diagnostics(uri)
-        if isinstance(reason, str):
-            return debug("ignoring unsuitable diagnostics for", uri, "reason:", reason)
-        self.diagnostics_manager.add_diagnostics_async(uri, params["diagnostics"])
-        mgr.update_diagnostics_panel_async()
+        # The diagnostics of a session that several windows share are presented in every window they suit.
+        reasons = [mgr.should_present_diagnostics(uri) for mgr in managers]
+        if None not in reasons:
+            return debug("ignoring unsuitable diagnostics for", uri, "reason:", reasons[0])
         sb = self.get_session_buffer_for_uri_async(uri)
+        if sb and sb.evicted and not diagnostics:
+            # Servers clear the diagnostics of closed documents, but this one was only closed because it was idle.
+            return debug("keeping diagnostics of idle document", uri)
+        self.diagnostics_manager.add_diagnostics_async(uri, diagnostics)
+        if self.snapshot:
+            # Diagnostics of unsaved changes don't belong to the file on disk.
+            unsaved = sb is not None and any(sv.view.is_dirty() for sv in sb.session_views)
+            self.snapshot.put(DIAGNOSTICS, uri, None if unsaved or not diagnostics else diagnostics)
+        if update_panel:
+            for mgr in managers:
+                mgr.update_diagnostics_panel_async()
         if sb:
-            sb.on_diagnostics_async(params["diagnostics"], params.get("version"))
+            sb.on_diagnostics_async(diagnostics, version)
+
+    # --- Pull diagnostics ---------------------------------------------------------------------------------------------
+
+    def do_visible_document_diagnostics_async(self, exclude: Optional[SessionBufferProtocol] = None) -> None:
+        """Pull the diagnostics of the documents that are visible in the window, except for `exclude`."""
+        for sb in self.session_buffers_async():
+            if sb is exclude:
+                continue
+            for sv in sb.session_views:
+                if is_visible(sv.view):
+                    sb.do_document_diagnostic_async(sv.view)
+                    break
+
+    def do_diagnostics_after_change_async(self, sb: SessionBufferProtocol, view: sublime.View, version: int) -> None:
+        """
+        Pull the diagnostics of a document that was just changed first, then those of the other visible documents if
+        the diagnostics of a document can depend on other documents, and finally those of the whole workspace in the
+        background.
+        """
+        sb.do_document_diagnostic_async(view, version)
+        if self.get_capability("diagnosticProvider.interFileDependencies"):
+            self.do_visible_document_diagnostics_async(exclude=sb)
+        self.schedule_workspace_diagnostic_async()
+
+    def schedule_workspace_diagnostic_async(self) -> None:
+        """
+        Request the diagnostics of the whole workspace a while from now, so that the requests for the documents that
+        are being looked at go first. Only one workspace/diagnostic request is in flight at any time.
+        """
+        if not self.has_capability("diagnosticProvider.workspaceDiagnostics") or self.exiting:
+            return
+        if self._workspace_diagnostic_pending:
+            self._workspace_diagnostic_outdated = True
+            return
+        if self._workspace_diagnostic_scheduled:
+            return
+        self._workspace_diagnostic_scheduled = True
+        sublime.set_timeout_async(self._do_workspace_diagnostic_async, _WORKSPACE_DIAGNOSTIC_DELAY_MS)
+
+    def _do_workspace_diagnostic_async(self) -> None:
+        self._workspace_diagnostic_scheduled = False
+        if self.exiting or self._workspace_diagnostic_pending:
+            return
+        params = {
+            "previousResultIds": [
+                {"uri": uri, "value": result_id} for uri, result_id in self._workspace_diagnostic_result_ids.items()
+            ]
+        }  # type: Dict[str, Any]
+        identifier = self.get_capability("diagnosticProvider.identifier")
+        if identifier:
+            params["identifier"] = identifier
+        self._workspace_diagnostic_pending = True
+        self._workspace_diagnostic_outdated = False
+        self.send_request_async(
+            Request("workspace/diagnostic", params),
+            self._on_workspace_diagnostic_async,
+            lambda _: self._on_workspace_diagnostic_async(None)
+        )
+
+    def _on_workspace_diagnostic_async(self, response: Any) -> None:
+        self._workspace_diagnostic_pending = False
+        if self.exiting:
+            return
+        items = response.get("items") if isinstance(response, dict) else None
+        # The server reported on the whole workspace, so what is left of the snapshot is outdated.
+        clear_stale = isinstance(response, dict) and bool(self.diagnostics_manager.stale)
+        if clear_stale:
+            self.diagnostics_manager.clear_stale_async()
+        if items:
+            for item in items:
+                self._handle_workspace_diagnostic_report_async(item)
+        if items or clear_stale:
+            for mgr in self.managers():
+                mgr.update_diagnostics_panel_async()
+        if self._workspace_diagnostic_outdated:
+            self.schedule_workspace_diagnostic_async()
+
+    def _handle_workspace_diagnostic_report_async(self, report: Dict[str, Any]) -> None:
+        uri = report["uri"]
+        result_id = report.get("resultId")
+        if result_id:
+            self._workspace_diagnostic_result_ids[uri] = result_id
+        else:
+            self._workspace_diagnostic_result_ids.pop(uri, None)
+        if report["kind"] != DocumentDiagnosticReportKind.Full:
+            return
+        version = report.get("version")
+        sb = self.get_session_buffer_for_uri_async(uri)
+        if sb and version is None:
+            # The report is about the file on disk, but the open document is pulled on its own.
+            return
+        self.handle_diagnostics_async(uri, report["items"], version, update_panel=False)
 
     def m_client_registerCapability(self, params: Any, request_id: Any) -> None:
         """handles the client/registerCapability request"""
@@ -1628,24 +1936,29 @@ class Session(TransportCallbacks):
         value = params['value']
         kind = value['kind']
         if kind == 'begin':
-            self._progress[token] = WindowProgressReporter(
-                window=self.window,
-                key="lspprogress{}{}".format(self.config.name, token),
-                title=value["title"],
-                message=value.get("message")
-            )
+            # Every window that uses this session shows the progress.
+            self._progress[token] = [
+                WindowProgressReporter(
+                    window=window,
+                    key="lspprogress{}{}".format(self.config.name, token),
+                    title=value["title"],
+                    message=value.get("message")
+                ) for window in self.windows()
+            ]
         elif kind == 'report':
-            progress = self._progress[token]
-            assert isinstance(progress, WindowProgressReporter)
-            progress(value.get("message"), value.get("percentage"))
+            reporters = self._progress[token]
+            assert isinstance(reporters, list)
+            for progress in reporters:
+                progress(value.get("message"), value.get("percentage"))
         elif kind == 'end':
-            progress = self._progress.pop(token)
-            assert isinstance(progress, WindowProgressReporter)
-            title = progress.title
-            progress = None
+            reporters = self._progress.pop(token)
+            assert isinstance(reporters, list)
+            title = reporters[0].title if reporters else self.config.name
+            reporters = None
             message = value.get('message')
             if message:
-                self.window.status_message(title + ': ' + message)
+                for window in self.windows():
+                    window.status_message(title + ': ' + message)
 
     # --- shutdown dance -----------------------------------------------------------------------------------------------
 
@@ -1670,6 +1983,8 @@ class Session(TransportCallbacks):
             for watcher in watchers:
                 watcher.destroy()
         self._dynamic_file_watchers = {}
+        if self.snapshot:
+            self.snapshot.write()
         self.state = ClientStates.STOPPING
         self.send_request_async(Request.shutdown(), self._handle_shutdown_result, self._handle_shutdown_result)
 
@@ -1681,20 +1996,22 @@ class Session(TransportCallbacks):
         self.state = ClientStates.STOPPING
         self.transport = None
         self._response_handlers.clear()
+        self.request_scheduler.clear()
         if self._plugin:
             self._plugin.on_session_end_async()
             self._plugin = None
         if self._initialize_error:
             # Override potential exit error with a saved one.
             exit_code, exception = self._initialize_error
-        mgr = self.manager()
-        if mgr:
+        managers = self.managers()
+        if managers:
             if self._init_callback:
                 self._init_callback(self, True)
                 self._init_callback = None
-            mgr.on_post_exit_async(self, exit_code, exception)
+            for mgr in managers:
+                mgr.on_post_exit_async(self, exit_code, exception)
 
-    # --- RPC message handling ----------------------------------------------------------------------------------------
+    # --- RPC message handling -----------------------------------------------------------------------------------------
 
     def send_request_async(
             self,
@@ -1709,6 +2026,9 @@ class Session(TransportCallbacks):
             request.params["workDoneToken"] = _WORK_DONE_PROGRESS_PREFIX + str(request_id)
         self._response_handlers[request_id] = (request, on_result, on_error)
         self._invoke_views(request, "on_request_started_async", request_id, request)
+        self.request_scheduler.schedule_async(request_id, request)
+
+    def _write_request_async(self, request_id: int, request: Request) -> None:
         if self._plugin:
             self._plugin.on_pre_send_request_async(request_id, request)
         self._logger.outgoing_request(request_id, request.method, request.params)
@@ -1724,17 +2044,51 @@ class Session(TransportCallbacks):
         sublime.set_timeout_async(functools.partial(self.send_request_async, request, on_result, on_error))
 
     def send_request_task(self, request: Request) -> Promise:
-        task = Promise.packaged_task()  # type: PackagedTask[Any]
+        # The response resolves the promise on the worker thread, while callers may chain on it from the main thread.
+        task = ThreadSafePromise.packaged_task()  # type: PackagedTask[Any]
         promise, resolver = task
         self.send_request_async(request, resolver, lambda x: resolver(Error.from_lsp(x)))
         return promise
 
     def send_notification(self, notification: Notification) -> None:
+        if notification.method == "workspace/didChangeConfiguration":
+            self.invalidate_configuration_cache()
+        elif notification.method in ("textDocument/didChange", "textDocument/didClose"):
+            # Requests about the document that still wait were made for its previous content.
+            uri = notification.params["textDocument"]["uri"] if notification.params else None
+            self._take_waiting_requests_async(
+                lambda _, request: request_document_uri(request) == uri, ErrorCode.ContentModified, "content modified")
+        elif notification.method == "$/cancelRequest" and notification.params:
+            cancelled_id = notification.params["id"]
+            if self._take_waiting_requests_async(
+                    lambda request_id, _: request_id == cancelled_id, ErrorCode.RequestCancelled, "cancelled"):
+                # The server never saw the request.
+                return
         if self._plugin:
             self._plugin.on_pre_send_notification_async(notification)
         self._logger.outgoing_notification(notification.method, notification.params)
         self.send_payload(notification.to_payload())
 
+    def _take_waiting_requests_async(self, pred: Callable[[int, Request], bool], code: int, message: str) -> bool:
+        """
+        Answer the requests that wait in the scheduler and satisfy `pred` with an error, without sending them. Requests
+        without an error handler are sent right away instead, because their callers wait for a response. Returns
+        whether there were such requests and all of them were answered.
+        """
+        waiting = self.request_scheduler.take_waiting_async(pred)
+        answered = bool(waiting)
+        for request_id, request in waiting:
+            _, _, on_error = self._response_handlers.get(request_id, (None, None, None))
+            if on_error:
+                del self._response_handlers[request_id]
+                self._invoke_views(request, "on_request_finished_async", request_id)
+                self.request_scheduler.on_dropped(request)
+                on_error({"code": code, "message": message})
+            else:
+                self.request_scheduler.send_now_async(request_id, request)
+                answered = False
+        return answered
+
     def send_response(self, response: Response) -> None:
         self._logger.outgoing_response(response.request_id, response.result)
         self.send_payload(response.to_payload())
@@ -1807,6 +2161,7 @@ class Session(TransportCallbacks):
 
     def response_handler(self, response_id: int, response: Dict[str, Any]) -> Tuple[Optional[Callable], Any, bool]:
         request, handler, error_handler = self._response_handlers.pop(response_id, (None, None, None))
+        self.request_scheduler.on_response_async(response_id)
         if not request:
             error = {"code": ErrorCode.InvalidParams, "message": "unknown response ID {}".format(response_id)}
             return (print_to_status_bar, error, True)
@@ -16,6 +16,8 @@ class ClientConfigs:
     def __init__(self) -> None:
         self.all = {}  # type: Dict[str, ClientConfig]
         self.external = {}  # type: Dict[str, ClientConfig]
+        # The dicts from which the configs in the "clients" and "default_clients" settings were built
+        self._client_dicts = {}  # type: Dict[str, Dict[str, Any]]
         self._listener = None  # type: Optional[Callable[[Optional[str]], None]]
 
     def _notify_listener(self, config_name: Optional[str] = None) -> None:
@@ -50,7 +52,9 @@ class ClientConfigs:
             # That causes many calls to WindowConfigManager.match_view, which is relatively speaking an expensive
             # operation. To ensure that this dance is done only once, we delay notifying the ConfigManager until all
             # plugins have done their `register_plugin` call.
-            debounced(lambda: self._notify_listener(name), 200, lambda: len(self.external) == size)
+            # Because the listener only gets the name of the config that was registered last, notify it without a name.
+            # Window config managers only re-check the configs that actually changed anyway.
+            debounced(self._notify_listener, 200, lambda: len(self.external) == size)
         return True
 
     def remove_external_config(self, name: str) -> None:
@@ -75,8 +79,19 @@ class ClientConfigs:
             return
         clients = DottedDict(read_dict_setting(_settings_obj, "default_clients", {}))
         clients.update(read_dict_setting(_settings_obj, "clients", {}))
+        client_dicts = clients.get()  # type: Dict[str, Dict[str, Any]]
+        configs = {}  # type: Dict[str, ClientConfig]
+        for name, d in client_dicts.items():
+            if name in self.external:
+                continue
+            config = self.all.get(name)
+            if config is None or self._client_dicts.get(name) != d:
+                # Only (re-)build configs that are new or changed since the previous update.
+                config = ClientConfig.from_dict(name, d)
+            configs[name] = config
+        self._client_dicts = client_dicts
         self.all.clear()
-        self.all.update({name: ClientConfig.from_dict(name, d) for name, d in clients.get().items()})
+        self.all.update(configs)
         self.all.update(self.external)
         debug("enabled configs:", ", ".join(sorted(c.name for c in self.all.values() if c.enabled)))
         debug("disabled configs:", ", ".join(sorted(c.name for c in self.all.values() if not c.enabled)))
@@ -0,0 +1,150 @@
+from .logging import debug
+from .protocol import DocumentUri
+from .protocol import WorkspaceFolder
+from .typing import Any, Dict, List, Optional, Tuple
+from .url import parse_uri
+from collections import OrderedDict
+import gzip
+import hashlib
+import json
+import os
+import sublime
+
+# Changes are collected for this long before they are appended to the file.
+SNAPSHOT_WRITE_DELAY_MS = 5000
+
+# The file is rewritten once it holds this many more lines than there are entries.
+SNAPSHOT_COMPACT_THRESHOLD = 1000
+
+DIAGNOSTICS = "diagnostics"
+DOCUMENT_SYMBOLS = "documentSymbols"
+
+SnapshotKey = Tuple[str, DocumentUri]
+
+
+def snapshot_path(config_name: str, workspace_folders: List[WorkspaceFolder]) -> str:
+    key = "\n".join([config_name] + sorted(folder.path for folder in workspace_folders))
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return os.path.join(sublime.cache_path(), "LSP", "snapshots", "{}.jsonl.gz".format(digest))
+
+
+def file_mtime(uri: DocumentUri) -> Optional[float]:
+    scheme, path = parse_uri(uri)
+    if scheme != "file":
+        return None
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+class Snapshot:
+    """
+    The last known diagnostics and document symbols of a session, kept on disk so that they can be shown after a
+    restart, before the server has caught up.
+
+    Every line of the file is a JSON array `[kind, uri, mtime, data]`, where `mtime` is the modification time of the
+    file when `data` was received. An entry is only handed out while the file still has that modification time. Later
+    lines replace earlier lines of the same kind and uri, and a `null` data removes the entry. Changes are appended as
+    separate gzip members, and the file is rewritten when most of its lines are outdated.
+    """
+
+    __slots__ = ("path", "_entries", "_pending", "_line_count", "_write_scheduled")
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._entries = {}  # type: Dict[SnapshotKey, Tuple[float, Any]]
+        # The changes that weren't written yet, in the order they were made.
+        self._pending = OrderedDict()  # type: OrderedDict[SnapshotKey, Optional[Tuple[float, Any]]]
+        self._line_count = 0
+        self._write_scheduled = False
+
+    def load(self) -> None:
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                while True:
+                    try:
+                        line = f.readline()
+                    except EOFError:
+                        # The last write was cut off, but what came before is fine.
+                        break
+                    if not line:
+                        break
+                    try:
+                        kind, uri, mtime, data = json.loads(line)
+                    except (ValueError, TypeError):
+                        continue
+                    self._line_count += 1
+                    if data is None:
+                        self._entries.pop((kind, uri), None)
+                    else:
+                        self._entries[(kind, uri)] = (mtime, data)
+        except FileNotFoundError:
+            return
+        except OSError as ex:
+            debug("cannot read snapshot", self.path, ex)
+            return
+        for key, (mtime, _) in list(self._entries.items()):
+            if file_mtime(key[1]) != mtime:
+                del self._entries[key]
+
+    def get(self, kind: str, uri: DocumentUri) -> Optional[Any]:
+        entry = self._entries.get((kind, uri))
+        if entry and entry[0] == file_mtime(uri):
+            return entry[1]
+        return None
+
+    def items(self, kind: str) -> List[Tuple[DocumentUri, Any]]:
+        return [(uri, data) for (k, uri), (_, data) in self._entries.items() if k == kind]
+
+    def put(self, kind: str, uri: DocumentUri, data: Optional[Any]) -> None:
+        """
+        Remember `data` as belonging to the file of `uri` as it is on disk now, or forget the entry when `data` is None.
+        """
+        key = (kind, uri)
+        if data is None:
+            if key not in self._entries:
+                return
+            del self._entries[key]
+            self._pending[key] = None
+        else:
+            mtime = file_mtime(uri)
+            if mtime is None:
+                return
+            entry = (mtime, data)
+            if self._entries.get(key) == entry:
+                return
+            self._entries[key] = entry
+            self._pending[key] = entry
+        self._pending.move_to_end(key)
+        if not self._write_scheduled:
+            self._write_scheduled = True
+            sublime.set_timeout_async(self.write, SNAPSHOT_WRITE_DELAY_MS)
+
+    def write(self) -> None:
+        self._write_scheduled = False
+        if not self._pending:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            if self._line_count + len(self._pending) > len(self._entries) + SNAPSHOT_COMPACT_THRESHOLD:
+                temp_path = self.path + ".tmp"
+                with gzip.open(temp_path, "wt", encoding="utf-8") as f:
+                    for key, entry in self._entries.items():
+                        f.write(_to_line(key, entry))
+                os.replace(temp_path, self.path)
+                self._line_count = len(self._entries)
+            else:
+                with gzip.open(self.path, "at", encoding="utf-8") as f:
+                    for key, change in self._pending.items():
+                        f.write(_to_line(key, change))
+                self._line_count += len(self._pending)
+        except OSError as ex:
+            debug("cannot write snapshot", self.path, ex)
+        self._pending.clear()
+
+
+def _to_line(key: SnapshotKey, entry: Optional[Tuple[float, Any]]) -> str:
+    kind, uri = key
+    mtime, data = entry if entry else (None, None)
+    return json.dumps([kind, uri, mtime, data], separators=(",", ":")) + "\n"
@@ -0,0 +1,142 @@
+from .logging import debug
+from .protocol import DocumentUri
+from .protocol import WorkspaceFolder
+from .sessions import Manager
+from .sessions import Session
+from .transports import process_memory_mb
+from .transports import ProcessTransport
+from .types import ClientConfig
+from .types import ClientStates
+from .typing import Any, Dict, Generator, List, Optional, Tuple
+import sublime
+
+# How long after a server was started or taken from the pool its standby process is started, so that the two don't
+# compete for the machine while the first one starts.
+STANDBY_START_DELAY_MS = 10000
+
+# How often the memory use of the standby processes is checked.
+STANDBY_MEMORY_CHECK_INTERVAL_MS = 60000
+
+
+class StandbyManager(Manager):
+    """
+    The manager of a session that doesn't belong to a window yet. It shows nothing; the window that takes the session
+    from the pool replaces it.
+    """
+
+    def __init__(self, pool: 'StandbySessions', window: sublime.Window) -> None:
+        self._pool = pool
+        self._window = window
+
+    def window(self) -> sublime.Window:
+        return self._window
+
+    def sessions(self, view: sublime.View, capability: Optional[str] = None) -> Generator[Session, None, None]:
+        yield from ()
+
+    def get_project_path(self, file_path: str) -> Optional[str]:
+        return None
+
+    def should_present_diagnostics(self, uri: DocumentUri) -> Optional[str]:
+        return "standby session"
+
+    def start_async(self, configuration: ClientConfig, initiating_view: sublime.View) -> None:
+        pass
+
+    def update_diagnostics_panel_async(self) -> None:
+        pass
+
+    def show_diagnostics_panel_async(self) -> None:
+        pass
+
+    def on_post_exit_async(self, session: Session, exit_code: int, exception: Optional[Exception]) -> None:
+        self._pool.discard(session)
+
+    def handle_message_request(self, session: Session, params: Any, request_id: Any) -> None:
+        pass
+
+    def handle_log_message(self, session: Session, params: Any) -> None:
+        pass
+
+    def handle_stderr_log(self, session: Session, message: str) -> None:
+        pass
+
+    def handle_show_message(self, session: Session, params: Any) -> None:
+        pass
+
+
+class StandbySessions:
+    """
+    A pool of initialized sessions, at most one per configuration with "standby" enabled, that no window uses yet. The
+    next window that needs such a server, or a restart, takes the session from the pool instead of waiting for a new
+    server to start, and another standby session is started in the background.
+    """
+
+    def __init__(self) -> None:
+        # The sessions by configuration name, together with the configuration of the window they were started from.
+        self._sessions = {}  # type: Dict[str, Tuple[Session, ClientConfig, StandbyManager]]
+        self._checking_memory = False
+
+    def __contains__(self, config_name: str) -> bool:
+        return config_name in self._sessions
+
+    def create_manager(self, window: sublime.Window) -> StandbyManager:
+        return StandbyManager(self, window)
+
+    def add(self, session: Session, config: ClientConfig, manager: StandbyManager) -> None:
+        previous = self._sessions.get(config.name)
+        if previous:
+            previous[0].end_async()
+        self._sessions[config.name] = (session, config, manager)
+        if config.standby_max_memory_mb > 0 and not self._checking_memory:
+            self._checking_memory = True
+            sublime.set_timeout_async(self._check_memory_async, STANDBY_MEMORY_CHECK_INTERVAL_MS)
+
+    def discard(self, session: Session) -> None:
+        for name, (standby, _, _) in list(self._sessions.items()):
+            if standby is session:
+                del self._sessions[name]
+
+    def take_async(
+        self, config: ClientConfig, workspace_folders: List[WorkspaceFolder], manager: Manager
+    ) -> Optional[Session]:
+        """
+        Hand the standby session of the given configuration over to the window of the given manager. A server that is
+        told about workspace folder changes can serve any folders; other servers only the folders they started with.
+        """
+        entry = self._sessions.get(config.name)
+        if not entry:
+            return None
+        session, standby_config, standby_manager = entry
+        if standby_config != config or session.exiting or session.state != ClientStates.READY:
+            return None
+        if not session.should_notify_did_change_workspace_folders() and \
+                session.get_workspace_folders() != workspace_folders[:1]:
+            return None
+        del self._sessions[config.name]
+        session.attach_manager_async(manager, workspace_folders)
+        session.detach_manager_async(standby_manager)
+        return session
+
+    def end_all_async(self) -> None:
+        for session, _, _ in list(self._sessions.values()):
+            session.end_async()
+        self._sessions.clear()
+
+    def _check_memory_async(self) -> None:
+        limited = False
+        for session, config, _ in list(self._sessions.values()):
+            if config.standby_max_memory_mb <= 0:
+                continue
+            limited = True
+            if not isinstance(session.transport, ProcessTransport):
+                continue
+            memory = process_memory_mb(session.transport.pid)
+            if memory is not None and memory > config.standby_max_memory_mb:
+                debug("ending standby session", config.name, "because it uses", int(memory), "MB")
+                self.discard(session)
+                session.end_async()
+        if limited:
+            sublime.set_timeout_async(self._check_memory_async, STANDBY_MEMORY_CHECK_INTERVAL_MS)
+        else:
+            self._checking_memory = False
@@ -110,6 +110,10 @@ class ProcessTransport(Transport[T]):
         self._writer_thread.start()
         self._stderr_thread.start()
 
+    @property
+    def pid(self) -> int:
+        return self._process.pid
+
     def send(self, payload: T) -> None:
         self._send_queue.put_nowait(payload)
 
@@ -285,6 +289,28 @@ def kill_all_subprocesses() -> None:
             pass
 
 
+def process_memory_mb(pid: int) -> Optional[float]:
+    """The resident memory of a process in megabytes, or None when it can't be determined."""
+    try:
+        platform = sublime.platform()
+        if platform == "linux":
+            with open("/proc/{}/status".format(pid)) as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024
+        elif platform == "osx":
+            return int(subprocess.check_output(("ps", "-o", "rss=", "-p", str(pid))).strip()) / 1024
+        elif platform == "windows":
+            args = ["tasklist", "/FI", "PID eq {}".format(pid), "/FO", "CSV", "/NH"]
+            output = subprocess.check_output(args, startupinfo=_fixup_startup_args(args))
+            # For instance: "java.exe","1234","Console","1","123,456 K"
+            memory = output.decode("utf-8", "replace").strip().split(",", 4)[-1]
+            return int("".join(c for c in memory if c.isdigit())) / 1024
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        pass
+    return None
+
+
 def _fixup_startup_args(args: List[str]) -> Any:
     startupinfo = None
     if sublime.platform() == "windows":
@@ -7,9 +7,6 @@ from .typing import cast
 from .url import filename_to_uri
 from .url import uri_to_filename
 from threading import RLock
-from wcmatch.glob import BRACE
-from wcmatch.glob import globmatch
-from wcmatch.glob import GLOBSTAR
 import contextlib
 import fnmatch
 import os
@@ -184,6 +181,10 @@ def read_list_setting(settings_obj: sublime.Settings, key: str, default: list) -
 class Settings:
 
     # This is only for mypy
+    close_idle_documents_after_minutes = None  # type: int
+    completion_resolve_prefetch_count = None  # type: int
+    defer_did_open = None  # type: bool
+    deferred_did_open_interval_ms = None  # type: int
     diagnostics_additional_delay_auto_complete_ms = None  # type: int
     diagnostics_delay_ms = None  # type: int
     diagnostics_gutter_marker = None  # type: str
@@ -192,6 +193,7 @@ class Settings:
     disabled_capabilities = None  # type: List[str]
     document_highlight_style = None  # type: str
     semantic_highlighting = None  # type: bool
+    share_sessions_across_windows = None  # type: bool
     inhibit_snippet_completions = None  # type: bool
     inhibit_word_completions = None  # type: bool
     log_debug = None  # type: bool
@@ -203,6 +205,7 @@ class Settings:
     only_show_lsp_completions = None  # type: bool
     popup_max_characters_height = None  # type: int
     popup_max_characters_width = None  # type: int
+    request_in_flight_limits = None  # type: Dict[str, int]
     show_code_actions = None  # type: str
     show_code_lens = None  # type: str
     show_code_actions_in_hover = None  # type: bool
@@ -211,6 +214,7 @@ class Settings:
     show_diagnostics_in_view_status = None  # type: bool
     show_diagnostics_panel_on_save = None  # type: int
     show_diagnostics_severity_level = None  # type: int
+    show_inlay_hints = None  # type: bool
     show_references_in_quick_panel = None  # type: bool
     show_symbol_action_links = None  # type: bool
     show_view_status = None  # type: bool
@@ -224,6 +228,10 @@ class Settings:
             val = s.get(name)
             setattr(self, name, val if isinstance(val, default.__class__) else default)
 
+        r("close_idle_documents_after_minutes", 0)
+        r("completion_resolve_prefetch_count", 0)
+        r("defer_did_open", False)
+        r("deferred_did_open_interval_ms", 0)
         r("diagnostics_additional_delay_auto_complete_ms", 0)
         r("diagnostics_delay_ms", 0)
         r("diagnostics_gutter_marker", "dot")
@@ -247,10 +255,18 @@ class Settings:
         r("show_multiline_diagnostics_highlights", True)
         r("show_diagnostics_panel_on_save", 2)
         r("show_diagnostics_severity_level", 2)
+        r("show_inlay_hints", False)
         r("show_references_in_quick_panel", False)
         r("show_symbol_action_links", False)
+        r("share_sessions_across_windows", False)
         r("show_view_status", True)
 
+        # Priorities that aren't given keep their default limit
+        self.request_in_flight_limits = {"interactive": 0, "visible": 4, "background": 2}
+        request_in_flight_limits = s.get("request_in_flight_limits")
+        if isinstance(request_in_flight_limits, dict):
+            self.request_in_flight_limits.update(request_in_flight_limits)
+
         # Backwards-compatible with the bool setting
         log_server = s.get("log_server")
         if isinstance(log_server, bool):
@@ -378,6 +394,7 @@ class DocumentFilter:
             if isinstance(uri, str) and urllib.parse.urlparse(uri).scheme != self.scheme:
                 return False
         if self.pattern:
+            from wcmatch.glob import BRACE, globmatch, GLOBSTAR
             if not globmatch(view.file_name() or "", self.pattern, flags=GLOBSTAR | BRACE):
                 return False
         return True
@@ -640,7 +657,10 @@ class ClientConfig:
                  experimental_capabilities: Optional[Dict[str, Any]] = None,
                  disabled_capabilities: DottedDict = DottedDict(),
                  file_watcher: FileWatcherConfig = {},
-                 path_maps: Optional[List[PathMap]] = None) -> None:
+                 path_maps: Optional[List[PathMap]] = None,
+                 standby: bool = False,
+                 standby_max_memory_mb: int = 0,
+                 snapshot: bool = False) -> None:
         self.name = name
         self.selector = selector
         self.priority_selector = priority_selector if priority_selector else self.selector
@@ -663,7 +683,12 @@ class ClientConfig:
         self.disabled_capabilities = disabled_capabilities
         self.file_watcher = file_watcher
         self.path_maps = path_maps
+        self.standby = standby
+        self.standby_max_memory_mb = standby_max_memory_mb
+        self.snapshot = snapshot
         self.status_key = "lsp_{}".format(self.name)
+        # Memoized results of matching the selector against the base scope of a syntax
+        self._selector_matches = {}  # type: Dict[str, bool]
 
     @classmethod
     def from_sublime_settings(cls, name: str, s: sublime.Settings, file: str) -> "ClientConfig":
@@ -694,7 +719,10 @@ class ClientConfig:
             experimental_capabilities=s.get("experimental_capabilities"),
             disabled_capabilities=disabled_capabilities,
             file_watcher=file_watcher,
-            path_maps=PathMap.parse(s.get("path_maps"))
+            path_maps=PathMap.parse(s.get("path_maps")),
+            standby=bool(s.get("standby", False)),
+            standby_max_memory_mb=_read_int(s.get("standby_max_memory_mb"), 0),
+            snapshot=bool(s.get("snapshot", False))
         )
 
     @classmethod
@@ -722,7 +750,10 @@ class ClientConfig:
             experimental_capabilities=d.get("experimental_capabilities"),
             disabled_capabilities=disabled_capabilities,
             file_watcher=d.get("file_watcher", dict()),
-            path_maps=PathMap.parse(d.get("path_maps"))
+            path_maps=PathMap.parse(d.get("path_maps")),
+            standby=bool(d.get("standby", False)),
+            standby_max_memory_mb=_read_int(d.get("standby_max_memory_mb"), 0),
+            snapshot=bool(d.get("snapshot", False))
         )
 
     @classmethod
@@ -750,7 +781,10 @@ class ClientConfig:
                 "experimental_capabilities", src_config.experimental_capabilities),
             disabled_capabilities=disabled_capabilities,
             file_watcher=override.get("file_watcher", src_config.file_watcher),
-            path_maps=path_map_override if path_map_override else src_config.path_maps
+            path_maps=path_map_override if path_map_override else src_config.path_maps,
+            standby=bool(override.get("standby", src_config.standby)),
+            standby_max_memory_mb=_read_int(override.get("standby_max_memory_mb"), src_config.standby_max_memory_mb),
+            snapshot=bool(override.get("snapshot", src_config.snapshot))
         )
 
     def resolve_transport_config(self, variables: Dict[str, str]) -> TransportConfig:
@@ -800,7 +834,13 @@ class ClientConfig:
         # An empty selector result in a score of 1.
         # A non-matching non-empty selector results in a score of 0.
         # We want to match at least one part of an x.y.z, and we don't want to match on empty selectors.
-        return scheme in self.schemes and sublime.score_selector(syntax.scope, self.selector) >= 8
+        if scheme not in self.schemes:
+            return False
+        matches = self._selector_matches.get(syntax.scope)
+        if matches is None:
+            matches = sublime.score_selector(syntax.scope, self.selector) >= 8
+            self._selector_matches[syntax.scope] = matches
+        return matches
 
     def map_client_path_to_server_uri(self, path: str) -> str:
         if self.path_maps:
@@ -855,9 +895,19 @@ class ClientConfig:
         return True
 
 
+# Memoized base scopes of syntax paths. Only successful lookups are stored, because a syntax may become available later.
+_syntax_scopes = {}  # type: Dict[str, str]
+
+
 def syntax2scope(syntax_path: str) -> Optional[str]:
-    syntax = sublime.syntax_from_path(syntax_path)
-    return syntax.scope if syntax else None
+    scope = _syntax_scopes.get(syntax_path)
+    if scope is None:
+        syntax = sublime.syntax_from_path(syntax_path)
+        if not syntax:
+            return None
+        scope = syntax.scope
+        _syntax_scopes[syntax_path] = scope
+    return scope
 
 
 def view2scope(view: sublime.View) -> str:
@@ -886,9 +936,9 @@ def _read_selector(config: Union[sublime.Settings, Dict[str, Any]]) -> str:
             syntaxes = language.get("syntaxes")
             if isinstance(syntaxes, list):
                 for path in syntaxes:
-                    syntax = sublime.syntax_from_path(path)
-                    if syntax:
-                        selectors.append(syntax.scope)
+                    scope = syntax2scope(path)
+                    if scope:
+                        selectors.append(scope)
                 continue
             # No syntaxes and no document_selector... then there must exist a languageId.
             language_id = language.get("languageId")
@@ -904,9 +954,9 @@ def _read_selector(config: Union[sublime.Settings, Dict[str, Any]]) -> str:
     if isinstance(syntaxes, list):
         selectors = []
         for path in syntaxes:
-            syntax = sublime.syntax_from_path(path)
-            if syntax:
-                selectors.append(syntax.scope)
+            scope = syntax2scope(path)
+            if scope:
+                selectors.append(scope)
         return "|".join(selectors)
     # No syntaxes and no document_selector... then there must exist a languageId.
     language_id = config.get("languageId")
@@ -915,6 +965,10 @@ def _read_selector(config: Union[sublime.Settings, Dict[str, Any]]) -> str:
     return ""
 
 
+def _read_int(value: Any, default: int) -> int:
+    return value if isinstance(value, int) and not isinstance(value, bool) else default
+
+
 def _read_priority_selector(config: Union[sublime.Settings, Dict[str, Any]]) -> str:
     # Best case scenario
     selector = config.get("priority_selector")
@@ -13,6 +13,7 @@ from .protocol import MarkupContent
 from .protocol import Notification
 from .protocol import Point
 from .protocol import Position
+from .protocol import PositionEncodingKind
 from .protocol import Range
 from .protocol import RangeLsp
 from .protocol import Request
@@ -20,18 +21,20 @@ from .protocol import TextDocumentIdentifier
 from .protocol import TextDocumentPositionParams
 from .settings import userprefs
 from .types import ClientConfig
-from .typing import Callable, Optional, Dict, Any, Iterable, List, Union, Tuple, Sequence, cast
+from .typing import Callable, Optional, Dict, Any, Iterable, List, Union, Tuple, Sequence, Set, cast
 from .url import parse_uri
 from .workspace import is_subpath_of
+from collections import OrderedDict
 import html
 import itertools
-import linecache
-import mdpopups
+import json
+import mmap
 import os
 import re
 import sublime
 import sublime_plugin
 import tempfile
+import threading
 
 MarkdownLangMap = Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]]
 
@@ -114,20 +117,73 @@ class InvalidUriSchemeException(Exception):
         return "invalid URI scheme: {}".format(self.uri)
 
 
+# Files larger than this are memory-mapped instead of read into memory when fetching lines.
+MMAP_THRESHOLD = 1024 * 1024
+
+
 def get_line(window: sublime.Window, file_name: str, row: int) -> str:
     '''
-    Get the line from the buffer if the view is open, else get line from linecache.
+    Get the line from the buffer if the view is open, else get line from the file on disk.
     row - is 0 based. If you want to get the first line, you should pass 0.
     '''
-    view = window.find_open_file(file_name)
-    if view:
-        # get from buffer
-        point = view.text_point(row, 0)
-        return view.substr(view.line(point)).strip()
-    else:
-        # get from linecache
-        # linecache row is not 0 based, so we increment it by 1 to get the correct line.
-        return linecache.getline(file_name, row + 1).strip()
+    return get_lines(window, ((file_name, row),))[(file_name, row)]
+
+
+def get_lines(window: sublime.Window, locations: Iterable[Tuple[str, int]]) -> Dict[Tuple[str, int], str]:
+    '''
+    Get many lines at once. The rows are grouped by file, so that every file is read at most once. Lines of files that
+    are open in the window are taken from the buffer, other files are read from disk and only scanned up to the last
+    requested row. The lines are stripped. Rows are 0 based.
+
+    Since this may read a lot of files, prefer to call this from the worker thread.
+    '''
+    rows_by_file = {}  # type: Dict[str, Set[int]]
+    for file_name, row in locations:
+        rows_by_file.setdefault(file_name, set()).add(row)
+    result = {}  # type: Dict[Tuple[str, int], str]
+    for file_name, rows in rows_by_file.items():
+        view = window.find_open_file(file_name)
+        if view:
+            for row in rows:
+                result[(file_name, row)] = view.substr(view.line(view.text_point(row, 0))).strip()
+        else:
+            lines = _read_lines(file_name, rows)
+            for row in rows:
+                result[(file_name, row)] = lines.get(row, "")
+    return result
+
+
+def _read_lines(file_name: str, rows: Set[int], strip: bool = True) -> Dict[int, str]:
+    lines = {}  # type: Dict[int, str]
+    try:
+        with open(file_name, "rb") as fp:
+            size = os.fstat(fp.fileno()).st_size
+            if size == 0:
+                return lines
+            if size > MMAP_THRESHOLD:
+                with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    _scan_lines(buf, rows, lines, strip)
+            else:
+                _scan_lines(fp.read(), rows, lines, strip)
+    except OSError:
+        pass
+    return lines
+
+
+def _scan_lines(buf: Any, rows: Set[int], lines: Dict[int, str], strip: bool = True) -> None:
+    last_row = max(rows)
+    start = 0
+    row = 0
+    while row <= last_row:
+        end = buf.find(b"\n", start)
+        if row in rows:
+            line = buf[start:] if end == -1 else buf[start:end]
+            text = line.decode("utf-8", "replace")
+            lines[row] = text.strip() if strip else text.rstrip("\r")
+        if end == -1:
+            break
+        start = end + 1
+        row += 1
 
 
 def get_storage_path() -> str:
@@ -151,34 +207,154 @@ def extract_variables(window: sublime.Window) -> Dict[str, str]:
     return variables
 
 
-def point_to_offset(point: Point, view: sublime.View) -> int:
-    # @see https://microsoft.github.io/language-server-protocol/specifications/specification-3-15/#position
-    # If the character value is greater than the line length it defaults back to the line length.
-    return view.text_point_utf16(point.row, point.col, clamp_column=True)
-
-
-def offset_to_point(view: sublime.View, offset: int) -> Point:
-    return Point(*view.rowcol_utf16(offset))
-
-
-def position(view: sublime.View, offset: int) -> Position:
-    return offset_to_point(view, offset).to_lsp()
+# Below this many positions, converting them one API call at a time is cheaper than fetching their lines.
+POSITION_BATCH_THRESHOLD = 8
 
+# Characters outside of the Basic Multilingual Plane take up two UTF-16 code units.
+_ASTRAL_PLANE = re.compile('[\U00010000-\U0010FFFF]')
 
-def range_to_region(range: Range, view: sublime.View) -> sublime.Region:
-    return sublime.Region(point_to_offset(range.start, view), point_to_offset(range.end, view))
 
-
-def region_to_range(view: sublime.View, region: sublime.Region) -> Range:
+def points_to_offsets(view: sublime.View, points: Sequence[Tuple[int, int]],
+                      encoding: str = PositionEncodingKind.UTF16) -> List[int]:
+    """
+    Convert (row, column) pairs to offsets in the view, which is what every LSP position conversion boils down to.
+    This is the one place where that happens. Columns are counted in the position encoding negotiated with the
+    language server: UTF-16 code units unless the server picked UTF-8 bytes or UTF-32 code points. The latter is what
+    Sublime Text counts in, so those columns need no conversion at all.
+
+    Instead of one call into Sublime Text per position, the text of all affected lines is fetched at once and the
+    columns are converted in Python. Lines where every character is a single code unit, which is nearly all of them,
+    need no conversion at all. Like view.text_point_utf16 with clamp_column=True, a column beyond the end of its line
+    is clamped to the end of that line.
+    """
+    # @see https://microsoft.github.io/language-server-protocol/specifications/specification-3-15/#position
+    # If the character value is greater than the line length it defaults back to the line length.
+    if len(points) < POSITION_BATCH_THRESHOLD:
+        return [_text_point(view, row, col, encoding) for row, col in points]
+    last_row = view.rowcol(view.size())[0]
+    first = max(0, min(row for row, _ in points))
+    last = min(last_row, max(row for row, _ in points))
+    if first > last:
+        return [_text_point(view, row, col, encoding) for row, col in points]
+    begin = view.text_point(first, 0)
+    lines = view.substr(sublime.Region(begin, view.line(view.text_point(last, 0)).end())).split("\n")
+    starts = [begin] * len(lines)
+    for i in range(1, len(lines)):
+        starts[i] = starts[i - 1] + len(lines[i - 1]) + 1
+    single_unit = {}  # type: Dict[int, bool]
+    offsets = []  # type: List[int]
+    for row, col in points:
+        if row < first or row > last:
+            offsets.append(_text_point(view, row, col, encoding))
+            continue
+        index = row - first
+        line = lines[index]
+        is_single_unit = single_unit.get(index)
+        if is_single_unit is None:
+            is_single_unit = single_unit[index] = _is_single_unit(line, encoding)
+        column = min(max(col, 0), len(line)) if is_single_unit else _column_to_index(line, col, encoding)
+        offsets.append(starts[index] + column)
+    return offsets
+
+
+def _text_point(view: sublime.View, row: int, col: int, encoding: str) -> int:
+    if encoding == PositionEncodingKind.UTF16:
+        return view.text_point_utf16(row, col, clamp_column=True)
+    if encoding == PositionEncodingKind.UTF32:
+        return view.text_point(row, col, clamp_column=True)
+    begin = view.text_point(row, 0)
+    return begin + _column_to_index(view.substr(sublime.Region(begin, view.line(begin).end())), col, encoding)
+
+
+def column_to_index(line: str, col: int, encoding: str) -> int:
+    """Convert a column in the given position encoding to an index into the line, clamped to the line."""
+    if _is_single_unit(line, encoding):
+        return min(max(col, 0), len(line))
+    return _column_to_index(line, col, encoding)
+
+
+def _is_single_unit(line: str, encoding: str) -> bool:
+    if encoding == PositionEncodingKind.UTF16:
+        return _ASTRAL_PLANE.search(line) is None
+    if encoding == PositionEncodingKind.UTF8:
+        return len(line.encode("utf-8")) == len(line)
+    return True
+
+
+def _column_to_index(line: str, col: int, encoding: str) -> int:
+    if encoding == PositionEncodingKind.UTF8:
+        # A column in the middle of a multi-byte character points at the start of that character.
+        return len(line.encode("utf-8")[:max(col, 0)].decode("utf-8", "ignore"))
+    if encoding == PositionEncodingKind.UTF32:
+        return min(max(col, 0), len(line))
+    units = 0
+    for index, char in enumerate(line):
+        if units >= col:
+            return index
+        units += 2 if ord(char) > 0xFFFF else 1
+    return len(line)
+
+
+def ranges_to_regions(view: sublime.View, ranges: Sequence[RangeLsp],
+                      encoding: str = PositionEncodingKind.UTF16) -> List[sublime.Region]:
+    """Convert many LSP ranges to regions at once. See points_to_offsets."""
+    points = []  # type: List[Tuple[int, int]]
+    for r in ranges:
+        start = r["start"]
+        end = r["end"]
+        points.append((start["line"], start["character"]))
+        points.append((end["line"], end["character"]))
+    offsets = points_to_offsets(view, points, encoding)
+    return [sublime.Region(offsets[i], offsets[i + 1]) for i in range(0, len(offsets), 2)]
+
+
+def point_to_offset(point: Point, view: sublime.View, encoding: str = PositionEncodingKind.UTF16) -> int:
+    return points_to_offsets(view, ((point.row, point.col),), encoding)[0]
+
+
+def offset_to_point(view: sublime.View, offset: int, encoding: str = PositionEncodingKind.UTF16) -> Point:
+    if encoding == PositionEncodingKind.UTF16:
+        return Point(*view.rowcol_utf16(offset))
+    row, col = view.rowcol(offset)
+    if encoding == PositionEncodingKind.UTF8:
+        col = len(view.substr(sublime.Region(offset - col, offset)).encode("utf-8"))
+    return Point(row, col)
+
+
+def position(view: sublime.View, offset: int, encoding: str = PositionEncodingKind.UTF16) -> Position:
+    return offset_to_point(view, offset, encoding).to_lsp()
+
+
+def range_to_region(range: Range, view: sublime.View, encoding: str = PositionEncodingKind.UTF16) -> sublime.Region:
+    a, b = points_to_offsets(view, ((range.start.row, range.start.col), (range.end.row, range.end.col)), encoding)
+    return sublime.Region(a, b)
+
+
+def region_to_range(view: sublime.View, region: sublime.Region, encoding: str = PositionEncodingKind.UTF16) -> Range:
     return Range(
-        offset_to_point(view, region.begin()),
-        offset_to_point(view, region.end())
+        offset_to_point(view, region.begin(), encoding),
+        offset_to_point(view, region.end(), encoding)
     )
 
 
-def to_encoded_filename(path: str, position: Position) -> str:
-    # WARNING: Cannot possibly do UTF-16 conversion :) Oh well.
-    return '{}:{}:{}'.format(path, position['line'] + 1, position['character'] + 1)
+def to_encoded_filename(path: str, position: Position, encoding: str = PositionEncodingKind.UTF16,
+                        window: Optional[sublime.Window] = None) -> str:
+    """
+    The path with the row and column of the position appended, for sublime.ENCODED_POSITION. Sublime Text counts the
+    column in characters, so it is converted from the position encoding using the line of the file. The line is taken
+    from the buffer when the file is open in the given window, and else read from disk.
+    """
+    row, col = position['line'], position['character']
+    if col > 0 and encoding != PositionEncodingKind.UTF32:
+        view = window.find_open_file(path) if window else None
+        if view:
+            begin = view.text_point(row, 0)
+            line = view.substr(view.line(begin))  # type: Optional[str]
+        else:
+            line = _read_lines(path, {row}, strip=False).get(row)
+        if line is not None:
+            col = column_to_index(line, col, encoding)
+    return '{}:{}:{}'.format(path, row + 1, col + 1)
 
 
 def get_uri_and_range_from_location(location: Union[Location, LocationLink]) -> Tuple[DocumentUri, RangeLsp]:
@@ -205,14 +381,15 @@ def get_uri_and_position_from_location(location: Union[Location, LocationLink])
     return uri, position
 
 
-def location_to_encoded_filename(location: Union[Location, LocationLink]) -> str:
+def location_to_encoded_filename(location: Union[Location, LocationLink],
+                                 encoding: str = PositionEncodingKind.UTF16) -> str:
     """
     DEPRECATED
     """
     uri, position = get_uri_and_position_from_location(location)
     scheme, parsed = parse_uri(uri)
     if scheme == "file":
-        return to_encoded_filename(parsed, position)
+        return to_encoded_filename(parsed, position, encoding)
     raise InvalidUriSchemeException(uri)
 
 
@@ -245,6 +422,15 @@ def first_selection_region(view: sublime.View) -> Optional[sublime.Region]:
         return None
 
 
+def is_visible(view: sublime.View) -> bool:
+    """Whether the view is the active view of its group, i.e. whether the user can see it."""
+    window = view.window()
+    if not window:
+        return False
+    group, _ = window.get_view_index(view)
+    return group >= 0 and window.active_view_in_group(group) == view
+
+
 def entire_content_region(view: sublime.View) -> sublime.Region:
     return sublime.Region(0, view.size())
 
@@ -270,16 +456,17 @@ def versioned_text_document_identifier(view: sublime.View, version: int) -> Dict
     return {"uri": uri_from_view(view), "version": version}
 
 
-def text_document_position_params(view: sublime.View, location: int) -> TextDocumentPositionParams:
-    return {"textDocument": text_document_identifier(view), "position": position(view, location)}
+def text_document_position_params(view: sublime.View, location: int,
+                                  encoding: str = PositionEncodingKind.UTF16) -> TextDocumentPositionParams:
+    return {"textDocument": text_document_identifier(view), "position": position(view, location, encoding)}
 
 
-def text_document_range_params(view: sublime.View, location: int,
-                               region: sublime.Region) -> ExperimentalTextDocumentRangeParams:
+def text_document_range_params(view: sublime.View, location: int, region: sublime.Region,
+                               encoding: str = PositionEncodingKind.UTF16) -> ExperimentalTextDocumentRangeParams:
     return {
         "textDocument": text_document_identifier(view),
-        "position": position(view, location),
-        "range": region_to_range(view, region).to_lsp()
+        "position": position(view, location, encoding),
+        "range": region_to_range(view, region, encoding).to_lsp()
     }
 
 
@@ -287,19 +474,175 @@ def did_open_text_document_params(view: sublime.View, language_id: str) -> Dict[
     return {"textDocument": text_document_item(view, language_id)}
 
 
-def render_text_change(change: sublime.TextChange) -> Dict[str, Any]:
-    # Note: cannot use protocol.Range because these are "historic" points.
+def render_text_change(change: sublime.TextChange, encoding: str = PositionEncodingKind.UTF16) -> Dict[str, Any]:
+    # Note: cannot use protocol.Range because these are "historic" points. Sublime Text keeps track of the columns in
+    # every encoding, so there is nothing to convert.
+    if encoding == PositionEncodingKind.UTF16:
+        start, end, length = change.a.col_utf16, change.b.col_utf16, change.len_utf16
+    elif encoding == PositionEncodingKind.UTF8:
+        start, end, length = change.a.col_utf8, change.b.col_utf8, change.len_utf8
+    else:
+        start, end, length = change.a.col, change.b.col, change.b.pt - change.a.pt
     return {
         "range": {
-            "start": {"line": change.a.row, "character": change.a.col_utf16},
-            "end": {"line": change.b.row, "character": change.b.col_utf16}},
-        "rangeLength": change.len_utf16,
+            "start": {"line": change.a.row, "character": start},
+            "end": {"line": change.b.row, "character": end}},
+        "rangeLength": length,
         "text": change.str
     }
 
 
+# A position as its offset, row and column in the position encoding.
+_HistoricPosition = Tuple[int, int, int]
+
+# Roughly the number of characters that a content change takes up besides its text.
+_CONTENT_CHANGE_OVERHEAD = 100
+
+
+def encoded_length(text: str, encoding: str = PositionEncodingKind.UTF16) -> int:
+    """The length of the text in the code units of the position encoding."""
+    if encoding == PositionEncodingKind.UTF16:
+        return len(text) + len(_ASTRAL_PLANE.findall(text))
+    if encoding == PositionEncodingKind.UTF8:
+        return len(text.encode("utf-8"))
+    return len(text)
+
+
+def _historic_position(position: sublime.HistoricPosition, encoding: str) -> _HistoricPosition:
+    if encoding == PositionEncodingKind.UTF16:
+        return position.pt, position.row, position.col_utf16
+    if encoding == PositionEncodingKind.UTF8:
+        return position.pt, position.row, position.col_utf8
+    return position.pt, position.row, position.col
+
+
+def _end_of_text(start: _HistoricPosition, text: str, encoding: str) -> _HistoricPosition:
+    newlines = text.count("\n")
+    if newlines == 0:
+        return start[0] + len(text), start[1], start[2] + encoded_length(text, encoding)
+    return start[0] + len(text), start[1] + newlines, encoded_length(text[text.rfind("\n") + 1:], encoding)
+
+
+def _translate(position: _HistoricPosition, source: _HistoricPosition,
+               target: _HistoricPosition) -> _HistoricPosition:
+    """Move a position that is at or after `source`, and not inside an edit, along with `source` to `target`."""
+    column = position[2] - source[2] + target[2] if position[1] == source[1] else position[2]
+    return position[0] - source[0] + target[0], position[1] - source[1] + target[1], column
+
+
+class _MergedChange:
+
+    __slots__ = ('start', 'end', 'text', 'range_length', 'current_start', 'current_end')
+
+    def __init__(self, start: _HistoricPosition, end: _HistoricPosition, text: str, range_length: int,
+                 current_start: _HistoricPosition, current_end: _HistoricPosition) -> None:
+        # The replaced range in the document before all changes.
+        self.start = start
+        self.end = end
+        self.text = text
+        self.range_length = range_length
+        # Where the text is in the document after the changes that were merged so far.
+        self.current_start = current_start
+        self.current_end = current_end
+
+
+def merge_text_changes(changes: Iterable[sublime.TextChange],
+                       encoding: str = PositionEncodingKind.UTF16) -> List[Dict[str, Any]]:
+    """
+    Merge text changes, which apply one after the other, into as few content changes as possible. Changes that touch
+    or overlap become one change, so typing a word is a single change, and so is typing it at each of many cursors.
+
+    The content changes are disjoint ranges of the document before all changes, in reverse document order, so that
+    applying them one after the other has the same result as applying the text changes.
+    """
+    merged = []  # type: List[_MergedChange]
+    # The current positions of the merged changes before this index are up to date. A change only moves the merged
+    # changes after it, and changes usually come in document order, so this keeps typing at many cursors linear.
+    known = 0
+
+    def update_current_positions(index: int) -> None:
+        nonlocal known
+        while known <= index:
+            m = merged[known]
+            if known == 0:
+                m.current_start = m.start
+            else:
+                previous = merged[known - 1]
+                m.current_start = _translate(m.start, previous.end, previous.current_end)
+            m.current_end = _end_of_text(m.current_start, m.text, encoding)
+            known += 1
+
+    for change in changes:
+        a = _historic_position(change.a, encoding)
+        b = _historic_position(change.b, encoding)
+        if encoding == PositionEncodingKind.UTF16:
+            range_length = change.len_utf16
+        elif encoding == PositionEncodingKind.UTF8:
+            range_length = change.len_utf8
+        else:
+            range_length = b[0] - a[0]
+        # The merged changes from index i up to j touch or overlap this change.
+        if known > 0 and merged[known - 1].current_end[0] >= a[0]:
+            lo, hi = 0, known - 1
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if merged[mid].current_end[0] < a[0]:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            i = lo
+        else:
+            i = known
+            while i < len(merged):
+                update_current_positions(i)
+                if merged[i].current_end[0] >= a[0]:
+                    break
+                i += 1
+        j = i
+        while j < len(merged):
+            update_current_positions(j)
+            if merged[j].current_start[0] > b[0]:
+                break
+            m = merged[j]
+            covered = m.text[max(a[0], m.current_start[0]) - m.current_start[0]:
+                             min(b[0], m.current_end[0]) - m.current_start[0]]
+            range_length += m.range_length - encoded_length(covered, encoding)
+            j += 1
+        previous = merged[i - 1] if i > 0 else None
+        if i < j and merged[i].current_start[0] <= a[0]:
+            start = merged[i].start
+            current_start = merged[i].current_start
+            prefix = merged[i].text[:a[0] - current_start[0]]
+        else:
+            start = _translate(a, previous.current_end, previous.end) if previous else a
+            current_start = a
+            prefix = ""
+        if i < j and merged[j - 1].current_end[0] >= b[0]:
+            end = merged[j - 1].end
+            suffix = merged[j - 1].text[b[0] - merged[j - 1].current_start[0]:]
+        else:
+            last = merged[j - 1] if i < j else previous
+            end = _translate(b, last.current_end, last.end) if last else b
+            suffix = ""
+        text = prefix + change.str + suffix
+        merged[i:j] = [_MergedChange(start, end, text, range_length, current_start,
+                                     _end_of_text(current_start, text, encoding))]
+        known = i + 1
+    return [
+        {
+            "range": {
+                "start": {"line": m.start[1], "character": m.start[2]},
+                "end": {"line": m.end[1], "character": m.end[2]}
+            },
+            "rangeLength": m.range_length,
+            "text": m.text
+        } for m in reversed(merged)
+    ]
+
+
 def did_change_text_document_params(view: sublime.View, version: int,
-                                    changes: Optional[Iterable[sublime.TextChange]] = None) -> Dict[str, Any]:
+                                    changes: Optional[Iterable[sublime.TextChange]] = None,
+                                    encoding: str = PositionEncodingKind.UTF16) -> Dict[str, Any]:
     content_changes = []  # type: List[Dict[str, Any]]
     result = {"textDocument": versioned_text_document_identifier(view, version), "contentChanges": content_changes}
     if changes is None:
@@ -307,8 +650,11 @@ def did_change_text_document_params(view: sublime.View, version: int,
         content_changes.append({"text": entire_content(view)})
     else:
         # TextDocumentSyncKindIncremental
-        for change in changes:
-            content_changes.append(render_text_change(change))
+        content_changes.extend(merge_text_changes(changes, encoding))
+        size = sum(len(change["text"]) + _CONTENT_CHANGE_OVERHEAD for change in content_changes)
+        if size > view.size() and view.change_count() == version:
+            # The changes are bigger than the text they result in.
+            result["contentChanges"] = [{"text": entire_content(view)}]
     return result
 
 
@@ -334,9 +680,9 @@ def did_open(view: sublime.View, language_id: str) -> Notification:
     return Notification.didOpen(did_open_text_document_params(view, language_id))
 
 
-def did_change(view: sublime.View, version: int,
-               changes: Optional[Iterable[sublime.TextChange]] = None) -> Notification:
-    return Notification.didChange(did_change_text_document_params(view, version, changes))
+def did_change(view: sublime.View, version: int, changes: Optional[Iterable[sublime.TextChange]] = None,
+               encoding: str = PositionEncodingKind.UTF16) -> Notification:
+    return Notification.didChange(did_change_text_document_params(view, version, changes, encoding))
 
 
 def will_save(uri: DocumentUri, reason: int) -> Notification:
@@ -380,18 +726,19 @@ def text_document_formatting(view: sublime.View) -> Request:
     }, view, progress=True)
 
 
-def text_document_range_formatting(view: sublime.View, region: sublime.Region) -> Request:
+def text_document_range_formatting(view: sublime.View, region: sublime.Region,
+                                   encoding: str = PositionEncodingKind.UTF16) -> Request:
     return Request("textDocument/rangeFormatting", {
         "textDocument": text_document_identifier(view),
         "options": formatting_options(view.settings()),
-        "range": region_to_range(view, region).to_lsp()
+        "range": region_to_range(view, region, encoding).to_lsp()
     }, view, progress=True)
 
 
-def selection_range_params(view: sublime.View) -> Dict[str, Any]:
+def selection_range_params(view: sublime.View, encoding: str = PositionEncodingKind.UTF16) -> Dict[str, Any]:
     return {
         "textDocument": text_document_identifier(view),
-        "positions": [position(view, r.b) for r in view.sel()]
+        "positions": [position(view, r.b, encoding) for r in view.sel()]
     }
 
 
@@ -399,7 +746,8 @@ def text_document_code_action_params(
     view: sublime.View,
     region: sublime.Region,
     diagnostics: Sequence[Diagnostic],
-    on_save_actions: Optional[Sequence[str]] = None
+    on_save_actions: Optional[Sequence[str]] = None,
+    encoding: str = PositionEncodingKind.UTF16
 ) -> Dict[str, Any]:
     context = {
         "diagnostics": diagnostics
@@ -408,7 +756,7 @@ def text_document_code_action_params(
         context['only'] = on_save_actions
     return {
         "textDocument": text_document_identifier(view),
-        "range": region_to_range(view, region).to_lsp(),
+        "range": region_to_range(view, region, encoding).to_lsp(),
         "context": context
     }
 
@@ -423,6 +771,7 @@ def show_lsp_popup(view: sublime.View, contents: str, location: int = -1, md: bo
     css = css if css is not None else lsp_css().popups
     wrapper_class = wrapper_class if wrapper_class is not None else lsp_css().popups_classname
     contents += LSP_POPUP_SPACER_HTML
+    import mdpopups
     mdpopups.show_popup(
         view,
         contents,
@@ -441,6 +790,7 @@ def update_lsp_popup(view: sublime.View, contents: str, md: bool = False, css: O
     css = css if css is not None else lsp_css().popups
     wrapper_class = wrapper_class if wrapper_class is not None else lsp_css().popups_classname
     contents += LSP_POPUP_SPACER_HTML
+    import mdpopups
     mdpopups.update_popup(view, contents, css=css, md=md, wrapper_class=wrapper_class)
 
 
@@ -448,6 +798,70 @@ FORMAT_STRING = 0x1
 FORMAT_MARKED_STRING = 0x2
 FORMAT_MARKUP_CONTENT = 0x4
 
+MINIHTML_CACHE_SIZE = 256
+
+# (markdown, allowed formats, language map, color scheme)
+MinihtmlKey = Tuple[str, int, str, str]
+
+
+class MinihtmlCache:
+    """
+    A least-recently-used cache of markdown rendered by minihtml. Rendering markdown, and highlighting the code blocks
+    in it, is the slowest part of showing a hover, signature help or completion documentation popup, and the same
+    content tends to be shown over and over again.
+
+    Rendered HTML depends on the color scheme of the view, which is part of the key. The cache is also cleared when the
+    color scheme preferences change.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self._max_size = max_size
+        self._entries = OrderedDict()  # type: Dict[MinihtmlKey, str]
+        # minihtml is called from both the main thread and the worker thread.
+        self._lock = threading.Lock()
+        self._color_scheme = None  # type: Any
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: MinihtmlKey) -> Optional[str]:
+        with self._lock:
+            html = self._entries.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)  # type: ignore
+            return html
+
+    def put(self, key: MinihtmlKey, html: str) -> None:
+        with self._lock:
+            self._entries[key] = html
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)  # type: ignore
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def on_color_scheme_changed(self, color_scheme: Any) -> None:
+        """Clear the cache when the given color scheme preferences differ from the previous ones."""
+        if color_scheme != self._color_scheme:
+            self._color_scheme = color_scheme
+            self.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+minihtml_cache = MinihtmlCache(MINIHTML_CACHE_SIZE)
+
 
 def minihtml(
     view: sublime.View,
@@ -522,31 +936,70 @@ def minihtml(
     if is_plain_text:
         return "<p>{}</p>".format(text2html(result)) if result else ''
     else:
-        frontmatter = {
-            "allow_code_wrap": True,
-            "markdown_extensions": [
-                {
-                    "pymdownx.escapeall": {
-                        "hardbreak": True,
-                        "nbsp": False
-                    }
-                },
-                {
-                    "pymdownx.magiclink": {
-                        # links are displayed without the initial ftp://, http://, https://, or ftps://.
-                        "hide_protocol": True,
-                        # GitHub, Bitbucket, and GitLab commit, pull, and issue links are are rendered in a shorthand
-                        # syntax.
-                        "repo_url_shortener": True
-                    }
-                }
-            ]
-        }
-        if isinstance(language_id_map, dict):
-            frontmatter["language_map"] = language_id_map
+        language_map_key = _language_map_key(language_id_map)
         # Workaround CommonMark deficiency: two spaces followed by a newline should result in a new paragraph.
         result = re.sub('(\\S)  \n', '\\1\n\n', result)
-        return mdpopups.md2html(view, mdpopups.format_frontmatter(frontmatter) + result)
+        key = (result, allowed_formats, language_map_key, _color_scheme_key(view))
+        html = minihtml_cache.get(key)
+        if html is None:
+            import mdpopups
+            html = mdpopups.md2html(view, _markdown_frontmatter(language_map_key, language_id_map) + result)
+            minihtml_cache.put(key, html)
+        return html
+
+
+def _language_map_key(language_id_map: Optional[MarkdownLangMap]) -> str:
+    # The values of a language map are lists in the format of mdpopups, which can't be hashed.
+    return json.dumps(language_id_map, sort_keys=True) if isinstance(language_id_map, dict) else ""
+
+
+def _color_scheme_key(view: sublime.View) -> str:
+    """
+    Identifies the color scheme that the view resolves to. The settings of a view include the ones of its syntax. An
+    "auto" color scheme is the light or the dark one depending on the OS, which the colors of the view tell apart.
+    """
+    settings = view.settings()
+    color_scheme = settings.get("color_scheme") or ""
+    if color_scheme != "auto":
+        return color_scheme
+    style = view.style_for_scope("source")
+    return "auto:{}:{}:{}:{}".format(settings.get("light_color_scheme") or "", settings.get("dark_color_scheme") or "",
+                                     style.get("foreground", ""), style.get("background", ""))
+
+
+_frontmatters = {}  # type: Dict[str, str]
+
+
+def _markdown_frontmatter(language_map_key: str, language_id_map: Optional[MarkdownLangMap]) -> str:
+    frontmatter = _frontmatters.get(language_map_key)
+    if frontmatter is not None:
+        return frontmatter
+    d = {
+        "allow_code_wrap": True,
+        "markdown_extensions": [
+            {
+                "pymdownx.escapeall": {
+                    "hardbreak": True,
+                    "nbsp": False
+                }
+            },
+            {
+                "pymdownx.magiclink": {
+                    # links are displayed without the initial ftp://, http://, https://, or ftps://.
+                    "hide_protocol": True,
+                    # GitHub, Bitbucket, and GitLab commit, pull, and issue links are are rendered in a shorthand
+                    # syntax.
+                    "repo_url_shortener": True
+                }
+            }
+        ]
+    }  # type: Dict[str, Any]
+    if isinstance(language_id_map, dict):
+        d["language_map"] = language_id_map
+    import mdpopups
+    frontmatter = mdpopups.format_frontmatter(d)
+    _frontmatters[language_map_key] = frontmatter
+    return frontmatter
 
 
 REPLACEMENT_MAP = {
@@ -629,11 +1082,53 @@ def lsp_color_to_html(color_info: Dict[str, Any]) -> str:
     return COLOR_BOX_HTML.format(red, green, blue, alpha)
 
 
-def lsp_color_to_phantom(view: sublime.View, color_info: Dict[str, Any]) -> sublime.Phantom:
-    region = range_to_region(Range.from_lsp(color_info['range']), view)
+def lsp_color_to_phantom(view: sublime.View, color_info: Dict[str, Any],
+                         encoding: str = PositionEncodingKind.UTF16) -> sublime.Phantom:
+    region = range_to_region(Range.from_lsp(color_info['range']), view, encoding)
     return sublime.Phantom(region, lsp_color_to_html(color_info), sublime.LAYOUT_INLINE)
 
 
+class PhantomLayer:
+    """
+    Draws inline phantoms of one kind into a view. Unlike a sublime.PhantomSet, the phantoms that are drawn already are
+    kept, so that an update only erases and adds the phantoms that changed, also after edits have moved them.
+    """
+
+    __slots__ = ("view", "key", "_change_count", "_phantoms")
+
+    def __init__(self, view: sublime.View, key: str) -> None:
+        self.view = view
+        self.key = key
+        self._change_count = -1
+        # The drawn phantoms by region and HTML, and their ids.
+        self._phantoms = {}  # type: Dict[Tuple[int, int, str], int]
+
+    def update(self, change_count: int, phantoms: Iterable[Tuple[sublime.Region, str]]) -> None:
+        """Show exactly the given phantoms, for the given version of the view."""
+        if change_count != self._change_count:
+            self._change_count = change_count
+            keys = list(self._phantoms.keys())
+            ids = list(self._phantoms.values())
+            regions = self.view.query_phantoms(ids) if ids else []
+            self._phantoms = {
+                (region.a, region.b, content): pid
+                for (_, _, content), pid, region in zip(keys, ids, regions) if region.a >= 0
+            }
+        wanted = [(region.a, region.b, content) for region, content in phantoms]
+        wanted_set = set(wanted)
+        for phantom in [phantom for phantom in self._phantoms if phantom not in wanted_set]:
+            self.view.erase_phantom_by_id(self._phantoms.pop(phantom))
+        for phantom in wanted:
+            if phantom not in self._phantoms:
+                a, b, content = phantom
+                self._phantoms[phantom] = self.view.add_phantom(
+                    self.key, sublime.Region(a, b), content, sublime.LAYOUT_INLINE)
+
+    def clear(self) -> None:
+        self.view.erase_phantoms(self.key)
+        self._phantoms = {}
+
+
 def document_color_params(view: sublime.View) -> Dict[str, Any]:
     return {"textDocument": text_document_identifier(view)}
 
@@ -815,7 +1310,7 @@ def _wrap_in_tags(tag: str, item: str) -> str:
 
 
 def format_completion(
-    item: CompletionItem, index: int, can_resolve_completion_items: bool, session_name: str
+    item: CompletionItem, index: int, can_resolve_completion_items: bool, store_id: int
 ) -> sublime.CompletionItem:
     # This is a hot function. Don't do heavy computations or IO in this function.
     item_kind = item.get("kind")
@@ -834,7 +1329,7 @@ def format_completion(
 
     st_details = ""
     if can_resolve_completion_items or item.get("documentation"):
-        st_details += make_command_link("lsp_resolve_docs", "More", {"index": index, "session_name": session_name})
+        st_details += make_command_link("lsp_resolve_docs", "More", {"store_id": store_id, "index": index})
     if lsp_label_details:
         if st_details:
             st_details += " | "
@@ -860,7 +1355,7 @@ def format_completion(
     completion = sublime.CompletionItem.command_completion(
         trigger=lsp_filter_text or lsp_label,
         command="lsp_select_completion_item",
-        args={"item": item, "session_name": session_name},
+        args={"store_id": store_id, "index": index},
         annotation=st_annotation,
         kind=kind,
         details=st_details)
@@ -1,4 +1,3 @@
-from ...third_party import WebsocketServer  # type: ignore
 from .configurations import ConfigManager
 from .configurations import WindowConfigManager
 from .diagnostics import ensure_diagnostics_panel
@@ -11,27 +10,33 @@ from .promise import Promise
 from .protocol import DocumentUri
 from .protocol import Error
 from .protocol import Location
+from .protocol import WorkspaceFolder
 from .sessions import AbstractViewListener
 from .sessions import get_plugin
+from .sessions import InitCallback
 from .sessions import Logger
 from .sessions import Manager
 from .sessions import Session
 from .settings import userprefs
+from .standby import STANDBY_START_DELAY_MS
+from .standby import StandbySessions
 from .transports import create_transport
 from .types import ClientConfig
 from .types import matches_pattern
-from .typing import Optional, Any, Dict, Deque, List, Generator, Tuple
+from .typing import Optional, Any, Dict, Deque, List, Generator, Set, Tuple
 from .url import parse_uri
 from .views import extract_variables
 from .views import format_diagnostic_for_panel
 from .views import make_link
 from .workspace import ProjectFolders
 from .workspace import sorted_workspace_folders
+from abc import abstractmethod
 from collections import OrderedDict
 from collections import deque
 from subprocess import CalledProcessError
 from time import time
 from weakref import ref
+from weakref import WeakKeyDictionary
 from weakref import WeakSet
 import functools
 import json
@@ -67,9 +72,13 @@ class WindowManager(Manager):
         window: sublime.Window,
         workspace: ProjectFolders,
         configs: WindowConfigManager,
+        shared_sessions: Optional['SharedSessions'] = None,
+        standby_sessions: Optional[StandbySessions] = None
     ) -> None:
         self._window = window
         self._configs = configs
+        self._shared_sessions = shared_sessions
+        self._standby_sessions = standby_sessions
         self._sessions = WeakSet()  # type: WeakSet[Session]
         self._workspace = workspace
         self._pending_listeners = deque()  # type: Deque[AbstractViewListener]
@@ -86,6 +95,9 @@ class WindowManager(Manager):
         return self._configs
 
     def on_load_project_async(self) -> None:
+        for session in self._sessions:
+            # The project may have changed the variables that are expanded in the settings.
+            session.invalidate_configuration_cache()
         self.update_workspace_folders_async()
         self._configs.update()
 
@@ -96,7 +108,7 @@ class WindowManager(Manager):
         if self._workspace.update():
             workspace_folders = self._workspace.get_workspace_folders()
             for session in self._sessions:
-                session.update_folders(workspace_folders)
+                session.update_folders(workspace_folders, self)
 
     def enable_config_async(self, config_name: str) -> None:
         self._configs.enable_config(config_name)
@@ -158,11 +170,13 @@ class WindowManager(Manager):
                 return
         if self._new_session:
             self._sessions.add(self._new_session)
+            if self._new_session.diagnostics_manager.stale:
+                self.update_diagnostics_panel_async()
         self._publish_sessions_to_listener_async(listener)
         if self._new_session:
-            if not any(self._new_session.session_views_async()):
+            if not any(sv.view.window() == self._window for sv in self._new_session.session_views_async()):
                 self._sessions.discard(self._new_session)
-                self._new_session.end_async()
+                self._end_session_async(self._new_session)
             self._new_session = None
         config = self._needed_config(listener.view)
         if config:
@@ -229,51 +243,42 @@ class WindowManager(Manager):
         return None
 
     def start_async(self, config: ClientConfig, initiating_view: sublime.View) -> None:
+        window_config = config
         config = ClientConfig.from_config(config, {})
         file_path = initiating_view.file_name() or ''
         if not self._can_start_config(config.name, file_path):
             # debug('Already starting on this window:', config.name)
             return
+        if self._shared_sessions is not None and userprefs().share_sessions_across_windows:
+            shared_session = self._shared_sessions.find(window_config, self._workspace.get_workspace_folders(), self)
+            if shared_session:
+                self._attach_session_async(shared_session)
+                return
+        workspace_folders = sorted_workspace_folders(self._workspace.folders, file_path)
+        if self._standby_sessions is not None:
+            standby_session = self._standby_sessions.take_async(window_config, workspace_folders, self)
+            if standby_session:
+                debug("using the standby session of", config.name)
+                if self._shared_sessions is not None:
+                    self._shared_sessions.add(standby_session, window_config)
+                # Continue like after a session was initialized.
+                self._new_session = standby_session
+                sublime.set_timeout_async(self._dequeue_listener_async)
+                self._start_standby_later_async(window_config, initiating_view)
+                return
         try:
-            workspace_folders = sorted_workspace_folders(self._workspace.folders, file_path)
-            plugin_class = get_plugin(config.name)
-            variables = extract_variables(self._window)
-            cwd = None  # type: Optional[str]
-            if plugin_class is not None:
-                if plugin_class.needs_update_or_installation():
-                    config.set_view_status(initiating_view, "installing...")
-                    plugin_class.install_or_update()
-                additional_variables = plugin_class.additional_variables()
-                if isinstance(additional_variables, dict):
-                    variables.update(additional_variables)
-                cannot_start_reason = plugin_class.can_start(self._window, initiating_view, workspace_folders, config)
-                if cannot_start_reason:
-                    config.erase_view_status(initiating_view)
-                    message = "cannot start {}: {}".format(config.name, cannot_start_reason)
-                    self._configs.disable_config(config.name, only_for_session=True)
-                    # Continue with handling pending listeners
-                    self._new_session = None
-                    sublime.set_timeout_async(self._dequeue_listener_async)
-                    return self._window.status_message(message)
-                cwd = plugin_class.on_pre_start(self._window, initiating_view, workspace_folders, config)
-            config.set_view_status(initiating_view, "starting...")
-            session = Session(self, self._create_logger(config.name), workspace_folders, config, plugin_class)
-            if cwd:
-                transport_cwd = cwd  # type: Optional[str]
-            else:
-                transport_cwd = workspace_folders[0].path if workspace_folders else None
-            transport_config = config.resolve_transport_config(variables)
-            transport = create_transport(transport_config, transport_cwd, session)
-            if plugin_class:
-                plugin_class.on_post_start(self._window, initiating_view, workspace_folders, config)
-            config.set_view_status(initiating_view, "initialize")
-            session.initialize_async(
-                variables=variables,
-                transport=transport,
-                working_directory=cwd,
-                init_callback=functools.partial(self._on_post_session_initialize, initiating_view)
-            )
+            init_callback = functools.partial(self._on_post_session_initialize, initiating_view, window_config)
+            session = self._create_session(self, config, initiating_view, workspace_folders, init_callback)
+            if self._shared_sessions is not None:
+                self._shared_sessions.add(session, window_config)
             self._new_session = session
+        except _CannotStart as e:
+            config.erase_view_status(initiating_view)
+            self._configs.disable_config(config.name, only_for_session=True)
+            # Continue with handling pending listeners
+            self._new_session = None
+            sublime.set_timeout_async(self._dequeue_listener_async)
+            self._window.status_message("cannot start {}: {}".format(config.name, e))
         except Exception as e:
             message = "".join((
                 "Failed to start {0} - disabling for this window for the duration of the current session.\n",
@@ -290,8 +295,64 @@ class WindowManager(Manager):
             self._new_session = None
             sublime.set_timeout_async(self._dequeue_listener_async)
 
+    def _create_session(
+        self,
+        manager: Manager,
+        config: ClientConfig,
+        initiating_view: sublime.View,
+        workspace_folders: List[WorkspaceFolder],
+        init_callback: InitCallback,
+        show_status: bool = True
+    ) -> Session:
+        """
+        Start the server process of a new session for the given manager, and initialize it. Raises _CannotStart when
+        the plugin of the configuration refuses to start it, and other exceptions when the process can't be started.
+        """
+        plugin_class = get_plugin(config.name)
+        variables = extract_variables(self._window)
+        cwd = None  # type: Optional[str]
+        if plugin_class is not None:
+            if plugin_class.needs_update_or_installation():
+                if show_status:
+                    config.set_view_status(initiating_view, "installing...")
+                plugin_class.install_or_update()
+            additional_variables = plugin_class.additional_variables()
+            if isinstance(additional_variables, dict):
+                variables.update(additional_variables)
+            cannot_start_reason = plugin_class.can_start(self._window, initiating_view, workspace_folders, config)
+            if cannot_start_reason:
+                raise _CannotStart(cannot_start_reason)
+            cwd = plugin_class.on_pre_start(self._window, initiating_view, workspace_folders, config)
+        if show_status:
+            config.set_view_status(initiating_view, "starting...")
+        session = Session(manager, self._create_logger(config.name), workspace_folders, config, plugin_class)
+        if cwd:
+            transport_cwd = cwd  # type: Optional[str]
+        else:
+            transport_cwd = workspace_folders[0].path if workspace_folders else None
+        transport_config = config.resolve_transport_config(variables)
+        transport = create_transport(transport_config, transport_cwd, session)
+        if plugin_class:
+            plugin_class.on_post_start(self._window, initiating_view, workspace_folders, config)
+        if show_status:
+            config.set_view_status(initiating_view, "initialize")
+        session.initialize_async(
+            variables=variables,
+            transport=transport,
+            working_directory=cwd,
+            init_callback=init_callback
+        )
+        return session
+
+    def _attach_session_async(self, session: Session) -> None:
+        debug("using the", session.config.name, "session of another window")
+        session.attach_manager_async(self, self._workspace.get_workspace_folders())
+        # Continue like after a session was initialized.
+        self._new_session = session
+        sublime.set_timeout_async(self._dequeue_listener_async)
+
     def _on_post_session_initialize(
-        self, initiating_view: sublime.View, session: Session, is_error: bool = False
+        self, initiating_view: sublime.View, window_config: ClientConfig, session: Session, is_error: bool = False
     ) -> None:
         if is_error:
             session.config.erase_view_status(initiating_view)
@@ -299,6 +360,32 @@ class WindowManager(Manager):
             self._new_session = None
         else:
             sublime.set_timeout_async(self._dequeue_listener_async)
+            self._start_standby_later_async(window_config, initiating_view)
+
+    # --- standby sessions ---------------------------------------------------------------------------------------------
+
+    def _start_standby_later_async(self, window_config: ClientConfig, initiating_view: sublime.View) -> None:
+        if self._standby_sessions is not None and window_config.standby:
+            sublime.set_timeout_async(
+                functools.partial(self._start_standby_async, window_config, initiating_view), STANDBY_START_DELAY_MS)
+
+    def _start_standby_async(self, window_config: ClientConfig, initiating_view: sublime.View) -> None:
+        """Start a session for the pool, with the folders of this window, for the next window or restart to take."""
+        standby_sessions = self._standby_sessions
+        if standby_sessions is None or window_config.name in standby_sessions:
+            return
+        if not self._window.is_valid() or not initiating_view.is_valid():
+            return
+        config = ClientConfig.from_config(window_config, {})
+        workspace_folders = sorted_workspace_folders(self._workspace.folders, initiating_view.file_name() or '')
+        manager = standby_sessions.create_manager(self._window)
+        try:
+            session = self._create_session(
+                manager, config, initiating_view, workspace_folders, lambda session, is_error: None, show_status=False)
+        except Exception as e:
+            return exception_log("Unable to start a standby process for {}".format(config.name), e)
+        debug("started a standby session of", config.name)
+        standby_sessions.add(session, window_config, manager)
 
     def _create_logger(self, config_name: str) -> Logger:
         logger_map = {
@@ -326,19 +413,45 @@ class WindowManager(Manager):
         if view:
             MessageRequestHandler(view, session, request_id, params, session.config.name).show()
 
-    def restart_sessions_async(self, config_name: Optional[str] = None) -> None:
-        self._end_sessions_async(config_name)
+    def restart_sessions_async(self, config_name: Optional[str] = None,
+                               config_names: Optional[List[str]] = None) -> None:
+        if config_names is None:
+            self._end_sessions_async(config_name, everywhere=True)
+        else:
+            for name in config_names:
+                self._end_sessions_async(name, everywhere=True)
         listeners = list(self._listeners)
         self._listeners.clear()
         for listener in listeners:
             self.register_listener_async(listener)
 
-    def _end_sessions_async(self, config_name: Optional[str] = None) -> None:
+    def _end_sessions_async(self, config_name: Optional[str] = None, everywhere: bool = False) -> None:
+        """
+        End the sessions of this window. Sessions that other windows use as well keep running for those windows, unless
+        `everywhere` is set; then the other windows start them again.
+        """
         sessions = list(self._sessions)
         for session in sessions:
             if config_name is None or config_name == session.config.name:
-                session.end_async()
                 self._sessions.discard(session)
+                if everywhere:
+                    session.end_async()
+                else:
+                    self._end_session_async(session)
+
+    def _end_session_async(self, session: Session) -> None:
+        if session.detach_manager_async(self):
+            for listener in self._listeners:
+                listener.on_session_shutdown_async(session)
+        else:
+            session.end_async()
+
+    def detach_shared_sessions_async(self) -> None:
+        """Called when the window closes, so that the sessions it shares with other windows forget its folders."""
+        for session in list(self._sessions):
+            if session.is_shared():
+                self._sessions.discard(session)
+                session.detach_manager_async(self)
 
     def get_project_path(self, file_path: str) -> Optional[str]:
         candidate = None  # type: Optional[str]
@@ -367,10 +480,15 @@ class WindowManager(Manager):
         return None
 
     def on_post_exit_async(self, session: Session, exit_code: int, exception: Optional[Exception]) -> None:
+        # A session that is still in use here but exits normally was restarted by another window that shares it.
+        restarted_elsewhere = session in self._sessions and session.is_shared()
         self._sessions.discard(session)
         for listener in self._listeners:
             listener.on_session_shutdown_async(session)
-        if exit_code != 0 or exception:
+        if restarted_elsewhere and exit_code == 0 and not exception:
+            for listener in list(self._listeners):
+                self.register_listener_async(listener)
+        elif exit_code != 0 or exception:
             config = session.config
             msg = "".join((
                 "{0} exited with status code {1}. ",
@@ -392,9 +510,11 @@ class WindowManager(Manager):
         from the main thread. That could lead to some dict/list being mutated while iterated over, so be careful
         """
         self._end_sessions_async()
+        if self._standby_sessions is not None:
+            self._standby_sessions.end_all_async()
 
     def handle_server_message(self, server_name: str, message: str) -> None:
-        sublime.set_timeout(lambda: log_server_message(self._window, server_name, message))
+        log_server_message(self._window, server_name, message)
 
     def handle_log_message(self, session: Session, params: Any) -> None:
         self.handle_server_message(session.config.name, extract_message(params))
@@ -415,12 +535,20 @@ class WindowManager(Manager):
         max_severity = userprefs().diagnostics_panel_include_severity_level
         contributions = OrderedDict(
         )  # type: OrderedDict[str, List[Tuple[str, Optional[int], Optional[str], Optional[str]]]]
+        # The paths whose diagnostics come from the snapshot of a previous session.
+        stale = set()  # type: Set[str]
         for session in self._sessions:
-            local_errors, local_warnings = session.diagnostics_manager.sum_total_errors_and_warnings_async()
+            # A session that other windows use as well has diagnostics of their folders too, which don't belong here.
+            in_window = self._workspace.contains if session.is_shared() else None
+            local_errors, local_warnings = session.diagnostics_manager.sum_total_errors_and_warnings_async(in_window)
             self.total_error_count += local_errors
             self.total_warning_count += local_warnings
-            for (_, path), contribution in session.diagnostics_manager.filter_map_diagnostics_async(
+            for (scheme, path), contribution in session.diagnostics_manager.filter_map_diagnostics_async(
                     is_severity_included(max_severity), lambda _, diagnostic: format_diagnostic_for_panel(diagnostic)):
+                if in_window and not in_window(path):
+                    continue
+                if (scheme, path) in session.diagnostics_manager.stale:
+                    stale.add(path)
                 seen = path in contributions
                 contributions.setdefault(path, []).extend(contribution)
                 if not seen:
@@ -428,6 +556,9 @@ class WindowManager(Manager):
         for path, contribution in contributions.items():
             to_render.append("{}:".format(path))
             row += 1
+            if path in stale:
+                to_render.append("  (from the last session, until the server reports on this file)")
+                row += 1
             for content, offset, code, href in contribution:
                 to_render.append(content)
                 if offset is not None and code is not None and href is not None:
@@ -461,10 +592,34 @@ class WindowManager(Manager):
             self._window.run_command("show_panel", {"panel": "output.diagnostics"})
 
 
+class SharedSessions:
+    """
+    The sessions that windows can share, together with the configuration of the window that started them. A window
+    that needs a server that another window runs already with the same configuration, for an overlapping folder, uses
+    that session instead of starting another server process.
+    """
+
+    def __init__(self) -> None:
+        self._sessions = WeakKeyDictionary()  # type: WeakKeyDictionary[Session, ClientConfig]
+
+    def add(self, session: Session, config: ClientConfig) -> None:
+        self._sessions[session] = config
+
+    def find(
+        self, config: ClientConfig, workspace_folders: List[WorkspaceFolder], manager: WindowManager
+    ) -> Optional[Session]:
+        for session, session_config in list(self._sessions.items()):
+            if session_config == config and manager not in session.managers() and session.can_attach(workspace_folders):
+                return session
+        return None
+
+
 class WindowRegistry(object):
     def __init__(self, configs: ConfigManager) -> None:
         self._windows = {}  # type: Dict[int, WindowManager]
         self._configs = configs
+        self._shared_sessions = SharedSessions()
+        self._standby_sessions = StandbySessions()
 
     def lookup(self, window: sublime.Window) -> WindowManager:
         wm = self._windows.get(window.id())
@@ -472,7 +627,13 @@ class WindowRegistry(object):
             return wm
         workspace = ProjectFolders(window)
         window_configs = self._configs.for_window(window)
-        state = WindowManager(window=window, workspace=workspace, configs=window_configs)
+        state = WindowManager(
+            window=window,
+            workspace=workspace,
+            configs=window_configs,
+            shared_sessions=self._shared_sessions,
+            standby_sessions=self._standby_sessions
+        )
         self._windows[window.id()] = state
         return state
 
@@ -483,95 +644,208 @@ class WindowRegistry(object):
         return self.lookup(w).listener_for_view(view)
 
     def discard(self, window: sublime.Window) -> None:
-        self._windows.pop(window.id(), None)
+        wm = self._windows.pop(window.id(), None)
+        if wm:
+            sublime.set_timeout_async(wm.detach_shared_sessions_async)
+
+
+class LogRecord:
+    """
+    A message exchanged with a language server, in a compact form that every logger can consume. The kind is one of the
+    class constants; they double as the arrows shown in the server panel.
+    """
+
+    __slots__ = ("kind", "server_name", "request_id", "method", "params", "time")
+
+    OUTGOING_RESPONSE = ">>>"
+    OUTGOING_ERROR_RESPONSE = "~~>"
+    OUTGOING_REQUEST = "-->"
+    OUTGOING_NOTIFICATION = " ->"
+    INCOMING_RESPONSE = "<<<"
+    INCOMING_ERROR_RESPONSE = "<~~"
+    INCOMING_REQUEST = "<--"
+    INCOMING_NOTIFICATION = "<- "
+    INCOMING_UNHANDLED_NOTIFICATION = "<? "
+
+    _OUTGOING = (OUTGOING_RESPONSE, OUTGOING_ERROR_RESPONSE, OUTGOING_REQUEST, OUTGOING_NOTIFICATION)
+    _ERRORS = (OUTGOING_ERROR_RESPONSE, INCOMING_ERROR_RESPONSE)
+
+    def __init__(self, kind: str, server_name: str, request_id: Any, method: Optional[str], params: Any) -> None:
+        self.kind = kind
+        self.server_name = server_name
+        self.request_id = request_id
+        self.method = method
+        self.params = params
+        self.time = time()
+
+    def title(self) -> str:
+        if self.method is None:
+            return "{} {} {}".format(self.kind, self.server_name, self.request_id)
+        if self.request_id is None:
+            return "{} {} {}".format(self.kind, self.server_name, self.method)
+        return "{} {} {}({})".format(self.kind, self.server_name, self.method, self.request_id)
+
+    def to_json(self) -> Dict[str, Any]:
+        data = {
+            'server': self.server_name,
+            'time': round(self.time * 1000),
+            'params': self.params,
+            'direction': RemoteLogger.DIRECTION_OUTGOING if self.kind in self._OUTGOING else
+            RemoteLogger.DIRECTION_INCOMING,
+        }  # type: Dict[str, Any]
+        if self.request_id is not None:
+            data['id'] = self.request_id
+        if self.method is not None:
+            data['method'] = self.method
+        if self.kind in self._ERRORS or self.kind == self.INCOMING_RESPONSE:
+            data['isError'] = self.kind in self._ERRORS
+        if self.kind in (self.INCOMING_NOTIFICATION, self.INCOMING_UNHANDLED_NOTIFICATION):
+            data['error'] = 'Unhandled notification!' if self.kind == self.INCOMING_UNHANDLED_NOTIFICATION else None
+        return data
+
+
+class _CannotStart(Exception):
+    """The plugin of a configuration refuses to start its server. The message is the reason."""
+
+
+class _TooLarge(Exception):
+    pass
+
+
+class _BoundedRepr:
+    """Builds str(value) for JSON-like values, but stops as soon as a given number of characters is exceeded."""
+
+    __slots__ = ("chunks", "remaining")
+
+    def __init__(self, max_size: int) -> None:
+        self.chunks = []  # type: List[str]
+        self.remaining = max_size
+
+    def write(self, chunk: str) -> None:
+        self.remaining -= len(chunk)
+        if self.remaining <= 0:
+            raise _TooLarge()
+        self.chunks.append(chunk)
+
+    def visit(self, value: Any) -> None:
+        if isinstance(value, dict):
+            self.write("{")
+            for index, (k, v) in enumerate(value.items()):
+                if index:
+                    self.write(", ")
+                self.visit(k)
+                self.write(": ")
+                self.visit(v)
+            self.write("}")
+        elif isinstance(value, list):
+            self.write("[")
+            for index, v in enumerate(value):
+                if index:
+                    self.write(", ")
+                self.visit(v)
+            self.write("]")
+        elif isinstance(value, str) and len(value) >= self.remaining:
+            # Don't bother building the repr of a string that is too large anyway.
+            raise _TooLarge()
+        else:
+            self.write(repr(value))
+
+
+def format_params(params: Any, max_size: int) -> str:
+    """
+    Return str(params), or a placeholder when that would take max_size characters or more. Large payloads are never
+    stringified in full to find that out. A max_size of zero (or less) means there is no limit.
+    """
+    if max_size <= 0:
+        return str(params)
+    if isinstance(params, str):
+        return params if len(params) < max_size else '<params with {} characters>'.format(len(params))
+    builder = _BoundedRepr(max_size)
+    try:
+        builder.visit(params)
+    except _TooLarge:
+        return '<params with {} characters or more>'.format(max_size)
+    return "".join(builder.chunks)
 
 
-class PanelLogger(Logger):
+class RecordLogger(Logger):
+    """A logger that turns every message into a LogRecord and passes it to log_record."""
 
-    def __init__(self, manager: WindowManager, server_name: str) -> None:
-        self._manager = ref(manager)
+    def __init__(self, server_name: str) -> None:
         self._server_name = server_name
 
-    def stderr_message(self, message: str) -> None:
-        """
-        Not handled here as stderr messages are handled by WindowManager regardless
-        if this logger is enabled.
-        """
+    @abstractmethod
+    def log_record(self, record: LogRecord) -> None:
         pass
 
-    def log(self, message: str, params: Any) -> None:
-
-        def run_on_async_worker_thread() -> None:
-            nonlocal message
-            params_str = str(params)
-            if 0 < userprefs().log_max_size <= len(params_str):
-                params_str = '<params with {} characters>'.format(len(params_str))
-            message = "{}: {}".format(message, params_str)
-            manager = self._manager()
-            if manager is not None:
-                manager.handle_server_message(":", message)
-
-        sublime.set_timeout_async(run_on_async_worker_thread)
-
     def outgoing_response(self, request_id: Any, params: Any) -> None:
-        if not userprefs().log_server:
-            return
-        self.log(self._format_response(">>>", request_id), params)
+        self.log_record(LogRecord(LogRecord.OUTGOING_RESPONSE, self._server_name, request_id, None, params))
 
     def outgoing_error_response(self, request_id: Any, error: Error) -> None:
-        if not userprefs().log_server:
-            return
-        self.log(self._format_response("~~>", request_id), error.to_lsp())
+        self.log_record(
+            LogRecord(LogRecord.OUTGOING_ERROR_RESPONSE, self._server_name, request_id, None, error.to_lsp()))
 
     def outgoing_request(self, request_id: int, method: str, params: Any) -> None:
-        if not userprefs().log_server:
-            return
-        self.log(self._format_request("-->", method, request_id), params)
+        self.log_record(LogRecord(LogRecord.OUTGOING_REQUEST, self._server_name, request_id, method, params))
 
     def outgoing_notification(self, method: str, params: Any) -> None:
-        if not userprefs().log_server:
-            return
-        self.log(self._format_notification(" ->", method), params)
+        self.log_record(LogRecord(LogRecord.OUTGOING_NOTIFICATION, self._server_name, None, method, params))
 
     def incoming_response(self, request_id: int, params: Any, is_error: bool) -> None:
-        if not userprefs().log_server:
-            return
-        direction = "<~~" if is_error else "<<<"
-        self.log(self._format_response(direction, request_id), params)
+        kind = LogRecord.INCOMING_ERROR_RESPONSE if is_error else LogRecord.INCOMING_RESPONSE
+        self.log_record(LogRecord(kind, self._server_name, request_id, None, params))
 
     def incoming_request(self, request_id: Any, method: str, params: Any) -> None:
-        if not userprefs().log_server:
-            return
-        self.log(self._format_request("<--", method, request_id), params)
+        self.log_record(LogRecord(LogRecord.INCOMING_REQUEST, self._server_name, request_id, method, params))
 
     def incoming_notification(self, method: str, params: Any, unhandled: bool) -> None:
-        if not userprefs().log_server:
-            return
-        direction = "<? " if unhandled else "<- "
-        self.log(self._format_notification(direction, method), params)
+        kind = LogRecord.INCOMING_UNHANDLED_NOTIFICATION if unhandled else LogRecord.INCOMING_NOTIFICATION
+        self.log_record(LogRecord(kind, self._server_name, None, method, params))
+
 
-    def _format_response(self, direction: str, request_id: Any) -> str:
-        return "{} {} {}".format(direction, self._server_name, request_id)
+class PanelLogger(RecordLogger):
 
-    def _format_request(self, direction: str, method: str, request_id: Any) -> str:
-        return "{} {} {}({})".format(direction, self._server_name, method, request_id)
+    def __init__(self, manager: WindowManager, server_name: str) -> None:
+        super().__init__(server_name)
+        self._manager = ref(manager)
+
+    def stderr_message(self, message: str) -> None:
+        """
+        Not handled here as stderr messages are handled by WindowManager regardless
+        if this logger is enabled.
+        """
+        pass
 
-    def _format_notification(self, direction: str, method: str) -> str:
-        return "{} {} {}".format(direction, self._server_name, method)
+    def log(self, message: str, params: Any) -> None:
 
+        def run_on_async_worker_thread() -> None:
+            manager = self._manager()
+            if manager is not None:
+                params_str = format_params(params, userprefs().log_max_size)
+                manager.handle_server_message(":", "{}: {}".format(message, params_str))
 
-class RemoteLogger(Logger):
+        sublime.set_timeout_async(run_on_async_worker_thread)
+
+    def log_record(self, record: LogRecord) -> None:
+        if not userprefs().log_server:
+            return
+        self.log(record.title(), record.params)
+
+
+class RemoteLogger(RecordLogger):
     PORT = 9981
     DIRECTION_OUTGOING = 1
     DIRECTION_INCOMING = 2
-    _ws_server = None  # type: Optional[WebsocketServer]
+    _ws_server = None  # type: Optional[Any]
     _ws_server_thread = None  # type: Optional[threading.Thread]
     _last_id = 0
 
     def __init__(self, manager: WindowManager, server_name: str) -> None:
         RemoteLogger._last_id += 1
-        self._server_name = '{} ({})'.format(server_name, RemoteLogger._last_id)
+        super().__init__('{} ({})'.format(server_name, RemoteLogger._last_id))
         if not RemoteLogger._ws_server:
+            # Imported here, so that the server is only loaded when remote logging is enabled.
+            from ...third_party import WebsocketServer  # type: ignore
             try:
                 RemoteLogger._ws_server = WebsocketServer(self.PORT)
                 RemoteLogger._ws_server.set_fn_new_client(self._on_new_client)
@@ -600,16 +874,16 @@ class RemoteLogger(Logger):
                 RemoteLogger._ws_server_thread.join()
                 RemoteLogger._ws_server_thread = None
 
-    def _on_new_client(self, client: Dict, server: WebsocketServer) -> None:
+    def _on_new_client(self, client: Dict, server: Any) -> None:
         """Called for every client connecting (after handshake)."""
         debug("New client connected and was given id %d" % client['id'])
         # server.send_message_to_all("Hey all, a new client has joined us")
 
-    def _on_client_left(self, client: Dict, server: WebsocketServer) -> None:
+    def _on_client_left(self, client: Dict, server: Any) -> None:
         """Called for every client disconnecting."""
         debug("Client(%d) disconnected" % client['id'])
 
-    def _on_message_received(self, client: Dict, server: WebsocketServer, message: str) -> None:
+    def _on_message_received(self, client: Dict, server: Any, message: str) -> None:
         """Called when a client sends a message."""
         debug("Client(%d) said: %s" % (client['id'], message))
 
@@ -623,73 +897,9 @@ class RemoteLogger(Logger):
             'direction': self.DIRECTION_INCOMING,
         })
 
-    def outgoing_request(self, request_id: int, method: str, params: Any) -> None:
-        self._broadcast_json({
-            'server': self._server_name,
-            'id': request_id,
-            'time': round(time() * 1000),
-            'method': method,
-            'params': params,
-            'direction': self.DIRECTION_OUTGOING,
-        })
-
-    def incoming_response(self, request_id: int, params: Any, is_error: bool) -> None:
-        self._broadcast_json({
-            'server': self._server_name,
-            'id': request_id,
-            'time': round(time() * 1000),
-            'params': params,
-            'direction': self.DIRECTION_INCOMING,
-            'isError': is_error,
-        })
-
-    def incoming_request(self, request_id: Any, method: str, params: Any) -> None:
-        self._broadcast_json({
-            'server': self._server_name,
-            'id': request_id,
-            'time': round(time() * 1000),
-            'method': method,
-            'params': params,
-            'direction': self.DIRECTION_INCOMING,
-        })
-
-    def outgoing_response(self, request_id: Any, params: Any) -> None:
-        self._broadcast_json({
-            'server': self._server_name,
-            'id': request_id,
-            'time': round(time() * 1000),
-            'params': params,
-            'direction': self.DIRECTION_OUTGOING,
-        })
-
-    def outgoing_error_response(self, request_id: Any, error: Error) -> None:
-        self._broadcast_json({
-            'server': self._server_name,
-            'id': request_id,
-            'isError': True,
-            'params': error.to_lsp(),
-            'time': round(time() * 1000),
-            'direction': self.DIRECTION_OUTGOING,
-        })
-
-    def outgoing_notification(self, method: str, params: Any) -> None:
-        self._broadcast_json({
-            'server': self._server_name,
-            'time': round(time() * 1000),
-            'method': method,
-            'params': params,
-            'direction': self.DIRECTION_OUTGOING,
-        })
-
-    def incoming_notification(self, method: str, params: Any, unhandled: bool) -> None:
-        self._broadcast_json({
-            'server': self._server_name,
-            'time': round(time() * 1000),
-            'error': 'Unhandled notification!' if unhandled else None,
-            'method': method,
-            'params': params,
-            'direction': self.DIRECTION_INCOMING,
-        })
+    def log_record(self, record: LogRecord) -> None:
+        if RemoteLogger._ws_server:
+            self._broadcast_json(record.to_json())
 
     def _broadcast_json(self, data: Dict[str, Any]) -> None:
         if RemoteLogger._ws_server:
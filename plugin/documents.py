@@ -1,6 +1,10 @@
 from .code_actions import actions_manager
 from .code_actions import CodeActionsByConfigName
-from .completion import LspResolveDocsCommand
+from .completion import CachedCompletions
+from .completion import completion_store
+from .completion import extend_text_edit
+from .completion import rank_completion_items
+from .completion import resolve_prefetcher
 from .core.logging import debug
 from .core.promise import Promise
 from .core.protocol import CompletionItem
@@ -9,7 +13,7 @@ from .core.protocol import Diagnostic
 from .core.protocol import DiagnosticSeverity
 from .core.protocol import DocumentHighlightKind
 from .core.protocol import Error
-from .core.protocol import Range
+from .core.protocol import Position
 from .core.protocol import Request
 from .core.protocol import SignatureHelp
 from .core.registry import best_session
@@ -22,15 +26,17 @@ from .core.types import basescope2languageid
 from .core.types import debounced
 from .core.types import FEATURES_TIMEOUT
 from .core.types import SettingsRegistration
-from .core.typing import Any, Callable, Optional, Dict, Generator, Iterable, List, Tuple, Union, cast
+from .core.typing import Any, Callable, Optional, Dict, Generator, Iterable, List, Sequence, Tuple, Union, cast
 from .core.url import parse_uri
 from .core.url import view_to_uri
 from .core.views import diagnostic_severity
 from .core.views import first_selection_region
 from .core.views import format_completion
+from .core.views import is_visible
 from .core.views import make_command_link
 from .core.views import MarkdownLangMap
-from .core.views import range_to_region
+from .core.views import points_to_offsets
+from .core.views import ranges_to_regions
 from .core.views import show_lsp_popup
 from .core.views import text_document_identifier
 from .core.views import text_document_position_params
@@ -47,11 +53,18 @@ import sublime
 import sublime_plugin
 import textwrap
 import weakref
-import webbrowser
 
 
 SUBLIME_WORD_MASK = 515
 
+# How often the visible region of the active view is checked for scrolling, to request the inlay hints and draw the
+# color boxes that scrolled into view.
+VIEWPORT_CHECK_INTERVAL_MS = 300
+
+# Colors rarely change while typing, and a textDocument/documentColor request always covers the whole document, so the
+# colors are requested only after a longer pause than the other features.
+COLOR_BOXES_DEBOUNCE_MS = 1000
+
 _kind2name = {
     DocumentHighlightKind.Text: "text",
     DocumentHighlightKind.Read: "read",
@@ -135,10 +148,11 @@ class DocumentSyncListener(sublime_plugin.ViewEventListener, AbstractViewListene
     CODE_ACTIONS_KEY = "lsp_code_action"
     ACTIVE_DIAGNOSTIC = "lsp_active_diagnostic"
     code_actions_debounce_time = FEATURES_TIMEOUT
-    color_boxes_debounce_time = FEATURES_TIMEOUT
+    color_boxes_debounce_time = COLOR_BOXES_DEBOUNCE_MS
     highlights_debounce_time = FEATURES_TIMEOUT
     code_lenses_debounce_time = FEATURES_TIMEOUT
     semantic_tokens_debounce_time = FEATURES_TIMEOUT
+    inlay_hints_debounce_time = FEATURES_TIMEOUT
 
     @classmethod
     def applies_to_primary_view_only(cls) -> bool:
@@ -178,7 +192,10 @@ class DocumentSyncListener(sublime_plugin.ViewEventListener, AbstractViewListene
         self._session_views = {}  # type: Dict[str, SessionView]
         self._stored_region = sublime.Region(-1, -1)
         self._sighelp = None  # type: Optional[SigHelp]
+        self._cached_completions = None  # type: Optional[CachedCompletions]
         self._registered = False
+        self._visible_region = sublime.Region(-1, -1)
+        self._watching_viewport = False
 
     def _cleanup(self) -> None:
         settings = self.view.settings()
@@ -225,6 +242,8 @@ class DocumentSyncListener(sublime_plugin.ViewEventListener, AbstractViewListene
         if added:
             self._do_code_lenses_async()
             self._do_semantic_tokens_async()
+            self._do_inlay_hints_async()
+            self._watch_viewport_async()
 
     def on_session_shutdown_async(self, session: Session) -> None:
         removed_session = self._session_views.pop(session.config.name, None)
@@ -329,6 +348,12 @@ class DocumentSyncListener(sublime_plugin.ViewEventListener, AbstractViewListene
         self._when_selection_remains_stable_async(self._do_semantic_tokens_async, current_region,
                                                   after_ms=self.semantic_tokens_debounce_time)
 
+        self._when_selection_remains_stable_async(self._do_inlay_hints_async, current_region,
+                                                  after_ms=self.inlay_hints_debounce_time)
+
+        self._when_selection_remains_stable_async(self._do_color_boxes_async, current_region,
+                                                  after_ms=self.color_boxes_debounce_time)
+
     def get_uri(self) -> str:
         return self._uri
 
@@ -346,7 +371,12 @@ class DocumentSyncListener(sublime_plugin.ViewEventListener, AbstractViewListene
             self._register_async()
 
     def on_activated_async(self) -> None:
-        if not self._registered and not self.view.is_loading() and is_regular_view(self.view):
+        if self._registered:
+            for sb in self.session_buffers_async():
+                sb.on_activated_async(self.view)
+            self._do_inlay_hints_async()
+            self._watch_viewport_async()
+        elif not self.view.is_loading() and is_regular_view(self.view):
             self._register_async()
 
     def on_selection_modified_async(self) -> None:
@@ -433,7 +463,8 @@ class DocumentSyncListener(sublime_plugin.ViewEventListener, AbstractViewListene
             sublime.set_timeout(lambda: clist.set_completions(items, flags))
 
         clist = sublime.CompletionList()
-        sublime.set_timeout_async(lambda: self._on_query_completions_async(partial(resolve, clist), locations[0]))
+        sublime.set_timeout_async(
+            lambda: self._on_query_completions_async(partial(resolve, clist), locations[0], prefix))
         return clist
 
     # --- textDocument/signatureHelp -----------------------------------------------------------------------------------
@@ -454,7 +485,7 @@ class DocumentSyncListener(sublime_plugin.ViewEventListener, AbstractViewListene
         last_char = previous_non_whitespace_char(self.view, pos)
         if manual or last_char in triggers:
             self.purge_changes_async()
-            params = text_document_position_params(self.view, pos)
+            params = text_document_position_params(self.view, pos, session.position_encoding)
             language_map = session.markdown_language_id_to_st_syntax_map()
             request = Request.signatureHelp(params, self.view)
             session.send_request_async(request, lambda resp: self._on_signature_help(resp, pos, language_map))
@@ -515,6 +546,7 @@ class DocumentSyncListener(sublime_plugin.ViewEventListener, AbstractViewListene
         self._sighelp = None
 
     def _on_sighelp_navigate(self, href: str) -> None:
+        import webbrowser
         webbrowser.open_new_tab(href)
 
     # --- textDocument/codeAction --------------------------------------------------------------------------------------
@@ -569,6 +601,47 @@ class DocumentSyncListener(sublime_plugin.ViewEventListener, AbstractViewListene
                 if sv.session == session:
                     sv.resolve_visible_code_lenses_async()
 
+    # --- textDocument/documentColor -----------------------------------------------------------------------------------
+
+    def _do_color_boxes_async(self) -> None:
+        for sb in self.session_buffers_async():
+            sb.do_color_boxes_async(self.view)
+
+    # --- textDocument/inlayHint ---------------------------------------------------------------------------------------
+
+    def _do_inlay_hints_async(self) -> None:
+        if not userprefs().show_inlay_hints:
+            return
+        for sb in self.session_buffers_async():
+            sb.do_inlay_hints_async(self.view)
+
+    def _watch_viewport_async(self) -> None:
+        """
+        Sublime Text has no event for scrolling, so look at the visible region of the view every now and then while it
+        is visible, and request the inlay hints and draw the color boxes of the lines that were scrolled into view.
+        """
+        if self._watching_viewport:
+            return
+        self._visible_region = self.view.visible_region()
+        capabilities = ["colorProvider"]
+        if userprefs().show_inlay_hints:
+            capabilities.append("inlayHintProvider")
+        if any(sb.has_capability(c) for sb in self.session_buffers_async() for c in capabilities):
+            self._watching_viewport = True
+            sublime.set_timeout_async(self._check_viewport_async, VIEWPORT_CHECK_INTERVAL_MS)
+
+    def _check_viewport_async(self) -> None:
+        if not self.view.is_valid() or not is_visible(self.view) or not self._session_views:
+            self._watching_viewport = False
+            return
+        visible_region = self.view.visible_region()
+        if visible_region != self._visible_region:
+            self._visible_region = visible_region
+            self._do_inlay_hints_async()
+            for sb in self.session_buffers_async():
+                sb.present_color_boxes_async()
+        sublime.set_timeout_async(self._check_viewport_async, VIEWPORT_CHECK_INTERVAL_MS)
+
     # --- textDocument/documentHighlight -------------------------------------------------------------------------------
 
     def _highlights_key(self, kind: int, multiline: bool) -> str:
@@ -596,16 +669,17 @@ class DocumentSyncListener(sublime_plugin.ViewEventListener, AbstractViewListene
         point = region.b
         session = self.session_async("documentHighlightProvider", point)
         if session:
-            params = text_document_position_params(self.view, point)
+            params = text_document_position_params(self.view, point, session.position_encoding)
             request = Request.documentHighlight(params, self.view)
-            session.send_request_async(request, self._on_highlights)
+            session.send_request_async(
+                request, partial(self._on_highlights, session.position_encoding))
 
-    def _on_highlights(self, response: Optional[List]) -> None:
+    def _on_highlights(self, encoding: str, response: Optional[List]) -> None:
         if not isinstance(response, list):
             response = []
         kind2regions = {}  # type: Dict[Tuple[int, bool], List[sublime.Region]]
-        for highlight in response:
-            r = range_to_region(Range.from_lsp(highlight["range"]), self.view)
+        regions = ranges_to_regions(self.view, [highlight["range"] for highlight in response], encoding)
+        for highlight, r in zip(response, regions):
             kind = highlight.get("kind", DocumentHighlightKind.Text)
             kind2regions.setdefault((kind, len(self.view.split_by_newlines(r)) > 1), []).append(r)
 
@@ -622,7 +696,7 @@ class DocumentSyncListener(sublime_plugin.ViewEventListener, AbstractViewListene
 
         sublime.set_timeout(render_highlights_on_main_thread)
 
-    # --- textDocument/semanticTokens -------------------------------------------------------------------------------
+    # --- textDocument/semanticTokens ----------------------------------------------------------------------------------
 
     def _do_semantic_tokens_async(self) -> None:
         if ("background" not in self.view.style_for_scope("meta.semantic-token") or
@@ -638,15 +712,18 @@ class DocumentSyncListener(sublime_plugin.ViewEventListener, AbstractViewListene
                 return
 
             params = {"textDocument": text_document_identifier(self.view)}
+            encoding = session.position_encoding
             session.send_request_async(
                 Request.semanticTokens(params, self.view),
-                lambda response: self._on_semantic_tokens_async(response, semantic_tokens_legend['legend']))
+                lambda response: self._on_semantic_tokens_async(response, semantic_tokens_legend['legend'], encoding))
 
-    def _on_semantic_tokens_async(self, response: dict, semantic_tokens_legend: dict) -> None:
+    def _on_semantic_tokens_async(self, response: dict, semantic_tokens_legend: dict, encoding: str) -> None:
         regions = cast(dict, {})
         data = response['data']
         prev_row = None
         prev_col = None
+        tokens = []
+        points = []  # type: List[Tuple[int, int]]
         for x in range(0, len(data), 5):
             encoded_token = data[x:x+5]
 
@@ -657,9 +734,16 @@ class DocumentSyncListener(sublime_plugin.ViewEventListener, AbstractViewListene
                 else:
                     encoded_token[0] += prev_row
 
-            point1 = self.view.text_point(encoded_token[0], encoded_token[1])
-            point2 = self.view.text_point(encoded_token[0], encoded_token[1]+encoded_token[2])
-            my_region = sublime.Region(point1, point2)
+            tokens.append(encoded_token)
+            points.append((encoded_token[0], encoded_token[1]))
+            points.append((encoded_token[0], encoded_token[1]+encoded_token[2]))
+
+            prev_row = encoded_token[0]
+            prev_col = encoded_token[1]
+
+        offsets = points_to_offsets(self.view, points, encoding)
+        for i, encoded_token in enumerate(tokens):
+            my_region = sublime.Region(offsets[2 * i], offsets[2 * i + 1])
 
             scope = get_semantic_scope_from_modifier(encoded_token, semantic_tokens_legend)
 
@@ -669,9 +753,6 @@ class DocumentSyncListener(sublime_plugin.ViewEventListener, AbstractViewListene
                 regions[scope] = []
                 regions[scope].append(my_region)
 
-            prev_row = encoded_token[0]
-            prev_col = encoded_token[1]
-
         region_keys = []
         for key, value in regions.items():
             if key:
@@ -686,32 +767,84 @@ class DocumentSyncListener(sublime_plugin.ViewEventListener, AbstractViewListene
 
     # --- textDocument/complete ----------------------------------------------------------------------------------------
 
-    def _on_query_completions_async(self, resolve_completion_list: ResolveCompletionsFn, location: int) -> None:
+    def _on_query_completions_async(
+        self,
+        resolve_completion_list: ResolveCompletionsFn,
+        location: int,
+        prefix: str = ""
+    ) -> None:
         sessions = list(self.sessions_async('completionProvider'))
         if not sessions or not self.view.is_valid():
             resolve_completion_list([], 0)
             return
+        word_start = location - len(prefix)
+        if self._filter_cached_completions_async(resolve_completion_list, word_start, prefix):
+            return
+        self._cached_completions = None
+        resolve_prefetcher.cancel_async()
         self.purge_changes_async()
+        change_count = self.view.change_count()
+        positions = {}  # type: Dict[str, Position]
         completion_promises = []  # type: List[Promise[ResolvedCompletions]]
         for session in sessions:
 
             def completion_request() -> Promise[ResolvedCompletions]:
                 config_name = session.config.name
+                params = text_document_position_params(self.view, location, session.position_encoding)
+                positions[config_name] = params["position"]
                 return session.send_request_task(
-                    Request.complete(text_document_position_params(self.view, location), self.view)
+                    Request.complete(params, self.view)
                 ).then(lambda response: (response, config_name))
 
             completion_promises.append(completion_request())
 
         Promise.all(completion_promises).then(
-            lambda responses: self._on_all_settled(responses, resolve_completion_list))
+            lambda responses: self._on_all_settled(
+                responses, resolve_completion_list, CachedCompletions(word_start, positions, prefix, change_count)))
+
+    def _filter_cached_completions_async(
+        self,
+        resolve_completion_list: ResolveCompletionsFn,
+        word_start: int,
+        prefix: str
+    ) -> bool:
+        """
+        Filter the previous completion list on the current prefix, if it was complete and the user has only typed more
+        of the same word since. Returns whether the completions were resolved from the previous list.
+        """
+        cached = self._cached_completions
+        if not cached:
+            return False
+        typed = cached.typed_since(self.view, word_start, prefix)
+        if typed is None:
+            return False
+        indexes = rank_completion_items(cached.items, prefix)
+        if typed:
+            # The text edits of the list were computed for the location it was requested at.
+            encodings = {sb.session.config.name: sb.session.position_encoding for sb in self.session_buffers_async()}
+            for index in indexes:
+                item = cached.items[index]
+                if not item.get("textEdit"):
+                    continue
+                stored = completion_store.get(cached.store_id, index)
+                if stored and stored[0] in encodings:
+                    session_name = stored[0]
+                    extended = extend_text_edit(item, cached.positions[session_name], typed, encodings[session_name])
+                    if extended is not item:
+                        completion_store.replace_text_edit(cached.store_id, index, extended["textEdit"])
+        resolve_completion_list([cached.completions[index] for index in indexes], cached.flags)
+        self._prefetch_completion_resolves_async(cached.store_id, indexes)
+        return True
 
     def _on_all_settled(
         self,
         responses: List[ResolvedCompletions],
-        resolve_completion_list: ResolveCompletionsFn
+        resolve_completion_list: ResolveCompletionsFn,
+        cached: Optional[CachedCompletions] = None
     ) -> None:
-        LspResolveDocsCommand.completions = {}
+        store_id = completion_store.begin()
+        cacheable = cached is not None
+        all_response_items = []  # type: List[CompletionItem]
         items = []  # type: List[sublime.CompletionItem]
         errors = []  # type: List[Error]
         flags = 0  # int
@@ -723,6 +856,7 @@ class DocumentSyncListener(sublime_plugin.ViewEventListener, AbstractViewListene
         for response, session_name in responses:
             if isinstance(response, Error):
                 errors.append(response)
+                cacheable = False
                 continue
             session = self.session_by_name(session_name)
             if not session:
@@ -732,20 +866,40 @@ class DocumentSyncListener(sublime_plugin.ViewEventListener, AbstractViewListene
                 response_items = response["items"] or []
                 if response.get("isIncomplete", False):
                     flags |= sublime.DYNAMIC_COMPLETIONS
+                    cacheable = False
             elif isinstance(response, list):
                 response_items = response
             response_items = sorted(response_items, key=lambda item: item.get("sortText") or item["label"])
-            LspResolveDocsCommand.completions[session_name] = response_items
+            offset = completion_store.extend(store_id, session_name, response_items)
+            all_response_items.extend(response_items)
             can_resolve_completion_items = session.has_capability('completionProvider.resolveProvider')
             items.extend(
-                format_completion(response_item, index, can_resolve_completion_items, session.config.name)
+                format_completion(response_item, offset + index, can_resolve_completion_items, store_id)
                 for index, response_item in enumerate(response_items))
         if items:
             flags |= sublime.INHIBIT_REORDER
         if errors:
             error_messages = ", ".join(str(error) for error in errors)
             sublime.status_message('Completion error: {}'.format(error_messages))
+        if cacheable and cached:
+            cached.store_id = store_id
+            cached.items = all_response_items
+            cached.completions = items
+            cached.flags = flags
+            self._cached_completions = cached
         resolve_completion_list(items, flags)
+        self._prefetch_completion_resolves_async(store_id, range(len(items)))
+
+    def _prefetch_completion_resolves_async(self, store_id: int, indexes: Sequence[int]) -> None:
+        count = userprefs().completion_resolve_prefetch_count
+        if count <= 0:
+            return
+        sessions = {
+            sb.session.config.name: sb.session for sb in self.session_buffers_async()
+            if sb.has_capability('completionProvider.resolveProvider')
+        }
+        if sessions:
+            resolve_prefetcher.start_async(self.view, sessions, store_id, indexes[:count])
 
     # --- Public utility methods ---------------------------------------------------------------------------------------
 
@@ -2,7 +2,9 @@ import sublime
 import sublime_plugin
 from .core.edit import sort_by_application_order, TextEditTuple
 from .core.logging import debug
-from .core.typing import List, Optional, Any, Generator
+from .core.protocol import PositionEncodingKind
+from .core.typing import List, Optional, Any, Generator, Tuple
+from .core.views import points_to_offsets
 from contextlib import contextmanager
 
 
@@ -21,22 +23,28 @@ def temporary_setting(settings: sublime.Settings, key: str, val: Any) -> Generat
 
 class LspApplyDocumentEditCommand(sublime_plugin.TextCommand):
 
-    def run(self, edit: Any, changes: Optional[List[TextEditTuple]] = None) -> None:
+    def run(
+        self, edit: Any, changes: Optional[List[TextEditTuple]] = None, encoding: str = PositionEncodingKind.UTF16
+    ) -> None:
         # Apply the changes in reverse, so that we don't invalidate the range
         # of any change that we haven't applied yet.
         if not changes:
             return
         with temporary_setting(self.view.settings(), "translate_tabs_to_spaces", False):
             view_version = self.view.change_count()
-            last_row, _ = self.view.rowcol_utf16(self.view.size())
-            for start, end, replacement, version in reversed(sort_by_application_order(changes)):
+            last_row, _ = self.view.rowcol(self.view.size())
+            changes = list(reversed(sort_by_application_order(changes)))
+            # Each change only moves the text after it, so all positions can be converted up front.
+            points = []  # type: List[Tuple[int, int]]
+            for start, end, _, _ in changes:
+                points.append(start)
+                points.append(end)
+            offsets = points_to_offsets(self.view, points, encoding)
+            for i, (start, end, replacement, version) in enumerate(changes):
                 if version is not None and version != view_version:
                     debug('ignoring edit due to non-matching document version')
                     continue
-                region = sublime.Region(
-                    self.view.text_point_utf16(*start, clamp_column=True),
-                    self.view.text_point_utf16(*end, clamp_column=True)
-                )
+                region = sublime.Region(offsets[2 * i], offsets[2 * i + 1])
                 if start[0] > last_row and replacement[0] != '\n':
                     # Handle when a language server (eg gopls) inserts at a row beyond the document
                     # some editors create the line automatically, sublime needs to have the newline prepended.
@@ -32,7 +32,7 @@ class LspExecuteCommand(LspTextCommand):
         if session and command_name:
             params = {"command": command_name}  # type: ExecuteCommandParams
             if command_args:
-                params["arguments"] = self._expand_variables(command_args)
+                params["arguments"] = self._expand_variables(command_args, session.position_encoding)
 
             def handle_response(response: Any) -> None:
                 assert command_name
@@ -48,7 +48,7 @@ class LspExecuteCommand(LspTextCommand):
 
             session.execute_command(params, progress=True).then(handle_response)
 
-    def _expand_variables(self, command_args: List[Any]) -> List[Any]:
+    def _expand_variables(self, command_args: List[Any], encoding: str) -> List[Any]:
         view = self.view  # type: sublime.View
         region = first_selection_region(view)
         for i, arg in enumerate(command_args):
@@ -66,9 +66,9 @@ class LspExecuteCommand(LspTextCommand):
                 elif arg in ["$selection_end", "${selection_end}"]:
                     command_args[i] = region.end()
                 elif arg in ["$position", "${position}"]:
-                    command_args[i] = offset_to_point(view, region.b).to_lsp()
+                    command_args[i] = offset_to_point(view, region.b, encoding).to_lsp()
                 elif arg in ["$range", "${range}"]:
-                    command_args[i] = region_to_range(view, region).to_lsp()
+                    command_args[i] = region_to_range(view, region, encoding).to_lsp()
         window = view.window()
         window_variables = window.extract_variables() if window else {}
         return sublime.expand_variables(command_args, window_variables)
@@ -1,11 +1,12 @@
 from .core.edit import parse_text_edit
 from .core.promise import Promise
 from .core.protocol import Error
+from .core.protocol import PositionEncodingKind
 from .core.protocol import TextEdit
 from .core.registry import LspTextCommand
 from .core.sessions import Session
 from .core.settings import userprefs
-from .core.typing import Any, Callable, List, Optional, Iterator, Union
+from .core.typing import Any, Callable, List, Optional, Iterator, Tuple, Union
 from .core.views import entire_content_region
 from .core.views import first_selection_region
 from .core.views import text_document_formatting
@@ -18,22 +19,26 @@ import sublime
 FormatResponse = Union[List[TextEdit], None, Error]
 
 
-def format_document(text_command: LspTextCommand) -> Promise[FormatResponse]:
+def format_document(text_command: LspTextCommand) -> Promise[Tuple[FormatResponse, str]]:
+    """Resolves to the response and the position encoding of the session that formatted the document."""
     view = text_command.view
     session = text_command.best_session(LspFormatDocumentCommand.capability)
     if session:
         # Either use the documentFormattingProvider ...
-        return session.send_request_task(text_document_formatting(view))
-    session = text_command.best_session(LspFormatDocumentRangeCommand.capability)
-    if session:
+        request = text_document_formatting(view)
+    else:
+        session = text_command.best_session(LspFormatDocumentRangeCommand.capability)
+        if not session:
+            return Promise.resolve((None, PositionEncodingKind.UTF16))
         # ... or use the documentRangeFormattingProvider and format the entire range.
-        return session.send_request_task(text_document_range_formatting(view, entire_content_region(view)))
-    return Promise.resolve(None)
+        request = text_document_range_formatting(view, entire_content_region(view), session.position_encoding)
+    encoding = session.position_encoding
+    return session.send_request_task(request).then(lambda response: (response, encoding))
 
 
-def apply_response_to_view(response: Optional[List[TextEdit]], view: sublime.View) -> None:
+def apply_response_to_view(response: Optional[List[TextEdit]], view: sublime.View, encoding: str) -> None:
     edits = list(parse_text_edit(change) for change in response) if response else []
-    view.run_command('lsp_apply_document_edit', {'changes': edits})
+    view.run_command('lsp_apply_document_edit', {'changes': edits, 'encoding': encoding})
 
 
 class WillSaveWaitTask(SaveTask):
@@ -61,12 +66,12 @@ class WillSaveWaitTask(SaveTask):
     def _will_save_wait_until_async(self, session: Session) -> None:
         session.send_request_async(
             will_save_wait_until(self._task_runner.view, reason=1),  # TextDocumentSaveReason.Manual
-            self._on_response,
-            lambda error: self._on_response(None))
+            lambda response: self._on_response(response, session.position_encoding),
+            lambda error: self._on_response(None, session.position_encoding))
 
-    def _on_response(self, response: Any) -> None:
+    def _on_response(self, response: Any, encoding: str) -> None:
         if response and not self._cancelled:
-            apply_response_to_view(response, self._task_runner.view)
+            apply_response_to_view(response, self._task_runner.view, encoding)
         sublime.set_timeout_async(self._handle_next_session_async)
 
 
@@ -83,9 +88,10 @@ class FormattingTask(SaveTask):
         self._purge_changes_async()
         format_document(self._task_runner).then(self._on_response)
 
-    def _on_response(self, response: FormatResponse) -> None:
+    def _on_response(self, result: Tuple[FormatResponse, str]) -> None:
+        response, encoding = result
         if response and not isinstance(response, Error) and not self._cancelled:
-            apply_response_to_view(response, self._task_runner.view)
+            apply_response_to_view(response, self._task_runner.view, encoding)
         sublime.set_timeout_async(self._on_complete)
 
 
@@ -103,9 +109,10 @@ class LspFormatDocumentCommand(LspTextCommand):
     def run(self, edit: sublime.Edit, event: Optional[dict] = None) -> None:
         format_document(self).then(self.on_result)
 
-    def on_result(self, result: FormatResponse) -> None:
-        if result and not isinstance(result, Error):
-            apply_response_to_view(result, self.view)
+    def on_result(self, result: Tuple[FormatResponse, str]) -> None:
+        response, encoding = result
+        if response and not isinstance(response, Error):
+            apply_response_to_view(response, self.view, encoding)
 
 
 class LspFormatDocumentRangeCommand(LspTextCommand):
@@ -124,5 +131,6 @@ class LspFormatDocumentRangeCommand(LspTextCommand):
         session = self.best_session(self.capability)
         selection = first_selection_region(self.view)
         if session and selection is not None:
-            req = text_document_range_formatting(self.view, selection)
-            session.send_request(req, lambda response: apply_response_to_view(response, self.view))
+            encoding = session.position_encoding
+            req = text_document_range_formatting(self.view, selection, encoding)
+            session.send_request(req, lambda response: apply_response_to_view(response, self.view, encoding))
@@ -9,7 +9,6 @@ from .core.protocol import Hover
 from .core.protocol import Position
 from .core.protocol import RangeLsp
 from .core.protocol import Request
-from .core.protocol import TextDocumentPositionParams
 from .core.registry import LspTextCommand
 from .core.registry import windows
 from .core.sessions import AbstractViewListener
@@ -28,7 +27,6 @@ from .core.views import make_link
 from .core.views import MarkdownLangMap
 from .core.views import minihtml
 from .core.views import show_lsp_popup
-from .core.views import text_document_position_params
 from .core.views import text_document_range_params
 from .core.views import unpack_href_location
 from .core.views import update_lsp_popup
@@ -36,12 +34,11 @@ from urllib.parse import unquote, urlparse
 import functools
 import re
 import sublime
-import webbrowser
 
 
 SUBLIME_WORD_MASK = 515
 SessionName = str
-ResolvedHover = Union[Hover, Error]
+ResolvedHover = Union[Hover, Error, None]
 
 
 _test_contents = []  # type: List[str]
@@ -128,24 +125,31 @@ class LspHoverCommand(LspTextCommand):
     def request_symbol_hover_async(self, listener: AbstractViewListener, point: int) -> None:
         hover_promises = []  # type: List[Promise[ResolvedHover]]
         language_maps = []  # type: List[Optional[MarkdownLangMap]]
-        for session in listener.sessions_async('hoverProvider'):
-            document_position = self._create_hover_request(session, point)
-            hover_promises.append(session.send_request_task(
-                Request("textDocument/hover", document_position, self.view)
-            ))
+        for sv in listener.session_views_async():
+            if not sv.has_capability_async('hoverProvider'):
+                continue
+            session = sv.session
+            range_params = self._create_range_hover_request(session, point)
+            if range_params:
+                hover_promises.append(session.send_request_task(
+                    Request("textDocument/hover", range_params, self.view)
+                ))
+            else:
+                # Plain hovers are cached per buffer until it changes.
+                hover_promises.append(sv.session_buffer.get_hover_async(self.view, point))
             language_maps.append(session.markdown_language_id_to_st_syntax_map())
 
         continuation = functools.partial(self._on_all_settled, listener, point, language_maps)
         Promise.all(hover_promises).then(continuation)
 
-    def _create_hover_request(
+    def _create_range_hover_request(
         self, session: Session, point: int
-    ) -> Union[TextDocumentPositionParams, ExperimentalTextDocumentRangeParams]:
+    ) -> Optional[ExperimentalTextDocumentRangeParams]:
         if session.get_capability('experimental.rangeHoverProvider'):
             region = first_selection_region(self.view)
             if region is not None and region.contains(point):
-                return text_document_range_params(self.view, point, region)
-        return text_document_position_params(self.view, point)
+                return text_document_range_params(self.view, point, region, session.position_encoding)
+        return None
 
     def _on_all_settled(
         self,
@@ -270,16 +274,17 @@ class LspHoverCommand(LspTextCommand):
             else:
                 self.handle_code_action_select(config_name, 0)
         elif is_location_href(href):
-            session_name, uri, row, col_utf16 = unpack_href_location(href)
+            session_name, uri, row, col = unpack_href_location(href)
             session = self.session_by_name(session_name)
             if session:
-                position = {"line": row, "character": col_utf16}  # type: Position
+                position = {"line": row, "character": col}  # type: Position
                 r = {"start": position, "end": position}  # type: RangeLsp
                 sublime.set_timeout_async(functools.partial(session.open_uri_async, uri, r))
         else:
             # NOTE: Remove this check when on py3.8.
             if not (href.lower().startswith("http://") or href.lower().startswith("https://")):
                 href = "http://" + href
+            import webbrowser
             if not webbrowser.open(href):
                 debug("failed to open:", href)
 
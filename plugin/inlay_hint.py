@@ -0,0 +1,190 @@
+from .core.edit import parse_text_edit
+from .core.protocol import InlayHint
+from .core.protocol import InlayHintLabelPart
+from .core.protocol import Request
+from .core.registry import LspTextCommand
+from .core.typing import Callable, Dict, Iterable, List, Optional, Tuple
+from .core.views import make_command_link
+from .core.views import PhantomLayer
+from html import escape as html_escape
+import sublime
+
+INLAY_HINT_HTML = """
+<body id="lsp-inlay-hint">
+    <style>
+        .inlay-hint {{
+            color: color(var(--foreground) alpha(0.6));
+            background-color: color(var(--foreground) alpha(0.08));
+            border-radius: 4px;
+            padding: 0.05em 4px;
+            font-size: 0.9em;
+        }}
+        .inlay-hint a {{
+            color: color(var(--foreground) alpha(0.6));
+            text-decoration: none;
+        }}
+    </style>
+    <div class="inlay-hint">{}</div>
+</body>
+"""
+
+InlayHintKey = Tuple[int, int, str]
+
+
+def inlay_hint_label(hint: InlayHint) -> str:
+    label = hint["label"]
+    return label if isinstance(label, str) else "".join(part["value"] for part in label)
+
+
+def inlay_hint_key(hint: InlayHint) -> InlayHintKey:
+    position = hint["position"]
+    return position["line"], position["character"], inlay_hint_label(hint)
+
+
+def inlay_hint_to_html(view: sublime.View, hint: InlayHint, session_name: str, clickable: bool) -> str:
+    label = hint["label"]
+    parts = [{"value": label}] if isinstance(label, str) else label  # type: List[InlayHintLabelPart]
+    html = ""
+    for part in parts:
+        value = part["value"]
+        command = part.get("command")
+        if command and command.get("command"):
+            html += make_command_link("lsp_execute", value, {
+                "session_name": session_name,
+                "command_name": command["command"],
+                "command_args": command.get("arguments", []),
+            })
+        elif clickable:
+            args = {"session_name": session_name, "inlay_hint": hint}
+            html += make_command_link("lsp_inlay_hint_click", value, args, view=view)
+        else:
+            html += html_escape(value)
+    if hint.get("paddingLeft"):
+        html = "&nbsp;" + html
+    if hint.get("paddingRight"):
+        html += "&nbsp;"
+    return INLAY_HINT_HTML.format(html)
+
+
+class InlayHintCache:
+    """
+    Remembers the inlay hints of a buffer for one change count, together with the lines they were requested for, so
+    that scrolling only requests the lines that weren't requested yet.
+    """
+
+    __slots__ = ("change_count", "generation", "hints", "_spans")
+
+    def __init__(self) -> None:
+        self.change_count = -1
+        # Counts the times the cache was cleared, so that responses to earlier requests can be told apart.
+        self.generation = 0
+        # The hints and the points they belong to.
+        self.hints = {}  # type: Dict[InlayHintKey, Tuple[InlayHint, int]]
+        # Sorted, disjoint, half-open ranges of lines that were requested.
+        self._spans = []  # type: List[Tuple[int, int]]
+
+    def clear(self, change_count: int) -> None:
+        if change_count != self.change_count:
+            self.change_count = change_count
+            self.generation += 1
+            self.hints = {}
+            self._spans = []
+
+    def missing_spans(self, start_line: int, end_line: int) -> List[Tuple[int, int]]:
+        """Returns the ranges of lines between `start_line` and `end_line` that weren't requested yet."""
+        result = []  # type: List[Tuple[int, int]]
+        for a, b in self._spans:
+            if b <= start_line:
+                continue
+            if a >= end_line:
+                break
+            if a > start_line:
+                result.append((start_line, a))
+            start_line = b
+        if start_line < end_line:
+            result.append((start_line, end_line))
+        return result
+
+    def add_span(self, start_line: int, end_line: int) -> None:
+        spans = []  # type: List[Tuple[int, int]]
+        for a, b in sorted(self._spans + [(start_line, end_line)]):
+            if spans and a <= spans[-1][1]:
+                spans[-1] = (spans[-1][0], max(b, spans[-1][1]))
+            else:
+                spans.append((a, b))
+        self._spans = spans
+
+    def remove_span(self, start_line: int, end_line: int) -> None:
+        """Forget that the given lines were requested, so that they are requested again."""
+        spans = []  # type: List[Tuple[int, int]]
+        for a, b in self._spans:
+            if a < start_line:
+                spans.append((a, min(b, start_line)))
+            if b > end_line:
+                spans.append((max(a, end_line), b))
+        self._spans = spans
+
+    def add_hints(self, hints: Iterable[InlayHint], points: Iterable[int]) -> None:
+        for hint, point in zip(hints, points):
+            self.hints[inlay_hint_key(hint)] = (hint, point)
+
+
+class InlayHintView:
+    """
+    Draws inlay hints into a view as inline phantoms. Phantoms that are drawn already are kept, so that requesting the
+    hints of more lines only adds the new ones, and an edit only replaces the hints that changed.
+    """
+
+    def __init__(self, view: sublime.View, key: str) -> None:
+        self._phantoms = PhantomLayer(view, key)
+        self._change_count = -1
+        # The HTML of the hints of the current change count.
+        self._contents = {}  # type: Dict[InlayHintKey, str]
+
+    def update(
+        self,
+        change_count: int,
+        hints: Dict[InlayHintKey, Tuple[InlayHint, int]],
+        to_html: Callable[[InlayHint], str]
+    ) -> None:
+        """Show exactly the given hints, at the points that come with them."""
+        if change_count != self._change_count:
+            self._change_count = change_count
+            self._contents = {}
+        phantoms = []  # type: List[Tuple[sublime.Region, str]]
+        for key, (hint, point) in hints.items():
+            content = self._contents.get(key)
+            if content is None:
+                content = to_html(hint)
+                self._contents[key] = content
+            phantoms.append((sublime.Region(point), content))
+        self._phantoms.update(change_count, phantoms)
+
+    def clear(self) -> None:
+        self._phantoms.clear()
+        self._contents = {}
+
+
+class LspInlayHintClickCommand(LspTextCommand):
+
+    capability = "inlayHintProvider"
+
+    def run(self, edit: sublime.Edit, session_name: str, inlay_hint: InlayHint) -> None:
+        session = self.session_by_name(session_name, self.capability)
+        if not session:
+            return
+        encoding = session.position_encoding
+        # The text edits of a hint are resolved only when the hint is clicked.
+        if "textEdits" not in inlay_hint and session.get_capability("inlayHintProvider.resolveProvider"):
+            session.send_request(
+                Request.resolveInlayHint(inlay_hint, self.view),
+                lambda response: self._apply_text_edits(response, encoding)
+            )
+        else:
+            self._apply_text_edits(inlay_hint, encoding)
+
+    def _apply_text_edits(self, inlay_hint: Optional[InlayHint], encoding: str) -> None:
+        if not inlay_hint or not inlay_hint.get("textEdits"):
+            return
+        edits = [parse_text_edit(text_edit) for text_edit in inlay_hint["textEdits"]]
+        self.view.run_command("lsp_apply_document_edit", {"changes": edits, "encoding": encoding})
@@ -33,7 +33,8 @@ def open_basic_file(
     filename = session.config.map_server_uri_to_client_path(uri)
     if group is None:
         group = session.window.active_group()
-    session.window.open_file(to_encoded_filename(filename, position), flags=flags, group=group)
+    file_name = to_encoded_filename(filename, position, session.position_encoding, session.window)
+    session.window.open_file(file_name, flags=flags, group=group)
 
 
 class LocationPicker:
@@ -11,12 +11,11 @@ from .core.types import ClientConfig
 from .core.types import PANEL_FILE_REGEX
 from .core.types import PANEL_LINE_REGEX
 from .core.typing import Dict, List, Optional, Tuple
-from .core.views import get_line
+from .core.views import get_lines
 from .core.views import get_uri_and_position_from_location
 from .core.views import text_document_position_params
 from .locationpicker import LocationPicker
 import functools
-import linecache
 import os
 import sublime
 
@@ -35,7 +34,7 @@ class LspSymbolReferencesCommand(LspTextCommand):
         file_path = self.view.file_name()
         pos = get_position(self.view, event, point)
         if session and file_path and pos is not None:
-            position_params = text_document_position_params(self.view, pos)
+            position_params = text_document_position_params(self.view, pos, session.position_encoding)
             params = {
                 'textDocument': position_params['textDocument'],
                 'position': position_params['position'],
@@ -52,14 +51,16 @@ class LspSymbolReferencesCommand(LspTextCommand):
             )
 
     def _handle_response_async(self, word: str, session: Session, response: Optional[List[Location]]) -> None:
-        sublime.set_timeout(lambda: self._handle_response(word, session, response))
+        if response and not userprefs().show_references_in_quick_panel:
+            # Fetch the lines of all references here, so that we don't read files on the main thread.
+            references_by_file = _group_locations_by_uri(session.window, session.config, response)
+            sublime.set_timeout(lambda: self._show_references_in_output_panel(word, session, references_by_file))
+        else:
+            sublime.set_timeout(lambda: self._handle_response(word, session, response))
 
     def _handle_response(self, word: str, session: Session, response: Optional[List[Location]]) -> None:
         if response:
-            if userprefs().show_references_in_quick_panel:
-                self._show_references_in_quick_panel(session, response)
-            else:
-                self._show_references_in_output_panel(word, session, response)
+            self._show_references_in_quick_panel(session, response)
         else:
             window = self.view.window()
             if window:
@@ -69,7 +70,12 @@ class LspSymbolReferencesCommand(LspTextCommand):
         self.view.run_command("add_jump_record", {"selection": [(r.a, r.b) for r in self.view.sel()]})
         LocationPicker(self.view, session, locations, side_by_side=False)
 
-    def _show_references_in_output_panel(self, word: str, session: Session, locations: List[Location]) -> None:
+    def _show_references_in_output_panel(
+        self,
+        word: str,
+        session: Session,
+        references_by_file: Dict[str, List[Tuple[Point, str]]]
+    ) -> None:
         window = session.window
         panel = ensure_references_panel(window)
         if not panel:
@@ -80,7 +86,6 @@ class LspSymbolReferencesCommand(LspTextCommand):
         base_dir = manager.get_project_path(self.view.file_name() or "")
         to_render = []  # type: List[str]
         references_count = 0
-        references_by_file = _group_locations_by_uri(window, session.config, locations)
         for file, references in references_by_file.items():
             to_render.append('{}:'.format(_get_relative_path(base_dir, file)))
             for reference in references:
@@ -118,16 +123,14 @@ def _group_locations_by_uri(
     locations: List[Location]
 ) -> Dict[str, List[Tuple[Point, str]]]:
     """Return a dictionary that groups locations by the URI it belongs."""
-    grouped_locations = {}  # type: Dict[str, List[Tuple[Point, str]]]
+    points_by_file = {}  # type: Dict[str, List[Point]]
     for location in locations:
         uri, position = get_uri_and_position_from_location(location)
         file_path = config.map_server_uri_to_client_path(uri)
-        point = Point.from_lsp(position)
-        # get line of the reference, to showcase its use
-        reference_line = get_line(window, file_path, point.row)
-        if grouped_locations.get(file_path) is None:
-            grouped_locations[file_path] = []
-        grouped_locations[file_path].append((point, reference_line))
-    # we don't want to cache the line, we always want to get fresh data
-    linecache.clearcache()
-    return grouped_locations
+        points_by_file.setdefault(file_path, []).append(Point.from_lsp(position))
+    # get the lines of all references in one go, to showcase their use
+    lines = get_lines(window, ((file_path, p.row) for file_path, points in points_by_file.items() for p in points))
+    return {
+        file_path: [(p, lines[(file_path, p.row)]) for p in points]
+        for file_path, points in points_by_file.items()
+    }
@@ -10,8 +10,9 @@ from .core.registry import LspTextCommand
 from .core.registry import windows
 from .core.types import PANEL_FILE_REGEX, PANEL_LINE_REGEX
 from .core.typing import Any, Optional, Dict, List
-from .core.views import first_selection_region, range_to_region, get_line
+from .core.views import first_selection_region, range_to_region, get_lines
 from .core.views import text_document_position_params
+import functools
 import os
 import sublime
 import sublime_plugin
@@ -91,10 +92,12 @@ class LspSymbolRenameCommand(LspTextCommand):
             else:
                 session = self.best_session("{}.prepareProvider".format(self.capability))
                 if session:
-                    params = text_document_position_params(self.view, pos)
+                    encoding = session.position_encoding
+                    params = text_document_position_params(self.view, pos, encoding)
                     request = Request("textDocument/prepareRename", params, self.view, progress=True)
                     self.event = event
-                    session.send_request(request, lambda r: self.on_prepare_result(r, pos), self.on_prepare_error)
+                    session.send_request(
+                        request, lambda r: self.on_prepare_result(r, pos, encoding), self.on_prepare_error)
                 else:
                     # trigger InputHandler manually
                     raise TypeError("required positional argument")
@@ -108,7 +111,8 @@ class LspSymbolRenameCommand(LspTextCommand):
     def _do_rename(self, position: int, new_name: str) -> None:
         session = self.best_session(self.capability)
         if session:
-            position_params = text_document_position_params(self.view, position)
+            encoding = session.position_encoding
+            position_params = text_document_position_params(self.view, position, encoding)
             params = {
                 "textDocument": position_params["textDocument"],
                 "position": position_params["position"],
@@ -117,10 +121,10 @@ class LspSymbolRenameCommand(LspTextCommand):
             session.send_request(
                 Request("textDocument/rename", params, self.view, progress=True),
                 # This has to run on the main thread due to calling apply_workspace_edit
-                lambda r: sublime.set_timeout(lambda: self.on_rename_result(r))
+                lambda r: sublime.set_timeout(lambda: self.on_rename_result(r, encoding))
             )
 
-    def on_rename_result(self, response: Any) -> None:
+    def on_rename_result(self, response: Any, encoding: str) -> None:
         window = self.view.window()
         if window:
             if response:
@@ -131,15 +135,15 @@ class LspSymbolRenameCommand(LspTextCommand):
                     message = "Replace {} occurrences across {} files?".format(total_changes, file_count)
                     choice = sublime.yes_no_cancel_dialog(message, "Replace", "Dry Run")
                     if choice == sublime.DIALOG_YES:
-                        apply_workspace_edit(window, changes)
+                        apply_workspace_edit(window, changes, encoding)
                     elif choice == sublime.DIALOG_NO:
                         self._render_rename_panel(changes, total_changes, file_count)
                 else:
-                    apply_workspace_edit(window, changes)
+                    apply_workspace_edit(window, changes, encoding)
             else:
                 window.status_message('Nothing to rename')
 
-    def on_prepare_result(self, response: Any, pos: int) -> None:
+    def on_prepare_result(self, response: Any, pos: int, encoding: str) -> None:
         if response is None:
             sublime.error_message("The current selection cannot be renamed")
             return
@@ -150,7 +154,7 @@ class LspSymbolRenameCommand(LspTextCommand):
         else:
             placeholder = self.view.substr(self.view.word(pos))
             r = response
-        region = range_to_region(Range.from_lsp(r), self.view)
+        region = range_to_region(Range.from_lsp(r), self.view, encoding)
         args = {"placeholder": placeholder, "position": region.a, "event": self.event}
         self.view.run_command("lsp_symbol_rename", args)
 
@@ -176,17 +180,33 @@ class LspSymbolRenameCommand(LspTextCommand):
         window = self.view.window()
         if not window:
             return
-        panel = ensure_rename_panel(window)
-        if not panel:
-            return
+        # Reading the changed lines may touch a lot of files on disk, so do that off the main thread.
+        sublime.set_timeout_async(
+            functools.partial(self._render_rename_panel_async, window, changes, total_changes, file_count))
+
+    def _render_rename_panel_async(
+        self,
+        window: sublime.Window,
+        changes: Dict[str, List[TextEditTuple]],
+        total_changes: int,
+        file_count: int
+    ) -> None:
+        lines = get_lines(window, ((file, edit[0][0]) for file, edits in changes.items() for edit in edits))
         to_render = []  # type: List[str]
         for file, file_changes in changes.items():
             to_render.append('{}:'.format(self._get_relative_path(file)))
             for edit in file_changes:
                 start = edit[0]
-                line_content = get_line(window, file, start[0])
+                line_content = lines[(file, start[0])]
                 to_render.append(" {:>4}:{:<4} {}".format(start[0] + 1, start[1] + 1, line_content))
             to_render.append("")  # this adds a spacing between filenames
+        sublime.set_timeout(lambda: self._show_rename_panel(window, to_render, total_changes, file_count))
+
+    def _show_rename_panel(self, window: sublime.Window, to_render: List[str], total_changes: int,
+                           file_count: int) -> None:
+        panel = ensure_rename_panel(window)
+        if not panel:
+            return
         characters = "\n".join(to_render)
         base_dir = windows.lookup(window).get_project_path(self.view.file_name() or "")
         panel.settings().set("result_base_dir", base_dir)
@@ -27,19 +27,21 @@ class LspExpandSelectionCommand(LspTextCommand):
             return
         session = self.best_session(self.capability, position)
         if session:
-            params = selection_range_params(self.view)
+            encoding = session.position_encoding
+            params = selection_range_params(self.view, encoding)
             self._regions.extend(self.view.sel())
             self._change_count = self.view.change_count()
-            session.send_request(Request(self.method, params), self.on_result, self.on_error)
+            session.send_request(
+                Request(self.method, params), lambda response: self.on_result(response, encoding), self.on_error)
         else:
             self._run_builtin_expand_selection("No {} found".format(self.capability))
 
-    def on_result(self, params: Any) -> None:
+    def on_result(self, params: Any, encoding: str) -> None:
         if self._change_count != self.view.change_count():
             return
         if params:
             self.view.run_command("lsp_selection_set", {"regions": [
-                self._smallest_containing(region, param) for region, param in zip(self._regions, params)]})
+                self._smallest_containing(region, param, encoding) for region, param in zip(self._regions, params)]})
         else:
             self._status_message("Nothing to expand")
         self._regions.clear()
@@ -57,12 +59,12 @@ class LspExpandSelectionCommand(LspTextCommand):
         self._status_message("{}, reverting to built-in Expand Selection".format(fallback_reason))
         self.view.run_command("expand_selection", {"to": "smart"})
 
-    def _smallest_containing(self, region: sublime.Region, param: Dict[str, Any]) -> Tuple[int, int]:
-        r = range_to_region(Range.from_lsp(param["range"]), self.view)
+    def _smallest_containing(self, region: sublime.Region, param: Dict[str, Any], encoding: str) -> Tuple[int, int]:
+        r = range_to_region(Range.from_lsp(param["range"]), self.view, encoding)
         # Test for *strict* containment
         if r.contains(region) and (r.a < region.a or r.b > region.b):
             return r.a, r.b
         parent = param.get("parent")
         if parent:
-            return self._smallest_containing(region, parent)
+            return self._smallest_containing(region, parent, encoding)
         return region.a, region.b
@@ -1,6 +1,11 @@
+from .core.promise import Promise
+from .core.logging import debug
 from .core.protocol import Diagnostic
 from .core.protocol import DiagnosticSeverity
+from .core.protocol import DocumentDiagnosticReportKind
 from .core.protocol import DocumentUri
+from .core.protocol import Error
+from .core.protocol import Hover
 from .core.protocol import Range
 from .core.protocol import Request
 from .core.protocol import TextDocumentSyncKindFull
@@ -12,7 +17,7 @@ from .core.types import Capabilities
 from .core.types import debounced
 from .core.types import Debouncer
 from .core.types import FEATURES_TIMEOUT
-from .core.typing import Any, Callable, Iterable, Optional, List, Dict, Tuple
+from .core.typing import Any, Callable, Deque, Iterable, Optional, List, Dict, Tuple, Union
 from .core.views import DIAGNOSTIC_SEVERITY
 from .core.views import diagnostic_severity
 from .core.views import did_change
@@ -20,13 +25,91 @@ from .core.views import did_close
 from .core.views import did_open
 from .core.views import did_save
 from .core.views import document_color_params
-from .core.views import lsp_color_to_phantom
+from .core.views import is_visible
+from .core.views import lsp_color_to_html
 from .core.views import MissingUriError
+from .core.views import PhantomLayer
+from .core.views import points_to_offsets
+from .core.views import position
 from .core.views import range_to_region
+from .core.views import ranges_to_regions
+from .core.views import text_document_identifier
+from .core.views import text_document_position_params
 from .core.views import will_save
+from .inlay_hint import InlayHintCache
+from collections import deque
 from weakref import WeakSet
+import bisect
+import functools
 import sublime
 import time
+import weakref
+
+HOVER_CACHE_SIZE = 16
+
+ResolvedHover = Union[Hover, Error, None]
+
+
+class HoverCache:
+    """
+    Remembers the textDocument/hover responses of a buffer until it changes. Hovering anywhere in the range of a
+    response again, or in the same word when the response has no range, resolves immediately. Requests for a word
+    that is already being hovered share the pending response. Empty responses are not remembered, because servers
+    send them while they are still indexing.
+    """
+
+    __slots__ = ("_session", "_hovers", "_change_count", "_pending")
+
+    def __init__(self, session: Session) -> None:
+        self._session = session
+        # Responses for the current change count, together with the region they apply to.
+        self._hovers = []  # type: List[Tuple[sublime.Region, ResolvedHover]]
+        self._change_count = -1
+        self._pending = {}  # type: Dict[Tuple[int, int], Promise[ResolvedHover]]
+
+    def get_async(self, view: sublime.View, point: int) -> Promise[ResolvedHover]:
+        change_count = view.change_count()
+        self.clear_async(change_count)
+        for region, response in self._hovers:
+            if region.contains(point):
+                return Promise.resolve(response)
+        word = view.word(point)
+        key = (word.a, word.b)
+        pending = self._pending.get(key)
+        if pending:
+            return pending
+        params = text_document_position_params(view, point, self._session.position_encoding)
+        request = Request("textDocument/hover", params, view)
+        promise = self._session.send_request_task(request).then(
+            lambda response: self._on_response_async(view, change_count, point, word, response)
+        )  # type: Promise[ResolvedHover]
+        if not promise.resolved:
+            self._pending[key] = promise
+        return promise
+
+    def clear_async(self, change_count: int) -> None:
+        if change_count != self._change_count:
+            self._change_count = change_count
+            self._hovers = []
+            self._pending = {}
+
+    def _on_response_async(
+        self, view: sublime.View, change_count: int, point: int, word: sublime.Region, response: ResolvedHover
+    ) -> ResolvedHover:
+        if change_count != self._change_count or change_count != view.change_count():
+            return response
+        self._pending.pop((word.a, word.b), None)
+        if isinstance(response, Error) or not response or not response.get("contents"):
+            return response
+        region = word
+        if response.get("range"):
+            hover_region = range_to_region(Range.from_lsp(response["range"]), view, self._session.position_encoding)
+            if hover_region.contains(point):
+                region = hover_region
+        self._hovers.append((region, response))
+        if len(self._hovers) > HOVER_CACHE_SIZE:
+            del self._hovers[0]
+        return response
 
 
 class PendingChanges:
@@ -55,6 +138,40 @@ class DiagnosticSeverityData:
             self.icon = userprefs().diagnostics_gutter_marker
 
 
+class DeferredDidOpens:
+    """
+    Sends the textDocument/didOpen notifications of documents whose opening was deferred in the background, one every
+    "deferred_did_open_interval_ms" milliseconds, in the order in which they were deferred.
+    """
+
+    def __init__(self) -> None:
+        self._queue = deque()  # type: Deque[weakref.ref[SessionBuffer]]
+        self._scheduled = False
+
+    def add_async(self, session_buffer: 'SessionBuffer') -> None:
+        self._queue.append(weakref.ref(session_buffer))
+        self._schedule_async()
+
+    def _schedule_async(self) -> None:
+        interval = userprefs().deferred_did_open_interval_ms
+        if self._scheduled or not self._queue or interval <= 0:
+            return
+        self._scheduled = True
+        sublime.set_timeout_async(self._open_next_async, interval)
+
+    def _open_next_async(self) -> None:
+        self._scheduled = False
+        while self._queue:
+            session_buffer = self._queue.popleft()()
+            # Documents that were closed or opened in the meantime don't count.
+            if session_buffer and session_buffer.open_deferred_async():
+                break
+        self._schedule_async()
+
+
+deferred_did_opens = DeferredDidOpens()
+
+
 class SessionBuffer:
     """
     Holds state per session per buffer.
@@ -81,19 +198,42 @@ class SessionBuffer:
         self.diagnostics_flags = 0
         self.diagnostics_are_visible = False
         self.last_text_change_time = 0.0
+        # The last time the document was viewed, edited or needed by a feature, for closing idle documents.
+        self.last_active_time = time.time()
+        # Whether the document was closed on the server because it was idle. It is re-opened like a deferred document.
+        self.evicted = False
+        self._eviction_scheduled = False
         self.total_errors = 0
         self.total_warnings = 0
         self.should_show_diagnostics_panel = False
         self.diagnostics_debouncer = Debouncer()
-        self.color_phantoms = sublime.PhantomSet(view, "lsp_color")
-        self._check_did_open(view)
+        # The resultId of the last textDocument/diagnostic report, so that the server can skip an unchanged report.
+        self._diagnostic_result_id = None  # type: Optional[str]
+        self._pending_diagnostic_version = None  # type: Optional[int]
+        # Whether the server asked to pull diagnostics again while the document wasn't visible.
+        self._diagnostic_outdated = False
+        # The colors of the last textDocument/documentColor response, sorted by position, and the version they are for.
+        # Only the colors around the visible region are drawn.
+        self.color_phantoms = PhantomLayer(view, "lsp_color")
+        self._document_colors = []  # type: List[Tuple[sublime.Region, str]]
+        self._document_color_points = []  # type: List[int]
+        self._document_colors_version = -1
+        self._pending_document_colors_version = None  # type: Optional[int]
+        self._hovers = HoverCache(self._session)
+        self.inlay_hints = InlayHintCache()
+        # Whether textDocument/didOpen is held back until the view is activated or a feature needs the document.
+        self.did_open_deferred = userprefs().defer_did_open and not is_visible(view)
+        if self.did_open_deferred:
+            deferred_did_opens.add_async(self)
+        else:
+            self._check_did_open(view)
         self._session.register_session_buffer_async(self)
 
     def __del__(self) -> None:
         mgr = self.session.manager()
         if mgr:
             mgr.update_diagnostics_panel_async()
-        self.color_phantoms.update([])
+        self.color_phantoms.clear()
         # If the session is exiting then there's no point in sending textDocument/didClose and there's also no point
         # in unregistering ourselves from the session.
         if not self.session.exiting:
@@ -110,20 +250,95 @@ class SessionBuffer:
         return self._session_views
 
     def _check_did_open(self, view: sublime.View) -> None:
-        if not self.opened and self.should_notify_did_open():
+        if not self.opened and not self.did_open_deferred and self.should_notify_did_open():
             language_id = self.get_language_id()
             if not language_id:
                 # we're closing
                 return
             self.session.send_notification(did_open(view, language_id))
             self.opened = True
-            self._do_color_boxes_async(view, view.change_count())
+            self.evicted = False
+            self._touch_async()
+            self._present_stale_diagnostics_async(view)
+            self.do_color_boxes_async(view)
+            self.do_document_diagnostic_async(view, view.change_count())
             self.session.notify_plugin_on_session_buffer_change(self)
 
+    def _present_stale_diagnostics_async(self, view: sublime.View) -> None:
+        # The diagnostics from the snapshot of the last session are shown until the server reports new ones.
+        diagnostics = self.session.diagnostics_manager.stale_diagnostics_by_document_uri(self.last_known_uri)
+        if diagnostics and not view.is_dirty():
+            self.on_diagnostics_async(diagnostics, view.change_count())
+
+    def on_activated_async(self, view: sublime.View) -> None:
+        self._touch_async()
+        if self.open_deferred_async(view):
+            return
+        # Changes to other documents may have affected the diagnostics of this one.
+        if self._diagnostic_outdated or self.get_capability("diagnosticProvider.interFileDependencies"):
+            self.do_document_diagnostic_async(view)
+
+    def open_deferred_async(self, view: Optional[sublime.View] = None) -> bool:
+        """Send the deferred textDocument/didOpen notification, if any. Returns whether the document was opened."""
+        if not self.did_open_deferred or self.session.exiting:
+            return False
+        if view is None:
+            view = self.some_view()
+            if not view:
+                return False
+        self.did_open_deferred = False
+        # The notification carries the current text of the view.
+        self.pending_changes = None
+        self._check_did_open(view)
+        return self.opened
+
     def _check_did_close(self) -> None:
         if self.opened and self.should_notify_did_close():
             self.session.send_notification(did_close(uri=self.last_known_uri))
             self.opened = False
+            self._diagnostic_result_id = None
+            self._pending_diagnostic_version = None
+
+    def _touch_async(self) -> None:
+        self.last_active_time = time.time()
+        self._schedule_eviction_async(userprefs().close_idle_documents_after_minutes * 60.0)
+
+    def _schedule_eviction_async(self, delay_in_seconds: float) -> None:
+        if delay_in_seconds <= 0 or self._eviction_scheduled or not self.opened:
+            return
+        self._eviction_scheduled = True
+        # Don't keep the session buffer alive; textDocument/didClose is sent when it's garbage collected.
+        weak_self = weakref.ref(self)
+
+        def evict_if_idle_async() -> None:
+            session_buffer = weak_self()
+            if session_buffer:
+                session_buffer._evict_if_idle_async()
+
+        sublime.set_timeout_async(evict_if_idle_async, int(delay_in_seconds * 1000))
+
+    def _evict_if_idle_async(self) -> None:
+        """
+        Close the document on the server when it hasn't been viewed, edited or needed by a feature for the configured
+        time. It is opened again like a deferred document, i.e. when it's activated or a feature needs it.
+        """
+        self._eviction_scheduled = False
+        timeout = userprefs().close_idle_documents_after_minutes * 60.0
+        if timeout <= 0 or not self.opened or self.session.exiting or not self.should_notify_did_close():
+            return
+        if any(is_visible(sv.view) or sv.view.is_dirty() for sv in self.session_views):
+            # Visible documents are being viewed, and the server must not fall back to the file on disk for unsaved
+            # documents.
+            self.last_active_time = time.time()
+        idle = time.time() - self.last_active_time
+        if idle < timeout:
+            self._schedule_eviction_async(timeout - idle)
+            return
+        debug("closing idle document", self.last_known_uri)
+        self._check_did_close()
+        self.pending_changes = None
+        self.did_open_deferred = True
+        self.evicted = True
 
     def get_uri(self) -> Optional[str]:
         for sv in self.session_views:
@@ -214,6 +429,10 @@ class SessionBuffer:
     def on_text_changed_async(self, view: sublime.View, change_count: int,
                               changes: Iterable[sublime.TextChange]) -> None:
         self.last_text_change_time = time.time()
+        self.last_active_time = self.last_text_change_time
+        self._hovers.clear_async(change_count)
+        if self.did_open_deferred:
+            return
         last_change = list(changes)[-1]
         if last_change.a.pt == 0 and last_change.b.pt == 0 and last_change.str == '' and view.size() != 0:
             # Issue https://github.com/sublimehq/sublime_text/issues/3323
@@ -234,11 +453,17 @@ class SessionBuffer:
 
     def on_revert_async(self, view: sublime.View) -> None:
         self.pending_changes = None  # Don't bother with pending changes
+        if self.did_open_deferred:
+            return
         self.session.send_notification(did_change(view, view.change_count(), None))
 
     on_reload_async = on_revert_async
 
     def purge_changes_async(self, view: sublime.View) -> None:
+        self.last_active_time = time.time()
+        if self.open_deferred_async(view):
+            # A feature is about to send a request for this document.
+            return
         if self.pending_changes is not None:
             sync_kind = self.text_sync_kind()
             if sync_kind == TextDocumentSyncKindNone:
@@ -250,13 +475,13 @@ class SessionBuffer:
                 changes = self.pending_changes.changes
                 version = self.pending_changes.version
             try:
-                notification = did_change(view, version, changes)
+                notification = did_change(view, version, changes, self.session.position_encoding)
                 self.session.send_notification(notification)
             except MissingUriError:
                 return  # we're closing
             finally:
                 self.pending_changes = None
-            self._do_color_boxes_async(view, version)
+            self.session.do_diagnostics_after_change_async(self, view, version)
             self.session.notify_plugin_on_session_buffer_change(self)
 
     def on_pre_save_async(self, view: sublime.View) -> None:
@@ -296,18 +521,167 @@ class SessionBuffer:
 
         return handler
 
+    # --- textDocument/hover -------------------------------------------------------------------------------------------
+
+    def get_hover_async(self, view: sublime.View, point: int) -> Promise[ResolvedHover]:
+        return self._hovers.get_async(view, point)
+
     # --- textDocument/documentColor -----------------------------------------------------------------------------------
 
-    def _do_color_boxes_async(self, view: sublime.View, version: int) -> None:
-        if self.session.has_capability("colorProvider"):
+    def do_color_boxes_async(self, view: sublime.View) -> None:
+        """Request the colors of the current version of the document, unless they are known or requested already."""
+        if not self.has_capability("colorProvider"):
+            return
+        self.purge_changes_async(view)
+        if not self.opened:
+            return
+        version = view.change_count()
+        if version == self._document_colors_version:
+            self.present_color_boxes_async()
+            return
+        if version == self._pending_document_colors_version:
+            return
+        self._pending_document_colors_version = version
+        self.session.send_request_async(
+            Request.documentColor(document_color_params(view), view),
+            self._if_view_unchanged(self._on_color_boxes_async, version),
+            lambda _: self._on_color_boxes_error_async(version)
+        )
+
+    def _on_color_boxes_async(self, view: sublime.View, response: Any) -> None:
+        color_infos = response if isinstance(response, list) else []
+        ranges = [color_info["range"] for color_info in color_infos]
+        regions = ranges_to_regions(view, ranges, self.session.position_encoding)
+        colors = sorted(
+            ((region, lsp_color_to_html(color_info)) for region, color_info in zip(regions, color_infos)),
+            key=lambda color: color[0].begin()
+        )
+        self._document_colors = colors
+        self._document_color_points = [region.begin() for region, _ in colors]
+        self._document_colors_version = view.change_count()
+        self._pending_document_colors_version = None
+        self.present_color_boxes_async()
+
+    def _on_color_boxes_error_async(self, version: int) -> None:
+        # The colors of this version are requested again the next time the view is activated or changes.
+        if version == self._pending_document_colors_version:
+            self._pending_document_colors_version = None
+
+    def present_color_boxes_async(self) -> None:
+        """
+        Show the color boxes in and around the visible region of the view. Until the colors of a new version arrive,
+        the phantoms that are drawn already stay where edits have moved them.
+        """
+        view = self.color_phantoms.view
+        if not view.is_valid() or view.change_count() != self._document_colors_version:
+            return
+        visible = view.visible_region()
+        # Draw a screenful above and below the visible region as well, so that scrolling doesn't show empty spots.
+        margin = visible.size()
+        lo = bisect.bisect_left(self._document_color_points, visible.begin() - margin)
+        hi = bisect.bisect_right(self._document_color_points, visible.end() + margin)
+        self.color_phantoms.update(self._document_colors_version, self._document_colors[lo:hi])
+
+    # --- textDocument/inlayHint ---------------------------------------------------------------------------------------
+
+    def do_inlay_hints_async(self, view: sublime.View) -> None:
+        """
+        Request the inlay hints of the lines around the visible region of the view that weren't requested yet for the
+        current version of the document.
+        """
+        if not userprefs().show_inlay_hints or not self.has_capability("inlayHintProvider"):
+            return
+        self.purge_changes_async(view)
+        if not self.opened:
+            return
+        change_count = view.change_count()
+        self.inlay_hints.clear(change_count)
+        generation = self.inlay_hints.generation
+        visible = view.visible_region()
+        first_line, _ = view.rowcol(visible.begin())
+        last_line, _ = view.rowcol(visible.end())
+        # Request a screenful above and below the visible region as well, so that scrolling doesn't wait for them.
+        margin = last_line - first_line + 1
+        line_count = view.rowcol(view.size())[0] + 1
+        start_line = max(0, first_line - margin)
+        end_line = min(last_line + 1 + margin, line_count)
+        encoding = self.session.position_encoding
+        for start, end in self.inlay_hints.missing_spans(start_line, end_line):
+            self.inlay_hints.add_span(start, end)
+            end_position = {"line": end, "character": 0} if end < line_count else position(view, view.size(), encoding)
+            params = {
+                "textDocument": text_document_identifier(self.last_known_uri),
+                "range": {"start": {"line": start, "character": 0}, "end": end_position}
+            }
             self.session.send_request_async(
-                Request.documentColor(document_color_params(view), view),
-                self._if_view_unchanged(self._on_color_boxes_async, version)
+                Request.inlayHint(params, view),
+                functools.partial(self._on_inlay_hints_async, generation, change_count, encoding),
+                functools.partial(self._on_inlay_hints_error_async, generation, start, end)
             )
 
-    def _on_color_boxes_async(self, view: sublime.View, response: Any) -> None:
-        color_infos = response if response else []
-        self.color_phantoms.update([lsp_color_to_phantom(view, color_info) for color_info in color_infos])
+    def _on_inlay_hints_async(self, generation: int, change_count: int, encoding: str, response: Any) -> None:
+        view = self.some_view()
+        if not view or view.change_count() != change_count or self.inlay_hints.generation != generation:
+            return
+        if not isinstance(response, list):
+            return
+        positions = [(hint["position"]["line"], hint["position"]["character"]) for hint in response]
+        self.inlay_hints.add_hints(response, points_to_offsets(view, positions, encoding))
+        for sv in self.session_views:
+            sv.present_inlay_hints_async()
+
+    def _on_inlay_hints_error_async(self, generation: int, start_line: int, end_line: int, error: Any) -> None:
+        # The lines are requested again the next time the view scrolls or changes.
+        if self.inlay_hints.generation == generation:
+            self.inlay_hints.remove_span(start_line, end_line)
+
+    def refresh_inlay_hints_async(self) -> None:
+        self.inlay_hints.clear(-1)
+        for sv in self.session_views:
+            if is_visible(sv.view):
+                self.do_inlay_hints_async(sv.view)
+
+    # --- textDocument/diagnostic --------------------------------------------------------------------------------------
+
+    def do_document_diagnostic_async(self, view: sublime.View, version: Optional[int] = None) -> None:
+        if not self.opened or not self.has_capability("diagnosticProvider"):
+            return
+        change_count = view.change_count() if version is None else version
+        if change_count == self._pending_diagnostic_version:
+            return
+        self._pending_diagnostic_version = change_count
+        self._diagnostic_outdated = False
+        params = {"textDocument": text_document_identifier(self.last_known_uri)}  # type: Dict[str, Any]
+        identifier = self.get_capability("diagnosticProvider.identifier")
+        if identifier:
+            params["identifier"] = identifier
+        if self._diagnostic_result_id:
+            params["previousResultId"] = self._diagnostic_result_id
+        self.session.send_request_async(
+            Request("textDocument/diagnostic", params, view),
+            lambda response: self._on_document_diagnostic_async(change_count, response),
+            lambda _: self._on_document_diagnostic_async(change_count, None)
+        )
+
+    def _on_document_diagnostic_async(self, version: int, response: Any) -> None:
+        if self._pending_diagnostic_version == version:
+            self._pending_diagnostic_version = None
+        view = self.some_view()
+        if not isinstance(response, dict) or not view or view.change_count() != version:
+            return
+        self._diagnostic_result_id = response.get("resultId")
+        if response["kind"] == DocumentDiagnosticReportKind.Full:
+            self.session.handle_diagnostics_async(self.last_known_uri, response["items"], version)
+
+    def refresh_document_diagnostic_async(self) -> None:
+        """Pull the diagnostics again, right away when the document is visible, or else once it is activated."""
+        self._diagnostic_outdated = True
+        # A response to a request from before the refresh may be outdated already.
+        self._pending_diagnostic_version = None
+        for sv in self.session_views:
+            if is_visible(sv.view):
+                self.do_document_diagnostic_async(sv.view)
+                return
 
     # --- textDocument/publishDiagnostics ------------------------------------------------------------------------------
 
@@ -325,8 +699,9 @@ class SessionBuffer:
         if version == change_count:
             diagnostics_version = version
             diagnostics = []  # type: List[Tuple[Diagnostic, sublime.Region]]
-            for diagnostic in raw_diagnostics:
-                region = range_to_region(Range.from_lsp(diagnostic["range"]), view)
+            regions = ranges_to_regions(
+                view, [diagnostic["range"] for diagnostic in raw_diagnostics], self.session.position_encoding)
+            for diagnostic, region in zip(raw_diagnostics, regions):
                 severity = diagnostic_severity(diagnostic)
                 key = (severity, len(view.split_by_newlines(region)) > 1)
                 data = data_per_severity.get(key)
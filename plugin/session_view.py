@@ -1,4 +1,6 @@
 from .code_lens import CodeLensView
+from .inlay_hint import inlay_hint_to_html
+from .inlay_hint import InlayHintView
 from .core.progress import ViewProgressReporter
 from .core.promise import Promise
 from .core.protocol import CodeLens
@@ -45,6 +47,7 @@ class SessionView:
         self._listener = ref(listener)
         self.progress = {}  # type: Dict[int, ViewProgressReporter]
         self._code_lenses = CodeLensView(self._view)
+        self._inlay_hints = InlayHintView(self._view, "lsp_inlay_hints.{}".format(session.config.name))
         settings = self._view.settings()
         buffer_id = self._view.buffer_id()
         key = (id(session), buffer_id)
@@ -66,6 +69,7 @@ class SessionView:
         settings = self.view.settings()  # type: sublime.Settings
         self._clear_auto_complete_triggers(settings)
         self._code_lenses.clear_view()
+        self._inlay_hints.clear()
         if self.session.has_capability(self.HOVER_PROVIDER_KEY):
             self._decrement_hover_count()
         # If the session is exiting then there's no point in sending textDocument/didClose and there's also no point
@@ -319,7 +323,7 @@ class SessionView:
     def _on_code_lenses_async(self, response: Optional[List[CodeLens]]) -> None:
         if not self._is_listener_alive() or not isinstance(response, list):
             return
-        self._code_lenses.handle_response(self.session.config.name, response)
+        self._code_lenses.handle_response(self.session.config.name, response, self.session.position_encoding)
         self.resolve_visible_code_lenses_async()
 
     def resolve_visible_code_lenses_async(self) -> None:
@@ -332,7 +336,7 @@ class SessionView:
         if self.session.get_capability('codeLensProvider.resolveProvider'):
             for code_lens in self._code_lenses.unresolved_visible_code_lenses(self.view.visible_region()):
                 request = Request("codeLens/resolve", code_lens.data, self.view)
-                callback = functools.partial(code_lens.resolve, self.view)
+                callback = functools.partial(code_lens.resolve, self.view, self.session.position_encoding)
                 promise = self.session.send_request_task(request).then(callback)
                 promises.append(promise)
         mode = userprefs().show_code_lens
@@ -345,6 +349,18 @@ class SessionView:
     def get_resolved_code_lenses_for_region(self, region: sublime.Region) -> Generator[CodeLens, None, None]:
         yield from self._code_lenses.get_resolved_code_lenses_for_region(region)
 
+    # --- textDocument/inlayHint ---------------------------------------------------------------------------------------
+
+    def present_inlay_hints_async(self) -> None:
+        inlay_hints = self.session_buffer.inlay_hints
+        name = self.session.config.name
+        resolvable = bool(self.session.get_capability("inlayHintProvider.resolveProvider"))
+        self._inlay_hints.update(
+            inlay_hints.change_count,
+            inlay_hints.hints,
+            lambda hint: inlay_hint_to_html(self.view, hint, name, resolvable or "textEdits" in hint)
+        )
+
     def __str__(self) -> str:
         return '{}:{}'.format(self.session.config.name, self.view.id())
 
@@ -1,9 +1,11 @@
 import weakref
-from .core.protocol import Request, Range, DocumentSymbol, SymbolInformation, SymbolTag
+from .core.protocol import Request, RangeLsp, DocumentSymbol, SymbolInformation, SymbolTag
 from .core.registry import LspTextCommand
 from .core.sessions import print_to_status_bar
-from .core.typing import Any, List, Optional, Tuple, Dict, Generator, Union, cast
-from .core.views import range_to_region
+from .core.snapshot import DOCUMENT_SYMBOLS
+from .core.snapshot import Snapshot
+from .core.typing import Any, Iterator, List, Optional, Tuple, Dict, Generator, Union, cast
+from .core.views import ranges_to_regions
 from .core.views import SYMBOL_KINDS
 from .core.views import text_document_identifier
 from contextlib import contextmanager
@@ -105,19 +107,43 @@ class LspDocumentSymbolsCommand(LspTextCommand):
         session = self.best_session(self.capability)
         if session:
             params = {"textDocument": text_document_identifier(self.view)}
+            uri = params["textDocument"]["uri"]
+            encoding = session.position_encoding
+            # The snapshot has the symbols of the file on disk, not those of unsaved changes.
+            snapshot = None if self.view.is_dirty() else session.snapshot
+            symbols = snapshot.get(DOCUMENT_SYMBOLS, uri) if snapshot else None
+            if symbols:
+                # The file didn't change since, so the server would respond the same. The request still goes out to
+                # keep the snapshot up to date.
+                self.handle_response(symbols, encoding)
             session.send_request(
-                Request("textDocument/documentSymbol", params, self.view, progress=True),
-                lambda response: sublime.set_timeout(lambda: self.handle_response(response)),
+                Request("textDocument/documentSymbol", params, self.view, progress=not symbols),
+                lambda response: self._on_response_async(snapshot, uri, response, encoding, show=not symbols),
                 lambda error: sublime.set_timeout(lambda: self.handle_response_error(error)))
 
-    def handle_response(self, response: Union[List[DocumentSymbol], List[SymbolInformation], None]) -> None:
+    def _on_response_async(
+        self,
+        snapshot: Optional[Snapshot],
+        uri: str,
+        response: Union[List[DocumentSymbol], List[SymbolInformation], None],
+        encoding: str,
+        show: bool
+    ) -> None:
+        if snapshot and isinstance(response, list):
+            snapshot.put(DOCUMENT_SYMBOLS, uri, response)
+        if show:
+            sublime.set_timeout(lambda: self.handle_response(response, encoding))
+
+    def handle_response(
+        self, response: Union[List[DocumentSymbol], List[SymbolInformation], None], encoding: str
+    ) -> None:
         self.view.settings().erase(SUPPRESS_INPUT_SETTING_KEY)
         window = self.view.window()
         if window and isinstance(response, list) and len(response) > 0:
             self.old_regions = [sublime.Region(r.a, r.b) for r in self.view.sel()]
             self.is_first_selection = True
             window.show_quick_panel(
-                self.process_symbols(response),
+                self.process_symbols(response, encoding),
                 self.on_symbol_selected,
                 sublime.KEEP_OPEN_ON_FOCUS_LOST,
                 0,
@@ -160,35 +186,44 @@ class LspDocumentSymbolsCommand(LspTextCommand):
 
     def process_symbols(
             self,
-            items: Union[List[DocumentSymbol], List[SymbolInformation]]
+            items: Union[List[DocumentSymbol], List[SymbolInformation]],
+            encoding: str
     ) -> List[sublime.QuickPanelItem]:
         self.regions.clear()
         panel_items = []
         if 'selectionRange' in items[0]:
             items = cast(List[DocumentSymbol], items)
-            panel_items = self.process_document_symbols(items)
+            panel_items = self.process_document_symbols(items, encoding)
         else:
             items = cast(List[SymbolInformation], items)
-            panel_items = self.process_symbol_informations(items)
+            panel_items = self.process_symbol_informations(items, encoding)
         # Sort both lists in sync according to the range's begin point.
         sorted_results = zip(*sorted(zip(self.regions, panel_items), key=lambda item: item[0][0].begin()))
         sorted_regions, sorted_panel_items = sorted_results
         self.regions = list(sorted_regions)
         return list(sorted_panel_items)
 
-    def process_document_symbols(self, items: List[DocumentSymbol]) -> List[sublime.QuickPanelItem]:
+    def process_document_symbols(self, items: List[DocumentSymbol], encoding: str) -> List[sublime.QuickPanelItem]:
         quick_panel_items = []  # type: List[sublime.QuickPanelItem]
         names = []  # type: List[str]
+        ranges = []  # type: List[RangeLsp]
+        self.collect_document_symbol_ranges(items, ranges)
+        regions = iter(ranges_to_regions(self.view, ranges, encoding))
         for item in items:
-            self.process_document_symbol_recursive(quick_panel_items, item, names)
+            self.process_document_symbol_recursive(quick_panel_items, item, names, regions)
         return quick_panel_items
 
+    def collect_document_symbol_ranges(self, items: List[DocumentSymbol], ranges: List[RangeLsp]) -> None:
+        # In the same order as process_document_symbol_recursive visits them.
+        for item in items:
+            ranges.append(item['range'])
+            ranges.append(item['selectionRange'])
+            self.collect_document_symbol_ranges(item.get('children') or [], ranges)
+
     def process_document_symbol_recursive(self, quick_panel_items: List[sublime.QuickPanelItem], item: DocumentSymbol,
-                                          names: List[str]) -> None:
+                                          names: List[str], regions: Iterator[sublime.Region]) -> None:
         lsp_kind = item["kind"]
-        self.regions.append((range_to_region(Range.from_lsp(item['range']), self.view),
-                             range_to_region(Range.from_lsp(item['selectionRange']), self.view),
-                             get_symbol_scope_from_lsp_kind(lsp_kind)))
+        self.regions.append((next(regions), next(regions), get_symbol_scope_from_lsp_kind(lsp_kind)))
         name = item['name']
         with _additional_name(names, name):
             st_kind, st_icon, st_display_type, _ = unpack_lsp_kind(lsp_kind)
@@ -209,13 +244,15 @@ class LspDocumentSymbolsCommand(LspTextCommand):
                     kind=(st_kind, st_icon, st_display_type)))
             children = item.get('children') or []  # type: List[DocumentSymbol]
             for child in children:
-                self.process_document_symbol_recursive(quick_panel_items, child, names)
+                self.process_document_symbol_recursive(quick_panel_items, child, names, regions)
 
-    def process_symbol_informations(self, items: List[SymbolInformation]) -> List[sublime.QuickPanelItem]:
+    def process_symbol_informations(
+        self, items: List[SymbolInformation], encoding: str
+    ) -> List[sublime.QuickPanelItem]:
         quick_panel_items = []  # type: List[sublime.QuickPanelItem]
-        for item in items:
-            self.regions.append((range_to_region(Range.from_lsp(item['location']['range']), self.view),
-                                 None, get_symbol_scope_from_lsp_kind(item['kind'])))
+        regions = ranges_to_regions(self.view, [item['location']['range'] for item in items], encoding)
+        for item, region in zip(items, regions):
+            self.regions.append((region, None, get_symbol_scope_from_lsp_kind(item['kind'])))
             quick_panel_item = symbol_information_to_quick_panel_item(item, show_file_name=False)
             quick_panel_items.append(quick_panel_item)
         return quick_panel_items
@@ -18,7 +18,6 @@ from base64 import b64decode
 from base64 import b64encode
 from subprocess import list2cmdline
 import json
-import mdpopups
 import os
 import sublime
 import sublime_plugin
@@ -306,6 +305,7 @@ class LspTroubleshootServerCommand(sublime_plugin.WindowCommand, TransportCallba
         if selected_index == -1:
             return
         config = configs[selected_index]
+        import mdpopups
         output_sheet = mdpopups.new_html_sheet(
             self.window, 'Server: {}'.format(config.name), '# Running server test...',
             css=css().sheets, wrapper_class=css().sheets_classname)
@@ -323,6 +323,7 @@ class LspTroubleshootServerCommand(sublime_plugin.WindowCommand, TransportCallba
     def update_sheet(self, config: ClientConfig, active_view: Optional[sublime.View], output_sheet: sublime.HtmlSheet,
                      resolved_command: List[str], server_output: str, exit_code: int) -> None:
         self.test_runner = None
+        import mdpopups
         frontmatter = mdpopups.format_frontmatter({'allow_code_wrap': True})
         contents = self.get_contents(config, active_view, resolved_command, server_output, exit_code)
         # The href needs to be encoded to avoid having markdown parser ruin it.
@@ -464,6 +465,8 @@ class LspDumpBufferCapabilities(sublime_plugin.TextCommand):
             p(print_capabilities(sv.session.capabilities) + "\n")
             p("## View-specific capabilities\n")
             p(print_capabilities(cast(SessionBuffer, sv.session_buffer).capabilities) + "\n")
+            p("## Request queues\n")
+            p("```json\n{}\n```\n".format(json.dumps(sv.session.request_scheduler.metrics(), indent=4)))
 
 
 class ServerTestRunner(TransportCallbacks):
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reports how long importing the plugin takes, per module, using the "-X importtime" option of the interpreter. The
+Sublime Text API is taken from the stubs of this repository, so this runs outside of Sublime Text. Use the Python
+version of the plugin host for comparable numbers.
+
+    python3.8 scripts/import_times.py --budget-ms 150
+"""
+
+from typing import List, Tuple
+import argparse
+import os
+import subprocess
+import sys
+
+PACKAGE_PATH = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+STUBS_PATH = os.path.join(PACKAGE_PATH, 'stubs')
+
+# Modules that must not be imported when the plugin loads; they are imported on first use.
+LAZY_MODULES = ('mdpopups', 'wcmatch', 'webbrowser', 'LSP.third_party.websocket_server')
+
+# Loads the stubs of the API as the "sublime" and "sublime_plugin" modules, makes this repository the "LSP" package, and
+# imports the plugin the way the plugin host does.
+BOOTSTRAP = """
+import __future__, sys, types
+for name in ("sublime", "sublime_plugin"):
+    module = types.ModuleType(name)
+    sys.modules[name] = module
+    with open({stubs!r} + "/" + name + ".pyi", encoding="utf-8") as f:
+        source = f.read()
+    flags = __future__.annotations.compiler_flag
+    exec(compile(source, name + ".pyi", "exec", flags=flags, dont_inherit=True), module.__dict__)
+    # The stubs leave the values of constants out.
+    for index, key in enumerate(sorted(k for k, v in vars(module).items() if v is Ellipsis)):
+        setattr(module, key, 1 << index)
+package = types.ModuleType("LSP")
+package.__path__ = [{package!r}]
+sys.modules["LSP"] = package
+import LSP.boot
+"""
+
+ImportTime = Tuple[str, int, int]
+
+
+def measure() -> List[ImportTime]:
+    """Returns the module name, self time and cumulative time in microseconds of every import."""
+    code = BOOTSTRAP.format(stubs=STUBS_PATH, package=PACKAGE_PATH)
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, cwd=PACKAGE_PATH)
+    if process.returncode != 0:
+        sys.exit('importing the plugin failed:\n{}'.format(process.stderr))
+    result = []  # type: List[ImportTime]
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        result.append((name.strip(), int(self_us), int(cumulative_us)))
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Report the import time of the plugin per module.')
+    parser.add_argument('--top', type=int, default=30, help='the number of slowest modules to list')
+    parser.add_argument('--all', action='store_true', help='list modules outside of this package as well')
+    parser.add_argument('--budget-ms', type=float, help='fail when importing the plugin takes longer than this')
+    args = parser.parse_args()
+    times = measure()
+    total_us = next((cumulative for name, _, cumulative in times if name == 'LSP.boot'), 0)
+    listed = times if args.all else [t for t in times if t[0] == 'LSP' or t[0].startswith('LSP.')]
+    listed.sort(key=lambda t: t[1], reverse=True)
+    print('{:>10} {:>10}  {}'.format('self [ms]', 'cumul [ms]', 'module'))
+    for name, self_us, cumulative_us in listed[:args.top]:
+        print('{:>10.1f} {:>10.1f}  {}'.format(self_us / 1000, cumulative_us / 1000, name))
+    print('\nimporting the plugin took {:.1f} ms'.format(total_us / 1000))
+    failed = False
+    imported = set(t[0] for t in times)
+    for name in LAZY_MODULES:
+        if name in imported:
+            print('{} was imported, but should be imported on first use'.format(name))
+            failed = True
+    if args.budget_ms is not None and total_us / 1000 > args.budget_ms:
+        print('that is more than the budget of {:.1f} ms'.format(args.budget_ms))
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
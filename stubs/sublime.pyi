@@ -907,11 +907,22 @@ class View:
     def erase_regions(self, key: str) -> None:
         ...
 
-    # def add_phantom(self, key: str, region: Region, content: str, layout, on_navigate: Optional[Any] = ...): ...
-    # def erase_phantoms(self, key: str) -> None: ...
-    # def erase_phantom_by_id(self, pid) -> None: ...
-    # def query_phantom(self, pid): ...
-    # def query_phantoms(self, pids): ...
+    def add_phantom(self, key: str, region: Region, content: str, layout: int,
+                    on_navigate: Optional[Callable[[str], None]] = ...) -> int:
+        ...
+
+    def erase_phantoms(self, key: str) -> None:
+        ...
+
+    def erase_phantom_by_id(self, pid: int) -> None:
+        ...
+
+    def query_phantom(self, pid: int) -> List[Region]:
+        ...
+
+    def query_phantoms(self, pids: List[int]) -> List[Region]:
+        ...
+
     def assign_syntax(self, syntax_file: str) -> None:
         ...
 
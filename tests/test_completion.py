@@ -1,4 +1,9 @@
 from copy import deepcopy
+from LSP.plugin.completion import completion_store
+from LSP.plugin.completion import CompletionStore
+from LSP.plugin.completion import extend_text_edit
+from LSP.plugin.completion import rank_completion_items
+from LSP.plugin.completion import ResolvePrefetcher
 from LSP.plugin.core.protocol import CompletionItem
 from LSP.plugin.core.protocol import CompletionItemLabelDetails
 from LSP.plugin.core.protocol import CompletionItemTag
@@ -6,6 +11,8 @@ from LSP.plugin.core.protocol import InsertTextFormat
 from LSP.plugin.core.typing import Any, Generator, List, Dict, Callable, Optional
 from LSP.plugin.core.views import format_completion
 from setup import TextDocumentTestCase
+from unittest import TestCase
+from unittest.mock import MagicMock
 import sublime
 
 
@@ -611,7 +618,7 @@ class QueryCompletionsTests(CompletionsTestsBase):
             "kind": 2,  # Method
             "deprecated": True
         }  # type: CompletionItem
-        formatted_completion_item = format_completion(item_with_deprecated_flag, 0, False, "")
+        formatted_completion_item = format_completion(item_with_deprecated_flag, 0, False, 0)
         self.assertEqual('⚠', formatted_completion_item.kind[1])
         self.assertEqual('⚠ Method - Deprecated', formatted_completion_item.kind[2])
 
@@ -621,7 +628,7 @@ class QueryCompletionsTests(CompletionsTestsBase):
             "kind": 2,  # Method
             "tags": [CompletionItemTag.Deprecated]
         }  # type: CompletionItem
-        formatted_completion_item = format_completion(item_with_deprecated_tags, 0, False, "")
+        formatted_completion_item = format_completion(item_with_deprecated_tags, 0, False, 0)
         self.assertEqual('⚠', formatted_completion_item.kind[1])
         self.assertEqual('⚠ Method - Deprecated', formatted_completion_item.kind[2])
 
@@ -657,7 +664,7 @@ class QueryCompletionsTests(CompletionsTestsBase):
             lsp = {"label": label, "filterText": "force_label_to_go_into_st_detail_field"}  # type: CompletionItem
             if label_details is not None:
                 lsp["labelDetails"] = label_details
-            native = format_completion(lsp, 0, resolve_support, "")
+            native = format_completion(lsp, 0, resolve_support, 0)
             self.assertRegex(native.details, expected_regex)
 
         check(
@@ -708,7 +715,7 @@ class QueryCompletionsTests(CompletionsTestsBase):
             lsp = {"label": label}  # type: CompletionItem
             if label_details is not None:
                 lsp["labelDetails"] = label_details
-            native = format_completion(lsp, 0, resolve_support, "")
+            native = format_completion(lsp, 0, resolve_support, 0)
             self.assertRegex(native.details, expected_regex)
 
         check(
@@ -784,3 +791,118 @@ class QueryCompletionsNoResolverTests(CompletionsTestsBase):
             completion_items=[completion_item],
             insert_text='',
             expected_text='import ghjk;\nghjk')
+
+
+class CompletionStoreTests(TestCase):
+
+    def test_items_are_looked_up_by_store_id_and_index(self) -> None:
+        store = CompletionStore()
+        store_id = store.begin()
+        self.assertEqual(store.extend(store_id, "foo", [{"label": "a"}, {"label": "b"}]), 0)
+        self.assertEqual(store.extend(store_id, "bar", [{"label": "c"}]), 2)
+        self.assertEqual(store.get(store_id, 1), ("foo", {"label": "b"}))
+        self.assertEqual(store.get(store_id, 2), ("bar", {"label": "c"}))
+        self.assertIsNone(store.get(store_id, 3))
+
+    def test_new_lists_evict_old_lists(self) -> None:
+        store = CompletionStore()
+        first = store.begin()
+        store.extend(first, "foo", [{"label": "a"}])
+        second = store.begin()
+        store.extend(second, "foo", [{"label": "b"}])
+        # The previous list survives, because its popup may still be visible.
+        self.assertEqual(store.get(first, 0), ("foo", {"label": "a"}))
+        third = store.begin()
+        self.assertIsNone(store.get(first, 0))
+        self.assertEqual(store.get(second, 0), ("foo", {"label": "b"}))
+        self.assertEqual(len({first, second, third}), 3)
+
+
+class CompletionFilteringTests(TestCase):
+
+    def test_rank_completion_items(self) -> None:
+        items = [
+            {"label": "getFoo"},
+            {"label": "Foo"},
+            {"label": "xfoo", "filterText": "fooBar"},
+            {"label": "bar"},
+            {"label": "foo"},
+        ]  # type: List[CompletionItem]
+        self.assertEqual(rank_completion_items(items, "foo"), [2, 4, 1, 0])
+        self.assertEqual(rank_completion_items(items, ""), [0, 1, 2, 3, 4])
+        self.assertEqual(rank_completion_items(items, "qux"), [])
+
+    def test_extend_text_edit(self) -> None:
+        position = {"line": 1, "character": 4}
+        item = {
+            "label": "foobar",
+            "textEdit": {
+                "newText": "foobar",
+                "range": {"start": {"line": 1, "character": 2}, "end": {"line": 1, "character": 4}}
+            }
+        }  # type: CompletionItem
+        extended = extend_text_edit(item, position, "ob")
+        self.assertEqual(extended["textEdit"]["range"]["end"], {"line": 1, "character": 6})
+        self.assertEqual(extended["textEdit"]["range"]["start"], {"line": 1, "character": 2})
+        # The cached item itself is left alone.
+        self.assertEqual(item["textEdit"]["range"]["end"], position)
+        # Edits that do not end at the requested position are not touched.
+        self.assertIs(extend_text_edit(item, {"line": 1, "character": 3}, "ob"), item)
+
+
+class ResolvePrefetcherTests(TestCase):
+
+    def setUp(self) -> None:
+        self.callbacks = []  # type: List[Callable[[Any], None]]
+        self.session = MagicMock()
+        self.session.send_request_async.side_effect = lambda request, on_result, on_error: \
+            self.callbacks.append(on_result)
+        self.store_id = completion_store.begin()
+        completion_store.extend(self.store_id, "foo", [{"label": str(i)} for i in range(10)])
+
+    def test_prefetch_is_bounded_and_stores_resolved_items(self) -> None:
+        prefetcher = ResolvePrefetcher()
+        prefetcher.start_async(MagicMock(), {"foo": self.session}, self.store_id, range(6))
+        self.assertEqual(len(self.callbacks), ResolvePrefetcher.MAX_CONCURRENT)
+        self.callbacks[0]({"label": "0", "additionalTextEdits": []})
+        self.assertTrue(completion_store.is_resolved(self.store_id, 0))
+        self.assertEqual(completion_store.get(self.store_id, 0), ("foo", {"label": "0", "additionalTextEdits": []}))
+        self.assertEqual(len(self.callbacks), ResolvePrefetcher.MAX_CONCURRENT + 1)
+        # Errors are not stored.
+        self.callbacks[1]({"code": -32603, "message": "oops"})
+        self.assertFalse(completion_store.is_resolved(self.store_id, 1))
+        self.assertEqual(len(self.callbacks), 6)
+
+    def test_cancel(self) -> None:
+        prefetcher = ResolvePrefetcher()
+        prefetcher.start_async(MagicMock(), {"foo": self.session}, self.store_id, range(6))
+        prefetcher.cancel_async()
+        for callback in list(self.callbacks):
+            callback({"label": "x"})
+        self.assertEqual(len(self.callbacks), ResolvePrefetcher.MAX_CONCURRENT)
+
+    def test_new_list_while_requests_are_in_flight(self) -> None:
+        prefetcher = ResolvePrefetcher()
+        prefetcher.start_async(MagicMock(), {"foo": self.session}, self.store_id, range(4))
+        old_callbacks = list(self.callbacks)
+        store_id = completion_store.begin()
+        completion_store.extend(store_id, "foo", [{"label": str(i)} for i in range(10)])
+        prefetcher.start_async(MagicMock(), {"foo": self.session}, store_id, range(4))
+        self.assertEqual(len(self.callbacks), ResolvePrefetcher.MAX_CONCURRENT)
+        for callback in old_callbacks:
+            callback({"label": "old"})
+        # The slots of the previous list go to the current list.
+        self.assertEqual(len(self.callbacks), 2 * ResolvePrefetcher.MAX_CONCURRENT)
+
+    def test_filter_again_while_requests_are_in_flight(self) -> None:
+        prefetcher = ResolvePrefetcher()
+        prefetcher.start_async(MagicMock(), {"foo": self.session}, self.store_id, range(3))
+        self.assertEqual(len(self.callbacks), 3)
+        # Typing another character filters the same list again.
+        prefetcher.start_async(MagicMock(), {"foo": self.session}, self.store_id, [2, 1, 5])
+        self.assertEqual(len(self.callbacks), 4)
+        for i, callback in enumerate(self.callbacks[:3]):
+            callback({"label": str(i), "detail": "resolved"})
+        for i in range(3):
+            self.assertTrue(completion_store.is_resolved(self.store_id, i))
+        self.assertEqual(len(self.callbacks), 4)
@@ -1,5 +1,6 @@
 from LSP.plugin.core.configurations import ConfigManager
 from LSP.plugin.core.configurations import WindowConfigManager
+from LSP.plugin.core.types import ClientConfig
 from test_mocks import DISABLED_CONFIG
 from test_mocks import TEST_CONFIG
 from unittest.mock import MagicMock
@@ -96,3 +97,22 @@ class WindowConfigManagerTests(unittest.TestCase):
         # disables config in-memory
         manager.disable_config(DISABLED_CONFIG.name, only_for_session=True)
         self.assertFalse(any(manager.match_view(view)))
+
+    def test_only_rechecks_changed_configs(self):
+        foo = ClientConfig("foo", command=[], selector="text.plain")
+        bar = ClientConfig("bar", command=[], selector="text.plain", enabled=False)
+        window = MagicMock()
+        window.project_data.return_value = None
+        manager = WindowConfigManager(window, {foo.name: foo, bar.name: bar})
+        window.run_command.assert_called_once_with("lsp_recheck_sessions", {"config_names": ["bar", "foo"]})
+        config = manager.all[foo.name]
+        window.run_command.reset_mock()
+        manager.update()
+        # Nothing changed, so the configs are reused and no sessions are re-checked.
+        self.assertIs(manager.all[foo.name], config)
+        window.run_command.assert_not_called()
+        window.project_data.return_value = {"settings": {"LSP": {bar.name: {"enabled": True}}}}
+        manager.update()
+        self.assertIs(manager.all[foo.name], config)
+        self.assertTrue(manager.all[bar.name].enabled)
+        window.run_command.assert_called_once_with("lsp_recheck_sessions", {"config_names": ["bar"]})
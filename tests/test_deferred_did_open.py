@@ -0,0 +1,57 @@
+from LSP.plugin.core.typing import Any, Callable, List
+from LSP.plugin.session_buffer import DeferredDidOpens
+from unittest import TestCase
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+
+class DeferredDidOpensTests(TestCase):
+
+    def setUp(self) -> None:
+        self.timeouts = []  # type: List[Callable[[], None]]
+        prefs = MagicMock()
+        prefs.deferred_did_open_interval_ms = 100
+        patchers = [
+            patch("LSP.plugin.session_buffer.userprefs", return_value=prefs),
+            patch("sublime.set_timeout_async", side_effect=lambda f, timeout_ms=0: self.timeouts.append(f)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.prefs = prefs
+        self.queue = DeferredDidOpens()
+
+    def _session_buffer(self, opens: bool) -> Any:
+        session_buffer = MagicMock()
+        session_buffer.open_deferred_async.return_value = opens
+        return session_buffer
+
+    def test_opens_one_document_per_interval(self) -> None:
+        first = self._session_buffer(True)
+        second = self._session_buffer(True)
+        self.queue.add_async(first)
+        self.queue.add_async(second)
+        self.assertEqual(len(self.timeouts), 1)
+        self.timeouts.pop()()
+        first.open_deferred_async.assert_called_once_with()
+        second.open_deferred_async.assert_not_called()
+        self.assertEqual(len(self.timeouts), 1)
+        self.timeouts.pop()()
+        second.open_deferred_async.assert_called_once_with()
+        self.assertEqual(self.timeouts, [])
+
+    def test_skips_documents_that_were_opened_in_the_meantime(self) -> None:
+        activated = self._session_buffer(False)
+        pending = self._session_buffer(True)
+        self.queue.add_async(activated)
+        self.queue.add_async(pending)
+        self.timeouts.pop()()
+        activated.open_deferred_async.assert_called_once_with()
+        pending.open_deferred_async.assert_called_once_with()
+
+    def test_disabled_trickle(self) -> None:
+        self.prefs.deferred_did_open_interval_ms = 0
+        session_buffer = self._session_buffer(True)
+        self.queue.add_async(session_buffer)
+        self.assertEqual(self.timeouts, [])
+        session_buffer.open_deferred_async.assert_not_called()
@@ -0,0 +1,88 @@
+from LSP.plugin.core.protocol import Diagnostic
+from LSP.plugin.core.types import Capabilities
+from LSP.plugin.core.typing import Any, List, Tuple
+from LSP.plugin.session_buffer import SessionBuffer
+from unittest import TestCase
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+
+def diagnostic(message: str) -> Diagnostic:
+    return {
+        "range": {"start": {"line": 0, "character": 0}, "end": {"line": 0, "character": 1}},
+        "message": message
+    }
+
+
+class DocumentDiagnosticTests(TestCase):
+
+    def setUp(self) -> None:
+        prefs = MagicMock(defer_did_open=True, close_idle_documents_after_minutes=0)
+        for target, kwargs in (
+            ("LSP.plugin.session_buffer.userprefs", {"return_value": prefs}),
+            ("LSP.plugin.session_buffer.is_visible", {"side_effect": lambda view: view.visible}),
+            ("LSP.plugin.session_buffer.deferred_did_opens", {}),
+        ):
+            patcher = patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.requests = []  # type: List[Tuple[Any, Any]]
+        self.session = MagicMock()
+        # The buffer doesn't send textDocument/didClose when it is garbage collected.
+        self.session.exiting = True
+        self.session.config.is_disabled_capability.return_value = False
+        self.session.capabilities = Capabilities()
+        self.session.capabilities.assign({"diagnosticProvider": {"interFileDependencies": False}})
+        self.session.send_request_async.side_effect = lambda request, on_result, on_error: \
+            self.requests.append((request, on_result))
+        self.view = MagicMock()
+        self.view.visible = False
+        self.view.change_count.return_value = 1
+        self.session_view = MagicMock()
+        self.session_view.view = self.view
+        self.session_view.session = self.session
+        self.sb = SessionBuffer(self.session_view, 1, "file:///a.py")
+        self.sb.did_open_deferred = False
+        self.sb.opened = True
+
+    def test_result_ids_and_report_kinds(self) -> None:
+        self.sb.do_document_diagnostic_async(self.view)
+        request, on_result = self.requests.pop()
+        self.assertNotIn("previousResultId", request.params)
+        on_result({"kind": "full", "resultId": "1", "items": [diagnostic("a")]})
+        self.session.handle_diagnostics_async.assert_called_once_with("file:///a.py", [diagnostic("a")], 1)
+        self.view.change_count.return_value = 2
+        self.sb.do_document_diagnostic_async(self.view)
+        request, on_result = self.requests.pop()
+        self.assertEqual(request.params["previousResultId"], "1")
+        # The diagnostics are still the ones that were reported before.
+        on_result({"kind": "unchanged", "resultId": "2"})
+        self.session.handle_diagnostics_async.assert_called_once()
+        self.sb.do_document_diagnostic_async(self.view, 2)
+        self.assertEqual(self.requests[-1][0].params["previousResultId"], "2")
+
+    def test_response_for_an_outdated_change_count_is_dropped(self) -> None:
+        self.sb.do_document_diagnostic_async(self.view)
+        _, on_result = self.requests.pop()
+        self.view.change_count.return_value = 2
+        on_result({"kind": "full", "resultId": "1", "items": [diagnostic("a")]})
+        self.session.handle_diagnostics_async.assert_not_called()
+        self.sb.do_document_diagnostic_async(self.view)
+        request, _ = self.requests.pop()
+        self.assertNotIn("previousResultId", request.params)
+
+    def test_refresh_pulls_hidden_documents_once_they_are_activated(self) -> None:
+        self.sb.refresh_document_diagnostic_async()
+        self.assertEqual(self.requests, [])
+        self.sb.on_activated_async(self.view)
+        self.assertEqual(len(self.requests), 1)
+        self.requests.pop()[1]({"kind": "unchanged", "resultId": "1"})
+        self.sb.on_activated_async(self.view)
+        self.assertEqual(self.requests, [])
+
+    def test_refresh_pulls_visible_documents_right_away(self) -> None:
+        self.sb.do_document_diagnostic_async(self.view)
+        self.view.visible = True
+        # The request in flight was made before the refresh.
+        self.sb.refresh_document_diagnostic_async()
+        self.assertEqual(len(self.requests), 2)
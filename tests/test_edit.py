@@ -1,8 +1,12 @@
+from LSP.plugin.core.edit import apply_text_edits
+from LSP.plugin.core.edit import apply_text_edits_to_file
 from LSP.plugin.core.edit import sort_by_application_order, parse_workspace_edit, parse_text_edit
 from LSP.plugin.core.url import filename_to_uri
 from LSP.plugin.edit import temporary_setting
 from test_protocol import LSP_RANGE
+import os
 import sublime
+import tempfile
 import unittest
 
 TYPE_CHECKING = False
@@ -232,6 +236,45 @@ class SortByApplicationOrderTests(unittest.TestCase):
         self.assertEqual(sorted_edits[1][1], (27, 32))
 
 
+class ApplyTextEditsTests(unittest.TestCase):
+
+    def test_replace_with_utf16_columns(self) -> None:
+        # The emoji takes up two UTF-16 code units.
+        text = "ab\U0001F600cd\n"
+        self.assertEqual(apply_text_edits(text, [((0, 4), (0, 5), "Q", None)]), "ab\U0001F600Qd\n")
+
+    def test_replace_with_utf8_and_utf32_columns(self) -> None:
+        # The emoji takes up four UTF-8 bytes, and one UTF-32 code point.
+        text = "ab\U0001F600cd\n"
+        self.assertEqual(apply_text_edits(text, [((0, 6), (0, 7), "Q", None)], "utf-8"), "ab\U0001F600Qd\n")
+        self.assertEqual(apply_text_edits(text, [((0, 3), (0, 4), "Q", None)], "utf-32"), "ab\U0001F600Qd\n")
+
+    def test_inserts_at_same_position_keep_their_order(self) -> None:
+        edits = [((0, 0), (0, 0), "a", None), ((0, 0), (0, 0), "b", None)]
+        self.assertEqual(apply_text_edits("c", edits), "abc")
+
+    def test_columns_are_clamped(self) -> None:
+        self.assertEqual(apply_text_edits("xyz\nfoo", [((0, 1), (0, 99), "", None)]), "x\nfoo")
+
+    def test_preserves_line_endings(self) -> None:
+        edits = [((1, 0), (1, 0), "1\n2", None)]
+        self.assertEqual(apply_text_edits("a\r\nb\r\n", edits), "a\r\n1\r\n2b\r\n")
+
+    def test_insert_beyond_last_line(self) -> None:
+        self.assertEqual(apply_text_edits("a", [((5, 0), (5, 0), "b", None)]), "a\nb")
+
+    def test_apply_to_file(self) -> None:
+        fd, file_path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                fp.write(b"\xef\xbb\xbfhello world\n")
+            apply_text_edits_to_file(file_path, [((0, 6), (0, 11), "there", None)])
+            with open(file_path, "rb") as fp:
+                self.assertEqual(fp.read(), b"\xef\xbb\xbfhello there\n")
+        finally:
+            os.unlink(file_path)
+
+
 class TemporarySetting(unittest.TestCase):
 
     def test_basics(self) -> None:
@@ -0,0 +1,75 @@
+from LSP.plugin.core.promise import PackagedTask
+from LSP.plugin.core.promise import Promise
+from LSP.plugin.core.typing import Any, List
+from LSP.plugin.session_buffer import HoverCache
+from unittest import TestCase
+from unittest.mock import MagicMock
+import sublime
+
+
+class HoverCacheTests(TestCase):
+
+    def setUp(self) -> None:
+        self.tasks = []  # type: List[PackagedTask[Any]]
+        self.session = MagicMock()
+        self.session.send_request_task.side_effect = self._send_request_task
+        self.session.position_encoding = "utf-16"
+        self.view = MagicMock()
+        self.view.change_count.return_value = 1
+        self.view.settings.return_value = {"lsp_uri": "file:///a.py"}
+        # Every word is five characters long.
+        self.view.word.side_effect = lambda point: sublime.Region(point - point % 5, point - point % 5 + 5)
+        self.view.text_point_utf16.side_effect = lambda row, col, clamp_column=False: row * 100 + col
+        self.view.rowcol_utf16.side_effect = lambda point: (point // 100, point % 100)
+        self.hovers = HoverCache(self.session)
+
+    def _send_request_task(self, request: Any) -> Promise:
+        task = Promise.packaged_task()  # type: PackagedTask[Any]
+        self.tasks.append(task)
+        return task[0]
+
+    def test_pending_requests_are_shared(self) -> None:
+        first = self.hovers.get_async(self.view, 1)
+        second = self.hovers.get_async(self.view, 3)
+        self.assertEqual(len(self.tasks), 1)
+        self.tasks[0][1]({"contents": "foo"})
+        self.assertEqual(first.value, {"contents": "foo"})
+        self.assertEqual(second.value, {"contents": "foo"})
+
+    def test_response_is_cached_for_its_range(self) -> None:
+        self.hovers.get_async(self.view, 12)
+        hover_range = {"start": {"line": 0, "character": 10}, "end": {"line": 0, "character": 20}}
+        self.tasks[0][1]({"contents": "foo", "range": hover_range})
+        # The range is wider than the word, so a hover in the next word is served from the cache as well.
+        self.assertEqual(self.hovers.get_async(self.view, 17).value["contents"], "foo")
+        self.assertEqual(len(self.tasks), 1)
+        self.hovers.get_async(self.view, 22)
+        self.assertEqual(len(self.tasks), 2)
+
+    def test_text_change_invalidates_cache(self) -> None:
+        self.hovers.get_async(self.view, 1)
+        self.tasks[0][1]({"contents": "foo"})
+        self.assertEqual(self.hovers.get_async(self.view, 2).value, {"contents": "foo"})
+        self.assertEqual(len(self.tasks), 1)
+        self.view.change_count.return_value = 2
+        self.hovers.get_async(self.view, 2)
+        self.assertEqual(len(self.tasks), 2)
+
+    def test_stale_response_is_not_cached(self) -> None:
+        promise = self.hovers.get_async(self.view, 1)
+        self.view.change_count.return_value = 2
+        self.tasks[0][1]({"contents": "foo"})
+        self.assertEqual(promise.value, {"contents": "foo"})
+        self.hovers.get_async(self.view, 1)
+        self.assertEqual(len(self.tasks), 2)
+
+    def test_empty_response_is_not_cached(self) -> None:
+        promise = self.hovers.get_async(self.view, 1)
+        self.tasks[0][1](None)
+        self.assertIsNone(promise.value)
+        # The server may still be indexing, so hovering the word again asks again.
+        self.hovers.get_async(self.view, 2)
+        self.assertEqual(len(self.tasks), 2)
+        self.tasks[1][1]({"contents": []})
+        self.hovers.get_async(self.view, 2)
+        self.assertEqual(len(self.tasks), 3)
@@ -0,0 +1,96 @@
+from LSP.plugin.core.protocol import InlayHint
+from LSP.plugin.core.typing import Any, Dict, List, Tuple
+from LSP.plugin.inlay_hint import inlay_hint_key
+from LSP.plugin.inlay_hint import InlayHintCache
+from LSP.plugin.inlay_hint import InlayHintView
+from unittest import TestCase
+from unittest.mock import MagicMock
+import sublime
+
+
+def hint(line: int, character: int, label: str) -> InlayHint:
+    return {"position": {"line": line, "character": character}, "label": label}
+
+
+class InlayHintCacheTests(TestCase):
+
+    def test_missing_spans(self) -> None:
+        cache = InlayHintCache()
+        cache.clear(1)
+        self.assertEqual(cache.missing_spans(0, 100), [(0, 100)])
+        cache.add_span(0, 100)
+        self.assertEqual(cache.missing_spans(50, 150), [(100, 150)])
+        cache.add_span(200, 300)
+        self.assertEqual(cache.missing_spans(50, 350), [(100, 200), (300, 350)])
+        cache.add_span(100, 200)
+        self.assertEqual(cache.missing_spans(0, 300), [])
+
+    def test_clear_on_change(self) -> None:
+        cache = InlayHintCache()
+        cache.clear(1)
+        cache.add_span(0, 10)
+        cache.add_hints([hint(1, 2, ": int")], [12])
+        cache.clear(1)
+        self.assertEqual(cache.missing_spans(0, 10), [])
+        self.assertEqual(len(cache.hints), 1)
+        cache.clear(2)
+        self.assertEqual(cache.missing_spans(0, 10), [(0, 10)])
+        self.assertEqual(cache.hints, {})
+
+    def test_remove_span(self) -> None:
+        cache = InlayHintCache()
+        cache.clear(1)
+        cache.add_span(0, 100)
+        cache.remove_span(20, 40)
+        self.assertEqual(cache.missing_spans(0, 100), [(20, 40)])
+        cache.remove_span(90, 120)
+        self.assertEqual(cache.missing_spans(0, 100), [(20, 40), (90, 100)])
+
+    def test_generation(self) -> None:
+        cache = InlayHintCache()
+        cache.clear(1)
+        generation = cache.generation
+        cache.clear(1)
+        self.assertEqual(cache.generation, generation)
+        # A refresh clears the cache without an edit.
+        cache.clear(-1)
+        cache.clear(1)
+        self.assertGreater(cache.generation, generation)
+
+    def test_label_parts(self) -> None:
+        parts = {"position": {"line": 0, "character": 1}, "label": [{"value": ": "}, {"value": "int"}]}  # type: Any
+        self.assertEqual(inlay_hint_key(parts), inlay_hint_key(hint(0, 1, ": int")))
+
+
+class InlayHintViewTests(TestCase):
+
+    def setUp(self) -> None:
+        self.view = MagicMock()
+        self.phantom_ids = iter(range(1, 100))
+        self.view.add_phantom.side_effect = lambda *args: next(self.phantom_ids)
+        self.inlay_hints = InlayHintView(self.view, "lsp_inlay_hints")
+
+    def _update(self, change_count: int, hints: List[Tuple[InlayHint, int]]) -> None:
+        by_key = {inlay_hint_key(h): (h, point) for h, point in hints}  # type: Dict[Any, Tuple[InlayHint, int]]
+        self.inlay_hints.update(change_count, by_key, lambda h: str(h["label"]))
+
+    def test_only_adds_new_phantoms(self) -> None:
+        first = hint(0, 1, ": int")
+        self._update(1, [(first, 1)])
+        self.view.add_phantom.assert_called_once_with(
+            "lsp_inlay_hints", sublime.Region(1), ": int", sublime.LAYOUT_INLINE)
+        self.view.add_phantom.reset_mock()
+        self._update(1, [(first, 1), (hint(50, 3, ": str"), 503)])
+        self.view.add_phantom.assert_called_once_with(
+            "lsp_inlay_hints", sublime.Region(503), ": str", sublime.LAYOUT_INLINE)
+        self.view.erase_phantom_by_id.assert_not_called()
+
+    def test_keeps_moved_phantoms_after_edit(self) -> None:
+        self._update(1, [(hint(0, 1, ": int"), 1), (hint(1, 1, ": str"), 10)])
+        self.view.add_phantom.reset_mock()
+        # A character was inserted at the start of the document, and the hint on the second line is gone.
+        moved = {1: sublime.Region(2), 2: sublime.Region(11)}
+        self.view.query_phantoms.side_effect = lambda ids: [moved[pid] for pid in ids]
+        self._update(2, [(hint(0, 2, ": int"), 2)])
+        self.view.add_phantom.assert_not_called()
+        self.view.erase_phantom_by_id.assert_called_once_with(2)
@@ -0,0 +1,24 @@
+from LSP.plugin.core.open import file_key
+import os
+import tempfile
+import unittest
+
+
+class FileKeyTests(unittest.TestCase):
+
+    def test_same_file_same_key(self) -> None:
+        directory = tempfile.mkdtemp()
+        try:
+            file_path = os.path.join(directory, "foo.txt")
+            with open(file_path, "w"):
+                pass
+            other_path = os.path.join(directory, "..", os.path.basename(directory), "foo.txt")
+            self.assertEqual(file_key(file_path), file_key(other_path))
+            os.unlink(file_path)
+        finally:
+            os.rmdir(directory)
+
+    def test_missing_file(self) -> None:
+        key = file_key(os.path.join("some", "file", "that", "does", "not", "exist"))
+        self.assertIsInstance(key, str)
+        self.assertTrue(os.path.isabs(key))
@@ -0,0 +1,92 @@
+from LSP.plugin.core.promise import PackagedTask
+from LSP.plugin.core.promise import Promise
+from LSP.plugin.core.promise import ThreadSafePromise
+from LSP.plugin.core.typing import Any, List
+from unittest import TestCase
+import gc
+import threading
+import time
+
+
+class PromiseTests(TestCase):
+
+    def test_then_after_resolve(self) -> None:
+        values = []  # type: List[int]
+        Promise.resolve(1).then(lambda x: x + 1).then(values.append)
+        self.assertEqual(values, [2])
+
+    def test_then_before_resolve(self) -> None:
+        values = []  # type: List[int]
+        promise, resolve = Promise.packaged_task()  # type: PackagedTask[int]
+        promise.then(lambda x: x * 2).then(values.append)
+        promise.then(values.append)
+        self.assertEqual(values, [])
+        resolve(21)
+        self.assertEqual(values, [42, 21])
+        self.assertTrue(promise.resolved)
+        self.assertEqual(promise.value, 21)
+
+    def test_continuation_returning_promise(self) -> None:
+        values = []  # type: List[str]
+        inner, resolve_inner = Promise.packaged_task()  # type: PackagedTask[str]
+        Promise.resolve(None).then(lambda _: inner).then(values.append)
+        self.assertEqual(values, [])
+        resolve_inner("done")
+        self.assertEqual(values, ["done"])
+
+    def test_resolve_twice(self) -> None:
+        promise, resolve = Promise.packaged_task()  # type: PackagedTask[None]
+        resolve(None)
+        self.assertRaises(RuntimeError, resolve, None)
+
+    def test_all(self) -> None:
+        tasks = [Promise.packaged_task() for _ in range(3)]  # type: List[PackagedTask[int]]
+        values = []  # type: List[List[int]]
+        Promise.all([promise for promise, _ in tasks]).then(values.append)
+        tasks[2][1](3)
+        tasks[0][1](1)
+        self.assertEqual(values, [])
+        tasks[1][1](2)
+        self.assertEqual(values, [[1, 2, 3]])
+
+    def test_all_empty(self) -> None:
+        values = []  # type: List[List[Any]]
+        Promise.all([]).then(values.append)
+        self.assertEqual(values, [[]])
+
+    def test_thread_safe_promise(self) -> None:
+        values = []  # type: List[int]
+        promise, resolve = ThreadSafePromise.packaged_task()  # type: PackagedTask[int]
+        child = promise.then(lambda x: x + 1)
+        self.assertIsInstance(child, ThreadSafePromise)
+        thread = threading.Thread(target=lambda: resolve(1))
+        thread.start()
+        thread.join()
+        child.then(values.append)
+        self.assertEqual(values, [2])
+
+
+def _settle_code_lenses(count: int) -> float:
+    """Simulate resolving `count` code lenses: one chained request promise per lens, joined with Promise.all."""
+    start = time.perf_counter()
+    tasks = [Promise.packaged_task() for _ in range(count)]  # type: List[PackagedTask[int]]
+    resolved = []  # type: List[List[int]]
+    Promise.all([promise.then(lambda x: x + 1) for promise, _ in tasks]).then(resolved.append)
+    for index, (_, resolve) in enumerate(tasks):
+        resolve(index)
+    assert resolved and len(resolved[0]) == count
+    return time.perf_counter() - start
+
+
+class PromiseBenchmark(TestCase):
+
+    def test_all_settles_in_linear_time(self) -> None:
+        gc.disable()
+        try:
+            small = min(_settle_code_lenses(1000) for _ in range(5))
+            large = min(_settle_code_lenses(4000) for _ in range(5))
+        finally:
+            gc.enable()
+        # Four times as many promises should take about four times as long. A quadratic Promise.all would take
+        # sixteen times as long.
+        self.assertLess(large, small * 8)
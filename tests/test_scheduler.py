@@ -0,0 +1,128 @@
+from LSP.plugin.core.protocol import ErrorCode
+from LSP.plugin.core.protocol import Notification
+from LSP.plugin.core.protocol import Request
+from LSP.plugin.core.protocol import WorkspaceFolder
+from LSP.plugin.core.scheduler import INTERACTIVE_BLOCKING_MS
+from LSP.plugin.core.scheduler import RequestPriority
+from LSP.plugin.core.scheduler import RequestScheduler
+from LSP.plugin.core.sessions import Session
+from LSP.plugin.core.typing import Callable, List, Tuple
+from test_mocks import TEST_CONFIG
+from test_session import MockManager
+from unittest import TestCase
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+
+def request(method: str, uri: str = "file:///a.py") -> Request:
+    return Request(method, {"textDocument": {"uri": uri}})
+
+
+class RequestSchedulerTests(TestCase):
+
+    def setUp(self) -> None:
+        self.timeouts = []  # type: List[Tuple[Callable[[], None], int]]
+        set_timeout_async = patch(
+            "sublime.set_timeout_async", side_effect=lambda f, ms=0: self.timeouts.append((f, ms)))
+        set_timeout_async.start()
+        self.addCleanup(set_timeout_async.stop)
+        self.sent = []  # type: List[Tuple[int, Request]]
+        self.scheduler = RequestScheduler(
+            lambda request_id, r: self.sent.append((request_id, r)),
+            {"interactive": 0, "visible": 1, "background": 1})
+
+    def sent_ids(self) -> List[int]:
+        return [request_id for request_id, _ in self.sent]
+
+    def test_background_waits_for_interactive_requests(self) -> None:
+        self.scheduler.schedule_async(1, request("textDocument/hover"))
+        self.scheduler.schedule_async(2, request("textDocument/semanticTokens/full"))
+        self.scheduler.schedule_async(3, request("textDocument/completion"))
+        self.assertEqual(self.sent_ids(), [1, 3])
+        self.scheduler.on_response_async(1)
+        self.assertEqual(self.sent_ids(), [1, 3])
+        self.scheduler.on_response_async(3)
+        self.assertEqual(self.sent_ids(), [1, 3, 2])
+
+    def test_in_flight_limit(self) -> None:
+        self.scheduler.schedule_async(1, request("textDocument/inlayHint"))
+        self.scheduler.schedule_async(2, request("textDocument/documentHighlight"))
+        self.scheduler.schedule_async(3, Request("custom/method", priority=RequestPriority.VISIBLE))
+        self.assertEqual(self.sent_ids(), [1])
+        self.scheduler.on_response_async(1)
+        self.assertEqual(self.sent_ids(), [1, 2])
+        metrics = self.scheduler.metrics()["visible"]
+        self.assertEqual((metrics["waiting"], metrics["in_flight"], metrics["sent"], metrics["held"]), (1, 1, 2, 2))
+
+    def test_take_waiting(self) -> None:
+        self.scheduler.schedule_async(1, request("textDocument/inlayHint"))
+        self.scheduler.schedule_async(2, request("textDocument/inlayHint", "file:///b.py"))
+        self.scheduler.schedule_async(3, request("textDocument/inlayHint"))
+        taken = self.scheduler.take_waiting_async(lambda _, r: r.params["textDocument"]["uri"] == "file:///a.py")
+        self.assertEqual([request_id for request_id, _ in taken], [3])
+        self.scheduler.on_response_async(1)
+        self.assertEqual(self.sent_ids(), [1, 2])
+
+    def test_unanswered_interactive_request_stops_holding_back_background_requests(self) -> None:
+        with patch("LSP.plugin.core.scheduler.time") as clock:
+            clock.time.return_value = 100.0
+            self.scheduler.schedule_async(1, Request("workspace/executeCommand", {"command": "build"}))
+            self.scheduler.schedule_async(2, request("textDocument/semanticTokens/full"))
+            self.scheduler.schedule_async(3, request("textDocument/documentColor"))
+            self.assertEqual(self.sent_ids(), [1])
+            self.assertEqual([ms for _, ms in self.timeouts], [INTERACTIVE_BLOCKING_MS])
+            clock.time.return_value = 100.0 + INTERACTIVE_BLOCKING_MS / 1000
+            self.timeouts.pop()[0]()
+            # The background limit still applies.
+            self.assertEqual(self.sent_ids(), [1, 2])
+            self.scheduler.on_response_async(2)
+            self.assertEqual(self.sent_ids(), [1, 2, 3])
+            self.assertEqual(self.timeouts, [])
+
+    def test_background_requests_wait_for_a_new_interactive_request(self) -> None:
+        with patch("LSP.plugin.core.scheduler.time") as clock:
+            clock.time.return_value = 100.0
+            self.scheduler.schedule_async(1, request("textDocument/hover"))
+            clock.time.return_value = 101.0
+            self.scheduler.schedule_async(2, request("textDocument/completion"))
+            self.scheduler.schedule_async(3, request("textDocument/semanticTokens/full"))
+            self.assertEqual(self.sent_ids(), [1, 2])
+            # The newest interactive request decides how long the background request waits.
+            self.assertEqual([ms for _, ms in self.timeouts], [INTERACTIVE_BLOCKING_MS])
+            clock.time.return_value = 100.0 + INTERACTIVE_BLOCKING_MS / 1000
+            self.timeouts.pop()[0]()
+            self.assertEqual(self.sent_ids(), [1, 2])
+            self.assertEqual([ms for _, ms in self.timeouts], [1000])
+
+
+class SessionSchedulingTests(TestCase):
+
+    def setUp(self) -> None:
+        set_timeout_async = patch("sublime.set_timeout_async")
+        set_timeout_async.start()
+        self.addCleanup(set_timeout_async.stop)
+        window = MagicMock()
+        window.id.return_value = 1
+        self.session = Session(MockManager(window), MagicMock(), [WorkspaceFolder("a", "/")], TEST_CONFIG, None)
+        self.session.request_scheduler = RequestScheduler(
+            self.session._write_request_async, {"interactive": 0, "visible": 1, "background": 1})
+        self.payloads = []  # type: List[dict]
+        self.session.send_payload = self.payloads.append  # type: ignore
+
+    def test_text_changes_answer_waiting_requests(self) -> None:
+        errors = []  # type: List[dict]
+        self.session.send_request_async(request("textDocument/hover"), lambda _: None)
+        self.session.send_request_async(request("textDocument/documentColor"), lambda _: None)
+        self.session.send_request_async(Request("workspace/diagnostic", {}), lambda _: None, errors.append)
+        self.session.send_request_async(
+            request("textDocument/semanticTokens/full"), lambda _: None, errors.append)
+        self.assertEqual([p.get("method") for p in self.payloads], ["textDocument/hover"])
+        self.session.send_notification(Notification.didChange({"textDocument": {"uri": "file:///a.py"}}))
+        # The request without an error handler goes out before the change, the other one is answered.
+        self.assertEqual([p.get("method") for p in self.payloads],
+                         ["textDocument/hover", "textDocument/documentColor", "textDocument/didChange"])
+        self.assertEqual([e["code"] for e in errors], [ErrorCode.ContentModified])
+        self.session.send_notification(Notification("$/cancelRequest", {"id": 3}))
+        self.assertEqual([e["code"] for e in errors], [ErrorCode.ContentModified, ErrorCode.RequestCancelled])
+        self.assertEqual(self.payloads[-1]["method"], "textDocument/didChange")
+        self.assertEqual(self.session.request_scheduler.metrics()["background"]["dropped"], 2)
@@ -1,8 +1,12 @@
 from LSP.plugin.core.panels import ensure_server_panel
-from LSP.plugin.core.panels import SERVER_PANEL_MAX_LINES
 from LSP.plugin.core.panels import log_server_message
+from LSP.plugin.core.panels import SERVER_PANEL_MAX_CHARACTERS
+from LSP.plugin.core.panels import SERVER_PANEL_MAX_LINES
+from LSP.plugin.core.panels import ServerLogBuffer
+from LSP.plugin.core.windows import format_params
 from unittesting import DeferrableTestCase
 import sublime
+import unittest
 
 
 class LspServerPanelTests(DeferrableTestCase):
@@ -38,3 +42,35 @@ class LspServerPanelTests(DeferrableTestCase):
         # The panel only updates when visible but we don't want to test that as
         # it would hide the unittesting panel.
         self.assert_total_lines_equal(1)
+
+
+class ServerLogBufferTests(unittest.TestCase):
+
+    def test_bounded_by_lines(self):
+        buffer = ServerLogBuffer()
+        for i in range(0, SERVER_PANEL_MAX_LINES + 10):
+            buffer.append("{}\n".format(i))
+        self.assertEqual(len(buffer), SERVER_PANEL_MAX_LINES)
+        messages = buffer.drain()
+        self.assertEqual(messages[0], "10\n")
+        self.assertEqual(len(buffer), 0)
+
+    def test_bounded_by_characters(self):
+        buffer = ServerLogBuffer()
+        buffer.append("x" * SERVER_PANEL_MAX_CHARACTERS)
+        buffer.append("y")
+        self.assertEqual(buffer.drain(), ["y"])
+
+
+class FormatParamsTests(unittest.TestCase):
+
+    def test_same_as_str(self):
+        params = {"foo": [1, "two", None, True, 1.5], "bar": {"baz": "x"}}
+        self.assertEqual(format_params(params, 1000), str(params))
+        self.assertEqual(format_params(params, 0), str(params))
+        self.assertEqual(format_params("hello", 1000), "hello")
+
+    def test_too_large(self):
+        params = {"items": [{"label": "item{}".format(i)} for i in range(0, 10000)]}
+        self.assertEqual(format_params(params, 100), "<params with 100 characters or more>")
+        self.assertEqual(format_params("x" * 100, 100), "<params with 100 characters>")
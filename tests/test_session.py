@@ -2,15 +2,19 @@ from LSP.plugin.core.collections import DottedDict
 from LSP.plugin.core.protocol import Diagnostic
 from LSP.plugin.core.protocol import DocumentUri
 from LSP.plugin.core.protocol import Error
+from LSP.plugin.core.protocol import Notification
+from LSP.plugin.core.protocol import Request
 from LSP.plugin.core.protocol import TextDocumentSyncKindFull
 from LSP.plugin.core.protocol import TextDocumentSyncKindIncremental
 from LSP.plugin.core.protocol import TextDocumentSyncKindNone
 from LSP.plugin.core.protocol import WorkspaceFolder
+from LSP.plugin.core.promise import ThreadSafePromise
 from LSP.plugin.core.sessions import get_initialize_params
 from LSP.plugin.core.sessions import Logger
 from LSP.plugin.core.sessions import Manager
 from LSP.plugin.core.sessions import Session
 from LSP.plugin.core.types import ClientConfig
+from LSP.plugin.core.types import ClientStates
 from LSP.plugin.core.typing import Any, Optional, Generator, List, Dict
 from test_mocks import TEST_CONFIG
 import sublime
@@ -107,9 +111,17 @@ class MockSessionBuffer:
     ) -> None:
         pass
 
+    evicted = False
+
     def on_diagnostics_async(self, raw_diagnostics: List[Diagnostic], version: Optional[int]) -> None:
         pass
 
+    def do_document_diagnostic_async(self, view: sublime.View, version: Optional[int] = None) -> None:
+        pass
+
+    def refresh_document_diagnostic_async(self) -> None:
+        pass
+
 
 class SessionTest(unittest.TestCase):
 
@@ -156,6 +168,19 @@ class SessionTest(unittest.TestCase):
         self.assertIn("initializationOptions", params)
         self.assertEqual(params["initializationOptions"], {"foo": "bar"})
 
+    def test_position_encoding(self) -> None:
+        wf = WorkspaceFolder.from_path("/foo/bar/baz")
+        params = get_initialize_params({}, [wf], TEST_CONFIG)
+        self.assertIn("utf-16", params["capabilities"]["general"]["positionEncodings"])
+        manager = MockManager(sublime.active_window())
+        session = Session(manager=manager, logger=MockLogger(), workspace_folders=[], config=TEST_CONFIG,
+                          plugin_class=None)
+        # Servers that don't pick an encoding speak UTF-16.
+        session.capabilities.assign({})
+        self.assertEqual(session.position_encoding, "utf-16")
+        session.capabilities.assign({"positionEncoding": "utf-32"})
+        self.assertEqual(session.position_encoding, "utf-32")
+
     def test_document_sync_capabilities(self) -> None:
         manager = MockManager(sublime.active_window())
         session = Session(manager=manager, logger=MockLogger(), workspace_folders=[], config=TEST_CONFIG,
@@ -253,6 +278,112 @@ class SessionTest(unittest.TestCase):
         self.assertEqual(sb.get_language_id(), "somelang")
         self.assertEqual(sb.get_uri(), "some-scheme://whatever")
 
+    def test_workspace_diagnostic(self) -> None:
+        manager = MockManager(sublime.active_window())
+        session = Session(manager=manager, logger=MockLogger(), workspace_folders=[], config=TEST_CONFIG,
+                          plugin_class=None)
+        session.capabilities.assign({"diagnosticProvider": {"workspaceDiagnostics": True}})
+        timeouts = []  # type: List[Any]
+        requests = []  # type: List[Any]
+        diagnostic = {
+            "range": {"start": {"line": 0, "character": 0}, "end": {"line": 0, "character": 1}},
+            "message": "oops"
+        }
+        with unittest.mock.patch("sublime.set_timeout_async", side_effect=lambda f, ms=0: timeouts.append(f)), \
+                unittest.mock.patch.object(session, "send_request_async", side_effect=lambda *a: requests.append(a)):
+            session.schedule_workspace_diagnostic_async()
+            session.schedule_workspace_diagnostic_async()
+            self.assertEqual(len(timeouts), 1)
+            timeouts.pop()()
+            request, on_result, _ = requests.pop()
+            self.assertEqual(request.method, "workspace/diagnostic")
+            self.assertEqual(request.params, {"previousResultIds": []})
+            # Changes while the request is in flight request the workspace diagnostics again afterwards.
+            session.schedule_workspace_diagnostic_async()
+            self.assertEqual(timeouts, [])
+            on_result({"items": [
+                {"uri": "file:///a.py", "version": None, "kind": "full", "resultId": "1", "items": [diagnostic]}
+            ]})
+            self.assertEqual(session.diagnostics_manager.diagnostics_by_document_uri("file:///a.py"), [diagnostic])
+            self.assertEqual(len(timeouts), 1)
+            timeouts.pop()()
+            request, on_result, _ = requests.pop()
+            self.assertEqual(request.params, {"previousResultIds": [{"uri": "file:///a.py", "value": "1"}]})
+            on_result({"items": [{"uri": "file:///a.py", "version": None, "kind": "unchanged", "resultId": "1"}]})
+            self.assertEqual(session.diagnostics_manager.diagnostics_by_document_uri("file:///a.py"), [diagnostic])
+            self.assertEqual(timeouts, [])
+
+    def test_workspace_configuration_cache(self) -> None:
+        config = ClientConfig(name="test", command=[], selector="text.plain", tcp_port=None,
+                              settings=DottedDict({"cached": {"value": 1}}))
+        window = unittest.mock.MagicMock()
+        window.id.return_value = 1
+        session = Session(manager=MockManager(window), logger=MockLogger(), workspace_folders=[], config=config,
+                          plugin_class=None)
+        params = {"items": [{"section": "cached", "scopeUri": "file:///a.py"}, {"section": "cached"}]}
+        responses = []  # type: List[Any]
+        with unittest.mock.patch.object(session, "send_response", side_effect=responses.append), \
+                unittest.mock.patch.object(session, "send_payload"), \
+                unittest.mock.patch("LSP.plugin.core.sessions.extract_variables", return_value={}), \
+                unittest.mock.patch("sublime.expand_variables", side_effect=lambda value, _: value) as expand:
+            session.m_workspace_configuration(params, 1)
+            self.assertEqual(responses.pop().result, [{"value": 1}, {"value": 1}])
+            # Without a plugin the scope doesn't matter, so the second item is answered from the cache.
+            self.assertEqual(expand.call_count, 1)
+            config.settings.set("cached.value", 2)
+            session.m_workspace_configuration(params, 2)
+            self.assertEqual(responses.pop().result, [{"value": 1}, {"value": 1}])
+            session.send_notification(Notification("workspace/didChangeConfiguration", {"settings": {}}))
+            session.m_workspace_configuration(params, 3)
+            self.assertEqual(responses.pop().result, [{"value": 2}, {"value": 2}])
+            self.assertEqual(expand.call_count, 2)
+
+    def test_send_request_task_is_thread_safe(self) -> None:
+        session = Session(manager=MockManager(sublime.active_window()), logger=MockLogger(), workspace_folders=[],
+                          config=TEST_CONFIG, plugin_class=None)
+        handlers = []  # type: List[Any]
+        with unittest.mock.patch.object(session, "send_request_async", side_effect=lambda *a: handlers.append(a)):
+            promise = session.send_request_task(Request("textDocument/hover", {}))
+        self.assertIsInstance(promise, ThreadSafePromise)
+        values = []  # type: List[Any]
+        promise.then(values.append)
+        _, on_result, _ = handlers.pop()
+        on_result({"contents": "hello"})
+        self.assertEqual(values, [{"contents": "hello"}])
+
+    def test_shared_session(self) -> None:
+        first_window = unittest.mock.MagicMock()
+        first_window.id.return_value = 1
+        second_window = unittest.mock.MagicMock()
+        second_window.id.return_value = 2
+        first = MockManager(first_window)
+        second = MockManager(second_window)
+        repo = WorkspaceFolder("repo", "/repo")
+        package = WorkspaceFolder("package", "/repo/package")
+        session = Session(manager=first, logger=MockLogger(), workspace_folders=[repo], config=TEST_CONFIG,
+                          plugin_class=None)
+        session.state = ClientStates.READY
+        workspace_folders = {"supported": True, "changeNotifications": True}
+        session.capabilities.assign({"workspace": {"workspaceFolders": workspace_folders}})
+        self.assertFalse(session.can_attach([WorkspaceFolder("other", "/other")]))
+        self.assertTrue(session.can_attach([package]))
+        notifications = []  # type: List[Any]
+        docs = WorkspaceFolder("docs", "/docs")
+        with unittest.mock.patch.object(session, "send_notification", side_effect=notifications.append):
+            session.attach_manager_async(second, [package, docs])
+            self.assertTrue(session.is_shared())
+            self.assertEqual(session.windows(), [first_window, second_window])
+            self.assertEqual([f.path for f in session.get_workspace_folders()], ["/repo", "/repo/package", "/docs"])
+            added = notifications.pop().params["event"]["added"]
+            self.assertCountEqual(added, [package.to_lsp(), docs.to_lsp()])
+            # The first window closes its folder that the second window has as well.
+            self.assertTrue(session.detach_manager_async(first))
+            self.assertEqual(notifications.pop().params["event"]["removed"], [repo.to_lsp()])
+            self.assertFalse(session.is_shared())
+            # The last window that uses the session ends it.
+            self.assertFalse(session.detach_manager_async(second))
+            self.assertEqual(session.managers(), [second])
+
     def test_get_session_buffer_for_uri_with_files(self) -> None:
         # todo: write windows-only test
         pass
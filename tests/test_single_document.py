@@ -1,11 +1,13 @@
 from copy import deepcopy
 from LSP.plugin import Request
+from LSP.plugin.core.settings import userprefs
 from LSP.plugin.core.url import filename_to_uri
 from LSP.plugin.core.views import entire_content
 from LSP.plugin.hover import _test_contents
 from setup import TextDocumentTestCase
 from setup import TIMEOUT_TIME
 from setup import YieldPromise
+from unittest.mock import patch
 import os
 import sublime
 
@@ -75,6 +77,21 @@ class SingleDocumentTestCase(TextDocumentTestCase):
         self.view.close()
         yield from self.await_message("textDocument/didClose")
 
+    def test_closes_idle_document_and_reopens_it_on_activation(self) -> 'Generator':
+        sb = self.session.get_session_buffer_for_uri_async(filename_to_uri(TEST_FILE_PATH))
+        assert sb
+        prefs = userprefs()
+        prefs.close_idle_documents_after_minutes = 1
+        self.addCleanup(lambda: setattr(prefs, "close_idle_documents_after_minutes", 0))
+        sb.last_active_time -= 120
+        with patch("LSP.plugin.session_buffer.is_visible", return_value=False):
+            sublime.set_timeout_async(sb._evict_if_idle_async)
+            yield from self.await_message("textDocument/didClose")
+        self.assertTrue(sb.evicted)
+        sublime.set_timeout_async(lambda: sb.on_activated_async(self.view))
+        yield from self.await_message("textDocument/didOpen")
+        self.assertFalse(sb.evicted)
+
     def test_did_change(self) -> 'Generator':
         assert self.view
         self.maxDiff = None
@@ -0,0 +1,101 @@
+from LSP.plugin.core.diagnostics_manager import DiagnosticsManager
+from LSP.plugin.core.protocol import Diagnostic
+from LSP.plugin.core.snapshot import DIAGNOSTICS
+from LSP.plugin.core.snapshot import DOCUMENT_SYMBOLS
+from LSP.plugin.core.snapshot import Snapshot
+from LSP.plugin.core.url import filename_to_uri
+from unittest import TestCase
+from unittest.mock import patch
+import os
+import tempfile
+
+
+def diagnostic(message: str) -> Diagnostic:
+    return {
+        "range": {"start": {"line": 0, "character": 0}, "end": {"line": 0, "character": 1}},
+        "severity": 1,
+        "message": message
+    }
+
+
+class SnapshotTests(TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name, "a.py")
+        with open(self.file_name, "w") as f:
+            f.write("a = 1\n")
+        self.uri = filename_to_uri(self.file_name)
+        self.path = os.path.join(self.directory.name, "snapshots", "test.jsonl.gz")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def _reload(self) -> Snapshot:
+        snapshot = Snapshot(self.path)
+        snapshot.load()
+        return snapshot
+
+    def test_entries_survive_a_restart(self) -> None:
+        snapshot = Snapshot(self.path)
+        with patch("sublime.set_timeout_async") as set_timeout_async:
+            snapshot.put(DIAGNOSTICS, self.uri, [diagnostic("first")])
+            snapshot.put(DOCUMENT_SYMBOLS, self.uri, [{"name": "a"}])
+            snapshot.put(DIAGNOSTICS, self.uri, [diagnostic("second")])
+        set_timeout_async.assert_called_once()
+        snapshot.write()
+        snapshot.put(DOCUMENT_SYMBOLS, self.uri, None)
+        snapshot.write()
+        loaded = self._reload()
+        self.assertEqual(loaded.get(DIAGNOSTICS, self.uri), [diagnostic("second")])
+        self.assertIsNone(loaded.get(DOCUMENT_SYMBOLS, self.uri))
+        self.assertEqual(loaded.items(DIAGNOSTICS), [(self.uri, [diagnostic("second")])])
+
+    def test_entries_of_changed_files_are_dropped(self) -> None:
+        snapshot = Snapshot(self.path)
+        snapshot.put(DIAGNOSTICS, self.uri, [diagnostic("old")])
+        snapshot.write()
+        mtime = os.path.getmtime(self.file_name)
+        os.utime(self.file_name, (mtime + 10, mtime + 10))
+        self.assertIsNone(snapshot.get(DIAGNOSTICS, self.uri))
+        self.assertEqual(self._reload().items(DIAGNOSTICS), [])
+
+    def test_ignores_a_cut_off_write(self) -> None:
+        snapshot = Snapshot(self.path)
+        snapshot.put(DIAGNOSTICS, self.uri, [diagnostic("kept")])
+        snapshot.write()
+        with open(self.path, "ab") as f:
+            f.write(b"\x1f\x8b\x08\x00")
+        self.assertEqual(self._reload().get(DIAGNOSTICS, self.uri), [diagnostic("kept")])
+
+    def test_compacts_outdated_lines(self) -> None:
+        snapshot = Snapshot(self.path)
+        with patch("LSP.plugin.core.snapshot.SNAPSHOT_COMPACT_THRESHOLD", 2):
+            for i in range(5):
+                snapshot.put(DIAGNOSTICS, self.uri, [diagnostic(str(i))])
+                snapshot.write()
+        loaded = self._reload()
+        self.assertEqual(loaded.get(DIAGNOSTICS, self.uri), [diagnostic("4")])
+        self.assertLessEqual(loaded._line_count, 3)
+
+
+class StaleDiagnosticsTests(TestCase):
+
+    def test_fresh_diagnostics_replace_stale_ones(self) -> None:
+        manager = DiagnosticsManager()
+        manager.add_diagnostics_async("file:///fresh.py", [diagnostic("fresh")])
+        manager.add_stale_diagnostics_async("file:///fresh.py", [diagnostic("stale")])
+        manager.add_stale_diagnostics_async("file:///stale.py", [diagnostic("stale")])
+        self.assertEqual(manager.diagnostics_by_document_uri("file:///fresh.py"), [diagnostic("fresh")])
+        self.assertEqual(manager.stale_diagnostics_by_document_uri("file:///fresh.py"), [])
+        self.assertEqual(manager.stale_diagnostics_by_document_uri("file:///stale.py"), [diagnostic("stale")])
+        manager.add_diagnostics_async("file:///stale.py", [])
+        self.assertEqual(manager.diagnostics_by_document_uri("file:///stale.py"), [])
+        self.assertEqual(manager.stale, set())
+
+    def test_clear_stale(self) -> None:
+        manager = DiagnosticsManager()
+        manager.add_diagnostics_async("file:///fresh.py", [diagnostic("fresh")])
+        manager.add_stale_diagnostics_async("file:///stale.py", [diagnostic("stale")])
+        manager.clear_stale_async()
+        self.assertEqual(list(manager.keys()), [("file", "/fresh.py")])
@@ -0,0 +1,70 @@
+from LSP.plugin.core.protocol import WorkspaceFolder
+from LSP.plugin.core.sessions import Session
+from LSP.plugin.core.standby import StandbySessions
+from LSP.plugin.core.types import ClientConfig
+from LSP.plugin.core.types import ClientStates
+from test_mocks import TEST_CONFIG
+from test_session import MockLogger
+from unittest import TestCase
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+
+def window(window_id: int) -> MagicMock:
+    result = MagicMock()
+    result.id.return_value = window_id
+    return result
+
+
+class StandbySessionsTests(TestCase):
+
+    def setUp(self) -> None:
+        self.pool = StandbySessions()
+        self.standby_manager = self.pool.create_manager(window(1))
+        self.manager = self.pool.create_manager(window(2))
+        self.folders = [WorkspaceFolder("repo", "/repo")]
+        self.session = Session(self.standby_manager, MockLogger(), self.folders, TEST_CONFIG, None)
+        self.pool.add(self.session, TEST_CONFIG, self.standby_manager)
+
+    def test_takes_initialized_session_once(self) -> None:
+        self.assertIsNone(self.pool.take_async(TEST_CONFIG, self.folders, self.manager))
+        self.session.state = ClientStates.READY
+        self.assertIsNone(self.pool.take_async(ClientConfig.from_config(TEST_CONFIG, {"command": ["other"]}),
+                                               self.folders, self.manager))
+        self.assertIs(self.pool.take_async(TEST_CONFIG, self.folders, self.manager), self.session)
+        self.assertEqual(self.session.managers(), [self.manager])
+        self.assertNotIn(TEST_CONFIG.name, self.pool)
+        self.assertIsNone(self.pool.take_async(TEST_CONFIG, self.folders, self.manager))
+
+    def test_other_folders_need_workspace_folder_support(self) -> None:
+        self.session.state = ClientStates.READY
+        other_folders = [WorkspaceFolder("other", "/other")]
+        self.assertIsNone(self.pool.take_async(TEST_CONFIG, other_folders, self.manager))
+        workspace_folders = {"supported": True, "changeNotifications": True}
+        self.session.capabilities.assign({"workspace": {"workspaceFolders": workspace_folders}})
+        with patch.object(self.session, "send_notification") as send_notification:
+            self.assertIs(self.pool.take_async(TEST_CONFIG, other_folders, self.manager), self.session)
+        self.assertEqual(self.session.get_workspace_folders(), other_folders)
+        event = send_notification.call_args_list[-1][0][0].params["event"]
+        self.assertEqual(event, {"added": [], "removed": [self.folders[0].to_lsp()]})
+
+    def test_take_in_the_window_that_started_the_session(self) -> None:
+        self.session.state = ClientStates.READY
+        manager = self.pool.create_manager(window(1))
+        self.assertIs(self.pool.take_async(TEST_CONFIG, self.folders, manager), self.session)
+        self.assertEqual(self.session.managers(), [manager])
+        self.assertEqual(self.session.get_workspace_folders(), self.folders)
+
+    def test_take_in_the_same_window_keeps_workspace_folders(self) -> None:
+        self.session.state = ClientStates.READY
+        workspace_folders = {"supported": True, "changeNotifications": True}
+        self.session.capabilities.assign({"workspace": {"workspaceFolders": workspace_folders}})
+        manager = self.pool.create_manager(window(1))
+        with patch.object(self.session, "send_notification") as send_notification:
+            self.assertIs(self.pool.take_async(TEST_CONFIG, self.folders, manager), self.session)
+        self.assertEqual(self.session.get_workspace_folders(), self.folders)
+        send_notification.assert_not_called()
+
+    def test_exited_session_leaves_the_pool(self) -> None:
+        self.standby_manager.on_post_exit_async(self.session, 0, None)
+        self.assertNotIn(TEST_CONFIG.name, self.pool)
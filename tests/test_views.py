@@ -3,32 +3,47 @@ from LSP.plugin.core.protocol import Diagnostic
 from LSP.plugin.core.protocol import Point
 from LSP.plugin.core.protocol import Range
 from LSP.plugin.core.types import Any
+from LSP.plugin.core.typing import Dict, List
 from LSP.plugin.core.url import filename_to_uri
+from LSP.plugin.core.views import _color_scheme_key
+from LSP.plugin.core.views import _language_map_key
 from LSP.plugin.core.views import did_change
 from LSP.plugin.core.views import did_open
 from LSP.plugin.core.views import did_save
 from LSP.plugin.core.views import document_color_params
 from LSP.plugin.core.views import format_diagnostic_for_html
+from LSP.plugin.core.views import get_lines
 from LSP.plugin.core.views import FORMAT_STRING, FORMAT_MARKED_STRING, FORMAT_MARKUP_CONTENT, minihtml
 from LSP.plugin.core.views import lsp_color_to_html
 from LSP.plugin.core.views import lsp_color_to_phantom
+from LSP.plugin.core.views import merge_text_changes
+from LSP.plugin.core.views import MinihtmlCache
 from LSP.plugin.core.views import MissingUriError
+from LSP.plugin.core.views import offset_to_point
+from LSP.plugin.core.views import PhantomLayer
 from LSP.plugin.core.views import point_to_offset
+from LSP.plugin.core.views import POSITION_BATCH_THRESHOLD
+from LSP.plugin.core.views import points_to_offsets
 from LSP.plugin.core.views import range_to_region
+from LSP.plugin.core.views import ranges_to_regions
 from LSP.plugin.core.views import selection_range_params
 from LSP.plugin.core.views import text2html
 from LSP.plugin.core.views import text_document_code_action_params
 from LSP.plugin.core.views import text_document_formatting
 from LSP.plugin.core.views import text_document_position_params
 from LSP.plugin.core.views import text_document_range_formatting
+from LSP.plugin.core.views import to_encoded_filename
 from LSP.plugin.core.views import uri_from_view
 from LSP.plugin.core.views import will_save
 from LSP.plugin.core.views import will_save_wait_until
 from setup import make_stdio_test_config
+from unittest import TestCase
 from unittest.mock import MagicMock
 from unittesting import DeferrableTestCase
+import os
 import re
 import sublime
+import tempfile
 
 
 class ViewsTest(DeferrableTestCase):
@@ -45,6 +60,16 @@ class ViewsTest(DeferrableTestCase):
         self.view.close()
         return super().tearDown()
 
+    def test_get_lines_from_disk(self) -> None:
+        fd, file_name = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                fp.write(b"first\r\n  second  \nthird")
+            lines = get_lines(sublime.active_window(), [(file_name, 2), (file_name, 1), (file_name, 1), (file_name, 5)])
+            self.assertEqual(lines, {(file_name, 1): "second", (file_name, 2): "third", (file_name, 5): ""})
+        finally:
+            os.unlink(file_name)
+
     def test_missing_uri(self) -> None:
         self.view.settings().erase("lsp_uri")
         with self.assertRaises(MissingUriError):
@@ -165,6 +190,36 @@ class ViewsTest(DeferrableTestCase):
         # So that means that the code point offsets should have a difference of 1.
         self.assertEqual(point_to_offset(Point(1, foobarbaz_length + 2), self.view) - offset, 1)
 
+    def test_points_to_offsets(self) -> None:
+        self.view.run_command("insert", {"characters": "\n🍺foo\nbar"})
+        first_line_length = len("hello world")
+        points = [(0, 0), (0, 9999), (1, 3), (2, 0), (2, 2), (2, 5), (3, 1), (9999, 0)] * 2
+        offsets = points_to_offsets(self.view, points)
+        # The batched conversion must agree with the per-point conversion.
+        self.assertEqual(offsets, [point_to_offset(Point(row, col), self.view) for row, col in points])
+        self.assertEqual(offsets[1], first_line_length)
+        # Two UTF-16 code units past the start of the third line encompasses the beer emoji.
+        self.assertEqual(offsets[4] - offsets[3], 1)
+        self.assertEqual(self.view.substr(sublime.Region(offsets[4], offsets[5])), "foo")
+
+    def test_points_to_offsets_encodings(self) -> None:
+        self.view.run_command("insert", {"characters": "\n\u00e9\U0001F37Afoo"})
+        foo = self.view.size() - 3
+        for encoding, col in (("utf-8", 6), ("utf-16", 3), ("utf-32", 2)):
+            # Both the per-point and the batched conversion.
+            for count in (1, POSITION_BATCH_THRESHOLD):
+                self.assertEqual(points_to_offsets(self.view, [(2, col)] * count, encoding), [foo] * count)
+            self.assertEqual(offset_to_point(self.view, foo, encoding), Point(2, col))
+
+    def test_ranges_to_regions(self) -> None:
+        ranges = [
+            {"start": {"line": 0, "character": 0}, "end": {"line": 0, "character": 5}},
+            {"start": {"line": 1, "character": 4}, "end": {"line": 1, "character": 7}},
+        ] * 5
+        regions = ranges_to_regions(self.view, ranges)
+        self.assertEqual([self.view.substr(region) for region in regions[:2]], ["hello", "bar"])
+        self.assertEqual(regions, [range_to_region(Range.from_lsp(r), self.view) for r in ranges])
+
     def test_selection_range_params(self) -> None:
         self.view.run_command("lsp_selection_set", {"regions": [(0, 5), (6, 11)]})
         self.view.settings().set("lsp_uri", filename_to_uri(self.mock_file_name))
@@ -399,3 +454,173 @@ class ViewsTest(DeferrableTestCase):
             minihtml(self.view, {"kind": "markdown", "value": "hello\\\nworld"}, FORMAT_MARKUP_CONTENT),
             "<p>hello<br />\nworld</p>"
         )
+
+
+class ToEncodedFilenameTests(TestCase):
+
+    def setUp(self) -> None:
+        fd, self.file_name = tempfile.mkstemp()
+        with os.fdopen(fd, "wb") as fp:
+            fp.write("first\r\n  \u00e4\U0001f600 = 1\r\n".encode("utf-8"))
+
+    def tearDown(self) -> None:
+        os.unlink(self.file_name)
+
+    def test_column_is_converted_from_the_position_encoding(self) -> None:
+        # The "=" is the sixth character of the second line.
+        position = {"line": 1, "character": 6}
+        self.assertEqual(to_encoded_filename(self.file_name, position, "utf-16"), self.file_name + ":2:6")
+        position = {"line": 1, "character": 9}
+        self.assertEqual(to_encoded_filename(self.file_name, position, "utf-8"), self.file_name + ":2:6")
+        position = {"line": 1, "character": 5}
+        self.assertEqual(to_encoded_filename(self.file_name, position, "utf-32"), self.file_name + ":2:6")
+
+    def test_line_of_an_open_file(self) -> None:
+        view = MagicMock()
+        view.substr.return_value = "\u00e4 = 1"
+        window = MagicMock()
+        window.find_open_file.return_value = view
+        position = {"line": 0, "character": 3}
+        self.assertEqual(to_encoded_filename(self.file_name, position, "utf-8", window), self.file_name + ":1:3")
+
+
+class MinihtmlCacheTests(TestCase):
+
+    def test_lru_eviction_and_stats(self) -> None:
+        cache = MinihtmlCache(2)
+        a = ("a", FORMAT_MARKUP_CONTENT, "", "Mariana")
+        b = ("b", FORMAT_MARKUP_CONTENT, "", "Mariana")
+        c = ("c", FORMAT_MARKUP_CONTENT, "", "Mariana")
+        self.assertIsNone(cache.get(a))
+        cache.put(a, "<p>a</p>")
+        cache.put(b, "<p>b</p>")
+        self.assertEqual(cache.get(a), "<p>a</p>")
+        # "b" is now the least recently used entry.
+        cache.put(c, "<p>c</p>")
+        self.assertIsNone(cache.get(b))
+        self.assertEqual(cache.get(c), "<p>c</p>")
+        self.assertEqual(cache.stats(), {"size": 2, "hits": 2, "misses": 2, "hit_rate": 0.5})
+
+    def test_color_scheme_change_clears_cache(self) -> None:
+        cache = MinihtmlCache(2)
+        key = ("a", FORMAT_MARKUP_CONTENT, "", "Mariana")
+        cache.on_color_scheme_changed("Mariana")
+        cache.put(key, "<p>a</p>")
+        cache.on_color_scheme_changed("Mariana")
+        self.assertEqual(cache.get(key), "<p>a</p>")
+        cache.on_color_scheme_changed("Monokai")
+        self.assertIsNone(cache.get(key))
+
+    def test_language_map_key_accepts_lists(self) -> None:
+        language_map = {"js": (["js"], ["JavaScript/JavaScript"]), "ts": (["typescript"], ["TypeScript"])}
+        key = _language_map_key(language_map)  # type: ignore
+        self.assertEqual(key, _language_map_key(dict(reversed(list(language_map.items())))))  # type: ignore
+        self.assertEqual(_language_map_key(None), "")
+
+    def test_auto_color_scheme_key_follows_the_resolved_scheme(self) -> None:
+        view = MagicMock()
+        settings = {"color_scheme": "auto", "light_color_scheme": "Breakers", "dark_color_scheme": "Mariana"}
+        view.settings.return_value.get.side_effect = lambda key, default=None: settings.get(key, default)
+        view.style_for_scope.return_value = {"foreground": "#000000", "background": "#ffffff"}
+        light = _color_scheme_key(view)
+        view.style_for_scope.return_value = {"foreground": "#ffffff", "background": "#000000"}
+        self.assertNotEqual(_color_scheme_key(view), light)
+        settings["color_scheme"] = "Monokai.sublime-color-scheme"
+        self.assertEqual(_color_scheme_key(view), "Monokai.sublime-color-scheme")
+
+
+class PhantomLayerTests(TestCase):
+
+    def setUp(self) -> None:
+        self.view = MagicMock()
+        self.phantom_ids = iter(range(1, 100))
+        self.view.add_phantom.side_effect = lambda *args: next(self.phantom_ids)
+        self.layer = PhantomLayer(self.view, "lsp_color")
+
+    def test_scrolling_adds_and_erases_phantoms(self) -> None:
+        self.layer.update(1, [(sublime.Region(0, 7), "red"), (sublime.Region(10, 17), "blue")])
+        self.assertEqual(self.view.add_phantom.call_count, 2)
+        self.view.add_phantom.reset_mock()
+        self.layer.update(1, [(sublime.Region(10, 17), "blue"), (sublime.Region(500, 507), "green")])
+        self.view.add_phantom.assert_called_once_with(
+            "lsp_color", sublime.Region(500, 507), "green", sublime.LAYOUT_INLINE)
+        self.view.erase_phantom_by_id.assert_called_once_with(1)
+
+    def test_keeps_moved_phantoms_after_edit(self) -> None:
+        self.layer.update(1, [(sublime.Region(0, 7), "red"), (sublime.Region(10, 17), "blue")])
+        self.view.add_phantom.reset_mock()
+        # The first color was deleted, and everything after it moved to the front.
+        moved = {1: sublime.Region(-1), 2: sublime.Region(2, 9)}
+        self.view.query_phantoms.side_effect = lambda ids: [moved[pid] for pid in ids]
+        self.layer.update(2, [(sublime.Region(2, 9), "blue")])
+        self.view.add_phantom.assert_not_called()
+        self.view.erase_phantom_by_id.assert_not_called()
+
+
+class MergeTextChangesTests(TestCase):
+
+    def setUp(self) -> None:
+        self.text = "hello\nworld"
+        self.changes = []  # type: List[Any]
+
+    def _position(self, pt: int) -> Any:
+        before = self.text[:pt]
+        line = before[before.rfind("\n") + 1:]
+        position = MagicMock()
+        position.pt = pt
+        position.row = before.count("\n")
+        position.col = len(line)
+        position.col_utf16 = len(line.encode("utf-16-le")) // 2
+        position.col_utf8 = len(line.encode("utf-8"))
+        return position
+
+    def _change(self, a: int, b: int, text: str) -> None:
+        change = MagicMock()
+        change.a = self._position(a)
+        change.b = self._position(b)
+        change.str = text
+        change.len_utf16 = len(self.text[a:b].encode("utf-16-le")) // 2
+        change.len_utf8 = len(self.text[a:b].encode("utf-8"))
+        self.changes.append(change)
+        self.text = self.text[:a] + text + self.text[b:]
+
+    def _content_change(self, start: Any, end: Any, range_length: int, text: str) -> Dict[str, Any]:
+        return {
+            "range": {
+                "start": {"line": start[0], "character": start[1]},
+                "end": {"line": end[0], "character": end[1]}
+            },
+            "rangeLength": range_length,
+            "text": text
+        }
+
+    def test_typing_a_word(self) -> None:
+        for i, char in enumerate(" there"):
+            self._change(5 + i, 5 + i, char)
+        self._change(10, 11, "")  # backspace
+        self.assertEqual(merge_text_changes(self.changes), [self._content_change((0, 5), (0, 5), 0, " ther")])
+
+    def test_typing_at_many_cursors(self) -> None:
+        for char in "ab":
+            # Sublime Text reports the change at every cursor, in document order.
+            end_of_first_line = self.text.index("\n")
+            self._change(end_of_first_line, end_of_first_line, char)
+            self._change(len(self.text), len(self.text), char)
+        self.assertEqual(merge_text_changes(self.changes), [
+            self._content_change((1, 5), (1, 5), 0, "ab"),
+            self._content_change((0, 5), (0, 5), 0, "ab")
+        ])
+
+    def test_overlapping_changes(self) -> None:
+        self._change(3, 8, "p\nw")  # "help\nwrld"
+        self._change(2, 7, "")  # "held"
+        self.assertEqual(merge_text_changes(self.changes), [self._content_change((0, 2), (1, 3), 7, "")])
+
+    def test_position_encodings(self) -> None:
+        self.text = "\U0001f600 x"
+        self._change(2, 3, "\U0001f600")
+        self._change(3, 3, "!")
+        text = "\U0001f600!"
+        self.assertEqual(merge_text_changes(self.changes, "utf-16"), [self._content_change((0, 3), (0, 4), 1, text)])
+        self.assertEqual(merge_text_changes(self.changes, "utf-8"), [self._content_change((0, 5), (0, 6), 1, text)])
+        self.assertEqual(merge_text_changes(self.changes, "utf-32"), [self._content_change((0, 2), (0, 3), 1, text)])